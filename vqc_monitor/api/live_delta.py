@@ -0,0 +1,83 @@
+# app/api/live_delta.py
+"""
+Delta encoding cho frame combined của /ws/live (proto=2).
+
+- Frame đầu tiên (và mỗi `keyframe_every` frame) là keyframe đầy đủ:
+    {"type": "key", "seq": n, "ts_ms": ..., "system": {...}, "services": {app_id: {...}}}
+- Các frame còn lại là delta, chỉ chứa field thay đổi vượt quá epsilon so với giá trị ĐÃ GỬI gần nhất:
+    {"type": "delta", "seq": n, "ts_ms": ..., "system": {...}, "services": {app_id: {...}}, "removed": [...]}
+  Service mới xuất hiện được gửi đầy đủ trong delta. Client merge field-by-field theo app_id.
+"""
+from typing import Any, Dict, Optional
+
+
+def _changed(old: Any, new: Any, epsilon: float) -> bool:
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)) \
+            and not isinstance(old, bool) and not isinstance(new, bool):
+        # sai số tương đối, sàn 1.0 để các giá trị ~0 (cpu idle) không nhảy liên tục
+        return abs(new - old) > epsilon * max(abs(old), abs(new), 1.0)
+    return old != new
+
+
+def _diff(sent: Dict[str, Any], curr: Dict[str, Any], epsilon: float) -> Dict[str, Any]:
+    out = {}
+    for k, v in curr.items():
+        if k not in sent or _changed(sent[k], v, epsilon):
+            out[k] = v
+            sent[k] = v  # so với giá trị đã gửi, tránh trôi dần khi thay đổi nhỏ tích luỹ
+    return out
+
+
+class DeltaEncoder:
+    """Giữ trạng thái 'đã gửi' cho 1 kết nối (hoặc 1 stream dùng chung)."""
+
+    def __init__(self, epsilon: float = 0.01, keyframe_every: int = 30):
+        self.epsilon = max(0.0, epsilon)
+        self.keyframe_every = max(1, keyframe_every)
+        self._seq = 0
+        self._sys_sent: Dict[str, Any] = {}
+        self._svc_sent: Dict[str, Dict[str, Any]] = {}
+
+    def force_keyframe(self):
+        self._seq = 0
+
+    def encode(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """payload: frame combined gốc {"ts_ms", "system", "services": [ {...,"app_id"} ]}"""
+        services = {s["app_id"]: s for s in payload.get("services", [])}
+        is_key = self._seq % self.keyframe_every == 0
+        self._seq += 1
+
+        if is_key:
+            self._sys_sent = dict(payload.get("system") or {})
+            self._svc_sent = {sid: dict(s) for sid, s in services.items()}
+            return {
+                "type": "key",
+                "seq": self._seq,
+                "ts_ms": payload["ts_ms"],
+                "system": payload.get("system") or {},
+                "services": services,
+            }
+
+        sys_delta = _diff(self._sys_sent, payload.get("system") or {}, self.epsilon)
+        svc_delta: Dict[str, Dict[str, Any]] = {}
+        for sid, s in services.items():
+            sent: Optional[Dict[str, Any]] = self._svc_sent.get(sid)
+            if sent is None:
+                self._svc_sent[sid] = dict(s)
+                svc_delta[sid] = s
+                continue
+            d = _diff(sent, s, self.epsilon)
+            if d:
+                svc_delta[sid] = d
+        removed = [sid for sid in self._svc_sent if sid not in services]
+        for sid in removed:
+            self._svc_sent.pop(sid, None)
+
+        frame: Dict[str, Any] = {"type": "delta", "seq": self._seq, "ts_ms": payload["ts_ms"]}
+        if sys_delta:
+            frame["system"] = sys_delta
+        if svc_delta:
+            frame["services"] = svc_delta
+        if removed:
+            frame["removed"] = removed
+        return frame
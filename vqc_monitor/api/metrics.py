@@ -0,0 +1,87 @@
+# app/api/metrics.py
+"""
+GET /metrics: số liệu nội bộ dạng Prometheus text (core/instrument).
+- WebSocketMetricsMiddleware (ASGI thuần) đếm kết nối / client đang mở / message / bytes gửi theo route của
+  mọi handler websocket, không phải sửa từng handler. Label là path mẫu của route (vd /ws/apps/{app_id}/stats).
+- Các gauge (hàng đợi LogHub, alert worker, scheduler...) đọc lúc scrape qua accessor public của từng module;
+  giá trị chỉ tăng (drop, overrun, ring hit/miss) là counter *_total đếm tại chỗ xảy ra, không phải gauge.
+"""
+from typing import Dict
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from vqc_monitor.core.instrument import registry
+from vqc_monitor.core.logs import hub
+from vqc_monitor.core.alert_bus import alert_bus
+from vqc_monitor.metrics.alert_worker import alert_worker
+from vqc_monitor.metrics.container_feed import container_feed
+from vqc_monitor.metrics.history_feed import history_feed
+from vqc_monitor.metrics.scheduler import scheduler
+from vqc_monitor.metrics.burst import burst_capture
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_WS_CONNECTIONS = registry.counter("vqc_ws_connections_total", "Kết nối websocket đã accept", ("route",))
+_WS_MESSAGES = registry.counter("vqc_ws_messages_sent_total", "Message websocket đã gửi", ("route",))
+_WS_BYTES = registry.counter("vqc_ws_bytes_sent_total", "Bytes payload websocket đã gửi", ("route",))
+_ws_active: Dict[str, int] = {}
+
+
+def _route_path(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "?")
+
+
+class WebSocketMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await self.app(scope, receive, send)
+        conn = {}
+
+        async def send_wrapper(message):
+            t = message["type"]
+            if t == "websocket.send" and conn:
+                data = message.get("bytes")
+                if data is None:
+                    text = message.get("text") or ""
+                    n = len(text) if text.isascii() else len(text.encode())
+                else:
+                    n = len(data)
+                conn["messages"].inc()
+                conn["bytes"].inc(n)
+            elif t == "websocket.accept":
+                path = _route_path(scope)
+                conn.update(path=path, messages=_WS_MESSAGES.labels(path), bytes=_WS_BYTES.labels(path))
+                _WS_CONNECTIONS.labels(path).inc()
+                _ws_active[path] = _ws_active.get(path, 0) + 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if conn:
+                _ws_active[conn["path"]] -= 1
+
+
+registry.gauge("vqc_ws_clients", "Client websocket đang mở", lambda: {(p,): n for p, n in _ws_active.items()},
+               ("route",))
+registry.gauge("vqc_log_followers", "Service đang được follow journal", hub.follower_count)
+registry.gauge("vqc_log_subscribers", "Client đang nhận log", lambda: hub.queue_totals()[0])
+registry.gauge("vqc_log_queue_depth", "Tổng frame đang chờ gửi trong hàng đợi client log", lambda: hub.queue_totals()[1])
+registry.gauge("vqc_alert_queue_depth", "Tick chờ đánh giá alert", alert_worker.depth)
+registry.gauge("vqc_alert_lag_ms", "Độ trễ đánh giá alert của batch gần nhất", lambda: alert_worker.last_lag_ms)
+registry.gauge("vqc_alert_bus_subscribers", "Subscriber alert_bus", alert_bus.subscriber_count)
+registry.gauge("vqc_container_feed_subscribers", "Subscriber container_feed", container_feed.subscriber_count)
+registry.gauge("vqc_history_subscribers", "Chart lịch sử đang mở", history_feed.subscriber_count)
+registry.gauge("vqc_collector_sources", "Nguồn lấy mẫu đang lập lịch", scheduler.source_count)
+registry.gauge("vqc_burst_active", "App đang lấy mẫu burst", burst_capture.active_count)
+
+
+@router.get("/metrics")
+async def metrics():
+    # async: render trên event loop, gauge đọc dict của các module không bị sửa giữa chừng
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,400 @@
+# app/api/mux.py
+"""
+/ws/mux: 1 websocket, nhiều kênh. Client subscribe / unsubscribe bằng message trong kết nối.
+
+Client -> server (JSON):
+    {"op": "subscribe", "id": "<id tuỳ client>", "channel": "<kênh>", "params": {...}}
+    {"op": "unsubscribe", "id": "<id>"}
+    {"op": "ping"}
+Server -> client (JSON, binary frame):
+    {"op": "subscribed" | "unsubscribed", "id": ...}
+    {"op": "error", "id": ..., "detail": ...}
+    {"op": "skipped", "id": ..., "n": N}  # hàng đợi gửi của kết nối bị tràn, N frame cũ của kênh id bị bỏ
+    {"op": "pong"}
+    {"ch": "<id>", "data": <payload>}  # payload giống endpoint riêng tương ứng
+
+Kênh (params giống query của endpoint riêng):
+    live             /ws/live?mode=combined   services, interval_ms, proto, epsilon, keyframe_every, procs
+    containers       /ws/containers           container, interval_ms
+    alerts           /ws/alerts               app_id, limit
+    container_alerts /ws/container/alerts     container_name, limit
+    logs             /ws/logs                 service, tail, format, after_cursor, priority, include, ...
+    container_logs   /ws/containers/logs      container, tail, format, after_cursor, priority, include, ...
+    history          /ws/apps/{app_id}/stats  app_id, start, max_points, bucket_ms
+
+Mọi kênh lấy dữ liệu từ producer dùng chung (live_feed, container_feed, alert_bus, LogHub, ContainerLogHub)
+qua callback; mỗi kết nối chỉ có 1 hàng đợi gửi + 1 sender task (core/fanout.Subscriber), không có task / kênh.
+Khi hàng đợi tràn chỉ frame thay thế được (live, containers, log, partial của history) bị bỏ; reply, alert và
+bucket đã đóng của history luôn được gửi. Kênh live proto=2 bị bỏ frame thì frame kế tiếp là keyframe.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException, WebSocket
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
+from vqc_monitor.core.alert_bus import APP as BUS_APP, CONTAINER as BUS_CONTAINER, AlertBatch, alert_bus
+from vqc_monitor.core.config import settings
+from vqc_monitor.core.container_logs import _validate_container, container_log_hub
+from vqc_monitor.core.fanout import DROP_OLDEST, Subscriber
+from vqc_monitor.core.log_stream import json_skip_marker
+from vqc_monitor.core.logs import TAIL_DEFAULT, _build_filter, _validate_service, hub
+from vqc_monitor.core.serialization import dumps, loads
+from vqc_monitor.metrics.container_feed import container_feed
+from vqc_monitor.metrics.history_feed import HistoryStream
+from vqc_monitor.metrics.live_feed import live_feed
+from vqc_monitor.api.live_delta import DeltaEncoder
+from vqc_monitor.api.routers.alert import _load_alerts, _load_container_alerts
+
+MAX_CHANNELS = 32  # số kênh tối đa / kết nối
+ID_MAX_LEN = 64
+
+
+# ---------- params ----------
+class LiveParams(BaseModel):
+    services: Optional[List[str]] = None
+    interval_ms: int = Field(1000, ge=50, le=60000)
+    proto: int = Field(1, ge=1, le=2)
+    epsilon: Optional[float] = Field(None, ge=0)
+    keyframe_every: Optional[int] = Field(None, ge=1, le=3600)
+    procs: int = Field(0, ge=0, le=100)
+
+
+class ContainersParams(BaseModel):
+    container: Optional[str] = None
+    interval_ms: int = Field(5000, ge=50, le=60000)
+
+
+class AlertsParams(BaseModel):
+    app_id: Optional[str] = None
+    limit: int = Field(10, ge=1, le=1000)
+
+
+class ContainerAlertsParams(BaseModel):
+    container_name: Optional[str] = None
+    limit: int = Field(10, ge=1, le=1000)
+
+
+class HistoryParams(BaseModel):
+    app_id: str
+    start: int
+    max_points: int = Field(1000, ge=10, le=1000)
+    bucket_ms: Optional[int] = Field(None, ge=5000)
+
+
+class _LogParamsBase(BaseModel):
+    tail: int = Field(TAIL_DEFAULT, ge=0, le=5000)
+    format: str = Field("json", pattern="^(text|json)$")
+    after_cursor: Optional[str] = None
+    priority: Optional[str] = None
+    include: Optional[str] = Field(None, max_length=512)
+    exclude: Optional[str] = Field(None, max_length=512)
+    match: str = Field("substring", pattern="^(substring|regex)$")
+    ignore_case: bool = False
+    since_ms: Optional[int] = Field(None, ge=0)
+    until_ms: Optional[int] = Field(None, ge=0)
+
+    def build_filter(self):
+        return _build_filter(self.priority, self.include, self.exclude, self.match,
+                             self.ignore_case, self.since_ms, self.until_ms)
+
+
+class LogsParams(_LogParamsBase):
+    service: str
+
+
+class ContainerLogsParams(_LogParamsBase):
+    container: str
+
+
+# ---------- kết nối ----------
+class _ChannelSink:
+    """
+    Đứng thay fanout.Subscriber cho LogHub / ContainerLogHub: frame log (đã encode, dùng chung giữa client)
+    chỉ được bọc thêm prefix {"ch": id, "data": ...} rồi đưa vào hàng đợi chung của kết nối.
+    """
+    skip_marker = staticmethod(json_skip_marker)
+
+    def __init__(self, conn: "MuxConnection", ch_id: str):
+        self.conn = conn
+        self.ch_id = ch_id
+        self.closed = False
+        self._prefix = b'{"ch":' + dumps(ch_id) + b',"data":'
+
+    def put(self, item, weight: int = 1) -> bool:
+        if self.closed:
+            return False
+        if isinstance(item, str):
+            item = dumps(item)
+        return self.conn.out.put(self._prefix + item + b"}", weight=weight, tag=self.ch_id)
+
+    def stats(self) -> dict:
+        return {**self.conn.out.stats(), "channel": self.ch_id}
+
+    async def close(self):
+        self.closed = True
+
+
+Cleanup = Callable[[], Awaitable[None]]
+
+
+class MuxConnection:
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.out = Subscriber(
+            ws,
+            maxsize=settings.LOG_QUEUE_MAX,
+            policy=DROP_OLDEST,
+            skip_marker=lambda n, ch_id=None: dumps({"op": "skipped", "id": ch_id, "n": n}),
+            on_evict=self._on_evict,
+        ).start()
+        self.channels: Dict[str, Optional[Cleanup]] = {}  # None = đang mở
+        self._opening: Dict[str, asyncio.Task] = {}
+        self.drop_hooks: Dict[str, Callable[[], None]] = {}  # ch_id -> gọi khi 1 frame của kênh bị bỏ
+
+    def send(self, ch_id: str, data, keep: bool = False):
+        """keep=True: frame không thay thế được (alert, bucket...), không bị bỏ khi hàng đợi tràn."""
+        self.out.put(dumps({"ch": ch_id, "data": data}), tag=ch_id, keep=keep)
+
+    def send_encoded(self, ch_id: str, data: bytes, keep: bool = False):
+        """data: JSON đã encode sẵn (dùng chung giữa các client), chỉ bọc thêm {"ch": id, "data": ...}."""
+        self.out.put(b'{"ch":' + dumps(ch_id) + b',"data":' + data + b"}", tag=ch_id, keep=keep)
+
+    def reply(self, **msg):
+        self.out.put(dumps(msg), keep=True)
+
+    def _on_evict(self, ch_id, weight: int):
+        fn = self.drop_hooks.get(ch_id)
+        if fn is not None:
+            fn()
+
+    def handle(self, raw):
+        try:
+            req = loads(raw)
+        except ValueError:
+            self.reply(op="error", detail="Invalid JSON")
+            return
+        if not isinstance(req, dict):
+            self.reply(op="error", detail="Invalid message")
+            return
+        op = req.get("op")
+        ch_id = req.get("id")
+        if op == "ping":
+            self.reply(op="pong")
+        elif op == "subscribe":
+            channel = req.get("channel")
+            if not isinstance(ch_id, str) or not ch_id or len(ch_id) > ID_MAX_LEN:
+                self.reply(op="error", id=ch_id, detail="Invalid channel id")
+            elif ch_id in self.channels:
+                self.reply(op="error", id=ch_id, detail="Channel id already in use")
+            elif len(self.channels) >= MAX_CHANNELS:
+                self.reply(op="error", id=ch_id, detail="Too many channels")
+            elif channel not in _OPENERS:
+                self.reply(op="error", id=ch_id, detail=f"Unknown channel: {channel}")
+            else:
+                # mở kênh trong task riêng (backlog log / snapshot alert có thể mất thời gian)
+                # để không chặn message khác của kết nối
+                self.channels[ch_id] = None
+                self._opening[ch_id] = asyncio.create_task(self._open(ch_id, channel, req.get("params") or {}))
+        elif op == "unsubscribe":
+            if ch_id not in self.channels:
+                self.reply(op="error", id=ch_id, detail="Unknown channel id")
+            else:
+                asyncio.create_task(self._close_channel(ch_id, notify=True))
+        else:
+            self.reply(op="error", id=ch_id, detail=f"Unknown op: {op}")
+
+    async def _open(self, ch_id: str, channel: str, params: dict):
+        try:
+            cleanup = await _OPENERS[channel](self, ch_id, params)
+        except ValidationError as e:
+            self._fail(ch_id, e.errors(include_url=False, include_context=False))
+            return
+        except HTTPException as e:
+            self._fail(ch_id, e.detail)
+            return
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            self._fail(ch_id, str(e))
+            return
+        finally:
+            self._opening.pop(ch_id, None)
+        self.channels[ch_id] = cleanup
+        self.reply(op="subscribed", id=ch_id)
+
+    def _fail(self, ch_id: str, detail):
+        self.channels.pop(ch_id, None)
+        self.reply(op="error", id=ch_id, detail=detail)
+
+    async def _close_channel(self, ch_id: str, notify: bool = False):
+        task = self._opening.pop(ch_id, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        cleanup = self.channels.pop(ch_id, None)
+        self.drop_hooks.pop(ch_id, None)
+        if cleanup is not None:
+            await cleanup()
+        if notify:
+            self.reply(op="unsubscribed", id=ch_id)
+
+    async def close(self):
+        for ch_id in list(self.channels):
+            try:
+                await self._close_channel(ch_id)
+            except Exception as e:
+                print(f"[WARN] mux: đóng kênh {ch_id} lỗi: {e}")
+        await self.out.close()
+
+
+# ---------- mở kênh ----------
+async def _open_live(conn: MuxConnection, ch_id: str, params: dict) -> Cleanup:
+    p = LiveParams(**params)
+    encoder = None
+    if p.proto == 2:
+        encoder = DeltaEncoder(
+            epsilon=settings.LIVE_DELTA_EPSILON if p.epsilon is None else p.epsilon,
+            keyframe_every=settings.LIVE_KEYFRAME_EVERY if p.keyframe_every is None else p.keyframe_every,
+        )
+    sub = live_feed.subscribe(p.services, p.interval_ms, lambda data: conn.send_encoded(ch_id, data), encoder, p.procs)
+    if encoder is not None:
+        def on_drop():
+            # delta còn trong hàng đợi dựa trên frame client không nhận được: bỏ luôn, frame kế tiếp là keyframe
+            conn.out.discard(ch_id)
+            encoder.force_keyframe()
+        conn.drop_hooks[ch_id] = on_drop
+
+    async def cleanup():
+        live_feed.unsubscribe(sub)
+    return cleanup
+
+
+async def _open_containers(conn: MuxConnection, ch_id: str, params: dict) -> Cleanup:
+    p = ContainersParams(**params)
+    if p.container is not None:
+        p.container = _validate_container(p.container)
+    sub = container_feed.subscribe(
+        p.container, p.interval_ms,
+        on_frame=lambda data: conn.send_encoded(ch_id, data),
+    )
+
+    async def cleanup():
+        container_feed.unsubscribe(sub)
+    return cleanup
+
+
+def _alert_opener(kind: str, model, key_field: str, load: Callable[[Optional[str], int], list]):
+    async def opener(conn: MuxConnection, ch_id: str, params: dict) -> Cleanup:
+        p = model(**params)
+        key = getattr(p, key_field)
+        # giống api/routers/alert._serve_alerts: subscribe trước, gửi snapshot, rồi chỉ gửi alert mới hơn snapshot
+        state = {"seen_id": None, "pending": []}
+
+        def on_batch(batch):
+            if state["seen_id"] is None:
+                state["pending"].extend(batch)
+                return
+            if isinstance(batch, AlertBatch) and all((a.get("id") or 0) > state["seen_id"] for a in batch):
+                conn.send_encoded(ch_id, batch.frame, keep=True)
+                return
+            batch = [a for a in batch if (a.get("id") or 0) > state["seen_id"]]
+            if batch:
+                conn.send(ch_id, {"type": "new", "alerts": batch}, keep=True)
+
+        sub = alert_bus.subscribe(kind, key, on_batch=on_batch)
+        try:
+            initial = await run_in_threadpool(load, key, p.limit)
+        except BaseException:
+            alert_bus.unsubscribe(sub)
+            raise
+        state["seen_id"] = max((a.get("id") or 0 for a in initial), default=0)
+        conn.send(ch_id, {"type": "snapshot", "alerts": initial}, keep=True)
+        pending, state["pending"] = state["pending"], []
+        if pending:
+            on_batch(pending)
+
+        async def cleanup():
+            alert_bus.unsubscribe(sub)
+        return cleanup
+    return opener
+
+
+async def _open_logs(conn: MuxConnection, ch_id: str, params: dict) -> Cleanup:
+    p = LogsParams(**params)
+    svc = _validate_service(p.service)
+    sink = _ChannelSink(conn, ch_id)
+
+    async def cleanup():
+        await hub.unsubscribe(svc, sink)
+    try:
+        await hub.subscribe(svc, None, p.tail, fmt=p.format, after_cursor=p.after_cursor,
+                            flt=p.build_filter(), sink=sink)
+    except BaseException:
+        await cleanup()
+        raise
+    return cleanup
+
+
+async def _open_container_logs(conn: MuxConnection, ch_id: str, params: dict) -> Cleanup:
+    p = ContainerLogsParams(**params)
+    name = _validate_container(p.container)
+    sink = _ChannelSink(conn, ch_id)
+
+    async def cleanup():
+        await container_log_hub.unsubscribe(name, sink)
+    try:
+        await container_log_hub.subscribe(name, None, p.tail, fmt=p.format, after_cursor=p.after_cursor,
+                                          flt=p.build_filter(), sink=sink)
+    except BaseException:
+        await cleanup()
+        raise
+    return cleanup
+
+
+async def _open_history(conn: MuxConnection, ch_id: str, params: dict) -> Cleanup:
+    p = HistoryParams(**params)
+    def emit(msg: dict):
+        if msg["type"] == "partial":
+            # partial của kênh chưa gửi được thay bằng partial mới nhất; history / bucket không bị bỏ
+            conn.out.discard(ch_id, report=False)
+            conn.send(ch_id, msg)
+        else:
+            conn.send(ch_id, msg, keep=True)
+
+    stream = HistoryStream(p.app_id, p.start, p.bucket_ms, emit, p.max_points)
+    await stream.open(int(time.time() * 1000))
+
+    async def cleanup():
+        stream.close()
+    return cleanup
+
+
+_OPENERS = {
+    "live": _open_live,
+    "containers": _open_containers,
+    "alerts": _alert_opener(BUS_APP, AlertsParams, "app_id", _load_alerts),
+    "container_alerts": _alert_opener(BUS_CONTAINER, ContainerAlertsParams, "container_name", _load_container_alerts),
+    "logs": _open_logs,
+    "container_logs": _open_container_logs,
+    "history": _open_history,
+}
+
+
+async def serve(ws: WebSocket):
+    conn = MuxConnection(ws)
+    try:
+        while True:
+            msg = await ws.receive()
+            if msg.get("type") == "websocket.disconnect":
+                return
+            raw = msg.get("text")
+            if raw is None:
+                raw = msg.get("bytes")
+            if raw:
+                conn.handle(raw)
+    finally:
+        await conn.close()
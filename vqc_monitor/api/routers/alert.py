@@ -1,11 +1,19 @@
 # app/api/ws_alerts.py
 import time, asyncio
-from typing import Optional, Any, Dict, Iterable
-from fastapi import APIRouter, WebSocket, Query
+from typing import Optional, Any, Dict, Iterable, List, Callable
+from fastapi import APIRouter, HTTPException, WebSocket, Query
+from pydantic import BaseModel
 from fastapi.websockets import WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import text
 from vqc_monitor.db.base import SessionLocal
 from vqc_monitor.db import repo
+from vqc_monitor.core.alert_bus import alert_bus, APP as BUS_APP, CONTAINER as BUS_CONTAINER
+from vqc_monitor.core.serialization import send_json_bytes
+from vqc_monitor.api.ws_utils import iter_queue
+from vqc_monitor.metrics.alert_worker import alert_worker
+from vqc_monitor.core.notify import notifier
+from vqc_monitor.metrics.replay import replay
 
 router = APIRouter()
 
@@ -57,64 +65,107 @@ def to_jsonable_container_alert(a: Any) -> Dict[str, Any]:
             "value": getattr(a, "value", None),
         }
 
+def _load_alerts(app_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    # chạy trong threadpool, session chỉ mở trong lúc query
+    with SessionLocal() as db:
+        return [repo.alert_to_dict(a) for a in repo.get_alerts(db, app_id=app_id, limit=limit)]
+
+
+def _load_container_alerts(container_name: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    with SessionLocal() as db:
+        return [repo.container_alert_to_dict(a) for a in repo.get_container_alerts(db, limit=limit, container_name=container_name)]
+
+
+async def _serve_alerts(ws: WebSocket, kind: str, key: Optional[str], load: Callable[[], List[Dict[str, Any]]]):
+    """
+    1) Subscribe vào alert_bus TRƯỚC khi query để không lỡ alert commit giữa chừng.
+    2) Gửi {"type": "snapshot", "alerts": [...limit alert mới nhất...]} đúng 1 lần.
+    3) Sau đó chỉ push {"type": "new", "alerts": [...]} khi có alert mới -> idle không chạm DB.
+    """
+    sub = alert_bus.subscribe(kind, key)
+    try:
+        initial = await run_in_threadpool(load)
+        seen_id = max((a.get("id") or 0 for a in initial), default=0)
+        await send_json_bytes(ws, {"type": "snapshot", "alerts": initial})
+
+        async for batch in iter_queue(ws, sub.queue):
+            # alert đã có trong snapshot thì bỏ (id tăng dần); batch nguyên vẹn -> gửi frame đã encode sẵn
+            if all((a.get("id") or 0) > seen_id for a in batch):
+                await send_json_bytes(ws, batch.frame)
+                continue
+            batch = [a for a in batch if (a.get("id") or 0) > seen_id]
+            if batch:
+                await send_json_bytes(ws, {"type": "new", "alerts": batch})
+    except WebSocketDisconnect:
+        return
+    finally:
+        alert_bus.unsubscribe(sub)
+
+
 @router.websocket("/ws/alerts")
 async def alerts_ws(
     ws: WebSocket,
     app_id: Optional[str] = Query(None, description="Lọc theo app_id"),
     limit: int = Query(10, description="Số lượng alert tối đa trả về")
 ):
-    alerts_list_prev = []
-    alerts_list = []
     await ws.accept()
+    await _serve_alerts(ws, BUS_APP, app_id, lambda: _load_alerts(app_id, limit))
 
 
-
-    try:
-        # 1) Gửi lịch sử trong [ts_from, ts_to]
-        with SessionLocal() as db:
-            while True:
-                if alerts_list_prev == alerts_list and alerts_list:
-                    await asyncio.sleep(5)
-                    continue
-
-                alerts_list = repo.get_alerts(db, app_id=app_id, limit=limit)  # đảm bảo hàm này trả list
-                alerts_jsonable = [to_jsonable_alert(a) for a in alerts_list]
-                await ws.send_json({"alerts": alerts_jsonable})
-                alerts_list_prev = alerts_list
-                await asyncio.sleep(10)
-
-    except WebSocketDisconnect:
-        return
-    finally:
-        db.close()
-
 @router.websocket("/ws/container/alerts")
-async def alerts_ws(
+async def container_alerts_ws(
     ws: WebSocket,
     container_name: Optional[str] = Query(None, description="Lọc theo container_name"),
     limit: int = Query(10, description="Số lượng alert tối đa trả về")
 ):
-    alerts_list_prev = []
-    alerts_list = []
     await ws.accept()
+    await _serve_alerts(ws, BUS_CONTAINER, container_name, lambda: _load_container_alerts(container_name, limit))
 
 
+@router.get("/alerts/worker/stats")
+def alert_worker_stats():
+    """Hàng đợi đánh giá alert: độ sâu, tick bị bỏ, độ trễ + thống kê rule engine."""
+    return alert_worker.stats()
 
-    try:
-        # 1) Gửi lịch sử trong [ts_from, ts_to]
-        with SessionLocal() as db:
-            while True:
-                if alerts_list_prev == alerts_list and alerts_list:
-                    await asyncio.sleep(5)
-                    continue
-
-                alerts_list = repo.get_container_alerts(db, limit=limit, container_name=container_name)  # đảm bảo hàm này trả list
-                alerts_jsonable = [to_jsonable_container_alert(a) for a in alerts_list]
-                await ws.send_json({"alerts": alerts_jsonable})
-                alerts_list_prev = alerts_list
-                await asyncio.sleep(10)
 
-    except WebSocketDisconnect:
-        return
-    finally:
-        db.close()
\ No newline at end of file
+@router.get("/alerts/notify/stats")
+def alert_notify_stats():
+    """Gửi thông báo: số alert nhận / bỏ trùng, và theo từng sink: đã gửi, lỗi, retry, độ trễ."""
+    return notifier.stats()
+
+
+@router.post("/alerts/notify/test")
+async def alert_notify_test():
+    """Gửi 1 alert thử tới mọi sink đã cấu hình."""
+    return {"sinks": notifier.send_test()}
+
+
+class ReplayRequest(BaseModel):
+    start_ms: int
+    end_ms: int
+    scope: str = "app"  # "app" | "container"
+    entities: Optional[List[str]] = None  # None = mọi entity trong config (+ __system__)
+    cpu_threshold: Optional[float] = None  # áp cho mọi entity
+    memory_threshold_mb: Optional[float] = None
+    thresholds: Dict[str, Dict[str, float]] = {}  # {entity: {"cpu": .., "memory": ..}}, ưu tiên nhất
+    window_ms: Optional[int] = None
+    coverage: Optional[float] = None
+    cooldown_ms: Optional[int] = None
+
+
+@router.post("/alerts/replay")
+def alert_replay(req: ReplayRequest):
+    """Chạy lại rule cpu/memory trên samples lịch sử với ngưỡng thử; không ghi DB."""
+    with SessionLocal() as db:
+        try:
+            return replay(db, req.start_ms, req.end_ms, req.scope, req.entities, req.cpu_threshold,
+                          req.memory_threshold_mb, req.thresholds, req.window_ms, req.coverage, req.cooldown_ms)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+
+@router.get("/alerts/{alert_id}/hires")
+def alert_hires(alert_id: int):
+    """Sample độ phân giải cao (burst) quanh alert, rỗng nếu không có burst cho alert này."""
+    with SessionLocal() as db:
+        return {"alert_id": alert_id, "samples": repo.get_hires_samples(db, alert_id)}
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query
 from vqc_monitor.api.deps import get_db
 from vqc_monitor.db import repo
-from vqc_monitor.core.config import reload_list_services
+from vqc_monitor.core.config import reload_list_services, resolve_service_to_cgroup, settings
+from vqc_monitor.metrics.procs import SORT_KEYS, proc_samplers, top as top_procs
 from vqc_monitor.core import app_control
 
 
@@ -26,4 +29,41 @@ def get_system_thresholds():
         "cpu_threshold": settings.CPU_THRESHOLD,
         "memory_threshold": settings.MEMORY_THRESHOLD,
         "disk_threshold": settings.DISK_THRESHOLD
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/apps/{app_id}/procs")
+async def top_app_procs(
+    app_id: str,
+    top: int = Query(10, ge=1, le=500),
+    sort: str = Query("cpu_percent", description="|".join(SORT_KEYS)),
+):
+    """Top N process trong cgroup của service (CPU%, RSS, IO). Lần gọi đầu đo 2 lần cách nhau 0.5s."""
+    if app_id not in settings.APPS:
+        raise HTTPException(404, "App not found")
+    if sort not in SORT_KEYS:
+        raise HTTPException(400, f"sort must be one of {', '.join(SORT_KEYS)}")
+    # cgroup từ config / discovery; service trong config chưa chạy lúc nạp config thì hỏi systemctl (trong thread)
+    info = settings.APPS[app_id]
+    cg = info.cgroup
+    if not cg and not info.discovered:
+        cg = await asyncio.to_thread(resolve_service_to_cgroup, app_id)
+    if not cg:
+        raise HTTPException(404, "Service is not running")
+    sampler = proc_samplers.get(str(cg))
+    try:
+        procs = sampler.sample()
+        if not procs:
+            # chưa có baseline cho rate
+            await asyncio.sleep(0.5)
+            procs = sampler.sample()
+    except FileNotFoundError:
+        proc_samplers.discard(str(cg))
+        raise HTTPException(404, "Service is not running")
+    return {
+        "app_id": app_id,
+        "ts_ms": int(time.time() * 1000),
+        "pids": sampler.pid_count,
+        "sampled_max": settings.PROC_SAMPLE_MAX,
+        "procs": top_procs(procs, top, sort),
+    }
@@ -1,9 +1,18 @@
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+import time
+from fastapi import APIRouter, Depends, Query, HTTPException, WebSocket, WebSocketDisconnect
 from vqc_monitor.api.deps import get_db, db_context
 from vqc_monitor.db import repo
 from datetime import datetime, timedelta
 from vqc_monitor.db.repo import get_stats
+from vqc_monitor.api.ws_utils import wait_disconnect
+from vqc_monitor.core.fanout import DROP_OLDEST, Subscriber
+from vqc_monitor.core.serialization import dumps
+from vqc_monitor.metrics.history_feed import HistoryStream
+from vqc_monitor.metrics.scheduler import scheduler
+from vqc_monitor.metrics.discovery import discovery
+from vqc_monitor.metrics.burst import burst_capture
+from vqc_monitor.core.deadband import deadband
 
 router = APIRouter()
 
@@ -25,6 +34,13 @@ router = APIRouter()
 
 DEFAULT_MAX_POINTS = 1000
 
+
+@router.get("/collector/stats")
+def collector_stats():
+    """Lịch lấy mẫu: chu kỳ, độ trễ so với deadline, overrun theo từng nguồn + thời gian mỗi batch."""
+    return {"scheduler": scheduler.stats(), "discovery": discovery.stats(), "burst": burst_capture.stats(),
+            "deadband": deadband.stats()}
+
 @router.get("/apps/{app_id}/stats")
 def get_stats_bucketed(
     app_id: str,
@@ -37,7 +53,43 @@ def get_stats_bucketed(
     stats = repo.get_stats(db, app_id, start, end, max_points, bucket_ms)
     return stats
 
-    
+
+
+@router.websocket("/ws/apps/{app_id}/stats")
+async def stats_ws(
+    ws: WebSocket,
+    app_id: str,
+    start: int = Query(..., description="epoch ms"),
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=10, le=1000),
+    bucket_ms: int | None = Query(None, ge=5000),
+):
+    """
+    Giống GET /apps/{app_id}/stats (end = hiện tại) nhưng tự nối dài:
+    gửi {"type":"history"} 1 lần, sau đó {"type":"bucket"} khi 1 bucket đóng và
+    {"type":"partial"} (bucket đang chạy) mỗi lần collector ghi sample. Xem metrics/history_feed.py.
+    Client chậm: history / bucket không bao giờ bị bỏ, partial chưa gửi được thay bằng partial mới nhất.
+    """
+    await ws.accept()
+    out = Subscriber(ws, maxsize=256, policy=DROP_OLDEST,
+                     skip_marker=lambda n, tag=None: dumps({"type": "skipped", "n": n})).start()
+
+    def emit(msg: dict):
+        if msg["type"] == "partial":
+            out.discard("partial", report=False)
+            out.put(dumps(msg), tag="partial")
+        else:
+            out.put(dumps(msg), keep=True)
+
+    stream = HistoryStream(app_id, start, bucket_ms, emit, max_points)
+    try:
+        await stream.open(int(time.time() * 1000))
+        await wait_disconnect(ws)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream.close()
+        await out.close()
+
 
 @router.get("/apps/{app_id}/state_timelines")
 def get_state_timelines(
@@ -1,16 +1,21 @@
 # app/api/ws.py
-import json, time, asyncio
+import time, asyncio
 from typing import List, Dict, Tuple, Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from vqc_monitor.core.logs import _validate_service, LogHub
+from vqc_monitor.core.logs import _build_filter, _validate_service, hub
+from vqc_monitor.core.container_logs import _validate_container, container_log_hub
 from vqc_monitor.metrics.cgroup import snapshot as cg_snapshot, compute_rates as cg_rates
 from vqc_monitor.metrics.system import snapshot as sys_snapshot, compute_rates as sys_rates
 from vqc_monitor.core.config import resolve_service_to_cgroup, settings, list_services
 from vqc_monitor.metrics.cgroup import get_service_uptime
-from vqc_monitor.metrics.collector import get_metrics_from_containers
+from vqc_monitor.metrics.container_feed import container_feed
+from vqc_monitor.metrics.live_feed import live_feed
+from vqc_monitor.api.ws_utils import iter_queue, wait_disconnect
+from vqc_monitor.core.serialization import send_json_bytes
+from vqc_monitor.api.live_delta import DeltaEncoder
+from vqc_monitor.api import mux
 
 TAIL_DEFAULT = 200
-hub = LogHub()
 
 router = APIRouter()
 
@@ -21,17 +26,27 @@ async def ws_live(
     app_id: str | None = Query(None, description="Khi mode=service"),
     services: str | None = Query(None, description="CSV app_ids; nếu bỏ trống sẽ lấy tất cả trackable"),
     interval_ms: int = Query(1000, ge=50, le=60000),
+    proto: int = Query(1, ge=1, le=2, description="2 = keyframe + delta (chỉ mode=combined)"),
+    epsilon: float | None = Query(None, ge=0, description="Sai số tương đối để coi là thay đổi (proto=2)"),
+    keyframe_every: int | None = Query(None, ge=1, le=3600, description="Số frame giữa 2 keyframe (proto=2)"),
+    procs: int = Query(0, ge=0, le=100, description="Kèm top N process trong mỗi service (mode=combined)"),
 ):
     """
     - mode=service  : số liệu realtime cho 1 service (giữ nguyên hành vi cũ)
     - mode=system   : số liệu realtime cho system (giữ nguyên hành vi cũ)
     - mode=combined : gộp system + nhiều services trong 1 payload
       + query ?services=nginx,postgres  (CSV); nếu None: lấy all trackable từ settings.APPS
+      + proto=2: gửi 1 keyframe rồi chỉ gửi delta (xem api/live_delta.py), keyframe định kỳ để resync
+      + procs=N: mỗi service kèm "procs": top N process theo CPU (xem metrics/procs.py)
     """
     await ws.accept()
 
     if mode == "service":
-        cgroup_path = resolve_service_to_cgroup(app_id) if app_id else None
+        info = settings.APPS.get(app_id) if app_id else None
+        cgroup_path = info.cgroup if info is not None else None
+        if app_id and not cgroup_path and (info is None or not info.discovered):
+            # service chưa có cgroup trong config: hỏi systemctl trong thread, không chặn event loop
+            cgroup_path = await asyncio.to_thread(resolve_service_to_cgroup, app_id)
         if not app_id or not cgroup_path:
             await ws.close(code=1002)
             return
@@ -45,7 +60,7 @@ async def ws_live(
                 rates = cg_rates(prev, curr, max(1e-6, t1 - t0))
                 rates["ts_ms"] = int(t1 * 1000)
                 rates["app_id"] = app_id
-                await ws.send_text(json.dumps(rates))
+                await send_json_bytes(ws, rates)
                 prev, t0 = curr, t1
         except WebSocketDisconnect:
             return
@@ -65,95 +80,43 @@ async def ws_live(
     #             rates["disk_used_percent"] = curr.get("disk_used_percent")
     #             rates["ts_ms"] = int(t1 * 1000)
     #             rates["app_id"] = "__system__"
-    #             await ws.send_text(json.dumps(rates))
+    #             await send_json_bytes(ws, rates)
     #             prev, t0 = curr, t1
     #     except WebSocketDisconnect:
     #         return
 
     # mode == "combined" Chi dung loai nay
-        # Chuẩn bị danh sách service theo query hoặc tất cả trackable
-    if services:
-        req_ids = [s.strip() for s in services.split(",") if s.strip()]
-    else:
-        # chọn tất cả service trackable từ config
-        req_ids = [sid for sid, info in settings.APPS.items() if getattr(info, "trackable", True)]
-
-    # Tạo map app_id -> cgroup_path (lọc ra cái hợp lệ)
-    svc_map: Dict[str, str] = {}
-    for sid in req_ids:
-        cg = resolve_service_to_cgroup(sid)
-        if cg:
-            svc_map[sid] = cg
-
-    # prev snapshots per service trong vòng đời kết nối
-    prev_svc: Dict[str, Tuple[dict, float]] = {}
-    # prev system
-    prev_sys = sys_snapshot()
-    t0_sys = time.time()
-
+    # Số liệu lấy từ live_feed (1 task đọc /proc + cgroup dùng chung mọi kết nối, cùng nguồn với kênh live của
+    # /ws/mux). Services None = tất cả trackable, tính lại mỗi tick nên app mới / discovery có ngay.
+    req_ids = [s.strip() for s in services.split(",") if s.strip()] if services else None
+
+    encoder = None
+    if proto == 2:
+        encoder = DeltaEncoder(
+            epsilon=settings.LIVE_DELTA_EPSILON if epsilon is None else epsilon,
+            keyframe_every=settings.LIVE_KEYFRAME_EVERY if keyframe_every is None else keyframe_every,
+        )
+
+    # chỉ giữ frame mới nhất: client chậm bỏ frame cũ thay vì tích tụ độ trễ
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    def on_frame(data: bytes):
+        if queue.full():
+            if encoder is not None:
+                # delta phụ thuộc frame trước: không thay frame đang chờ, ép keyframe ở lần sau để resync
+                encoder.force_keyframe()
+                return
+            queue.get_nowait()
+        queue.put_nowait(data)
+
+    sub = live_feed.subscribe(req_ids, interval_ms, on_frame, encoder, procs)
     try:
-        while True:
-            await asyncio.sleep(max(0.05, interval_ms / 1000))
-            now = time.time()
-
-            # --- system ---
-            curr_sys = sys_snapshot()
-            sys_rates_now = sys_rates(prev_sys, curr_sys, max(1e-6, now - t0_sys))
-            sys_payload = {
-                "cpu_percent": sys_rates_now["cpu_percent"],
-                "mem_bytes":   sys_rates_now["mem_bytes"],
-                "read_Bps":    sys_rates_now["read_Bps"],
-                "write_Bps":   sys_rates_now["write_Bps"],
-                "net_rx_Bps":  sys_rates_now.get("net_rx_Bps", 0.0),
-                "net_tx_Bps":  sys_rates_now.get("net_tx_Bps", 0.0),
-                # usage tức thời
-                "disk_used_bytes":   curr_sys.get("disk_used_bytes"),
-                "disk_total_bytes":  curr_sys.get("disk_total_bytes"),
-                "disk_used_percent": curr_sys.get("disk_used_percent"),
-                "total_ram": settings.TOTAL_RAM_BYTES,
-                "cpu_threshold": settings.CPU_THRESHOLD,
-                "memory_threshold": settings.MEMORY_THRESHOLD,
-            }
-            prev_sys, t0_sys = curr_sys, now
-
-            # --- services ---
-            services_payload = []
-            for sid, cgpath in list(svc_map.items()):
-                try:
-                    
-                    curr = cg_snapshot(cgpath)
-                except FileNotFoundError:
-                    # cgroup biến mất (service dừng) -> loại khỏi vòng lặp
-                    prev_svc.pop(sid, None)
-                    svc_map.pop(sid, None)
-                    continue
-
-                if sid in prev_svc:
-                    prev_snap, t0 = prev_svc[sid]
-                    dt = max(1e-6, now - t0)
-                    r = cg_rates(prev_snap, curr, dt)
-
-                    services_payload.append({
-                        "app_id": sid,
-                        "cpu_percent": r["cpu_percent"],
-                        "mem_bytes":   r["mem_bytes"],
-                        # Nếu muốn thêm IO:
-                        # "read_Bps": r["read_Bps"], "write_Bps": r["write_Bps"]
-                        "cpu_threshold": getattr(settings.APPS.get(sid), "cpu_threshold", None),
-                        "memory_threshold_mb": getattr(settings.APPS.get(sid), "memory_threshold_mb", None),
-                        "uptime": get_service_uptime(sid),
-                    })
-                prev_svc[sid] = (curr, now)
-
-            payload = {
-                "ts_ms": int(now * 1000),
-                "system": sys_payload,
-                "services": services_payload,
-            }
-
-            await ws.send_text(json.dumps(payload))
+        async for data in iter_queue(ws, queue):
+            await send_json_bytes(ws, data)
     except WebSocketDisconnect:
         return
+    finally:
+        live_feed.unsubscribe(sub)
 
 
 @router.websocket("/ws/logs")
@@ -161,65 +124,88 @@ async def logs_ws(
     ws: WebSocket,
     service: str = Query(..., description="e.g. nginx or nginx.service"),
     tail: int = Query(TAIL_DEFAULT, ge=0, le=5000),
+    overflow: str | None = Query(None, pattern="^(drop_oldest|disconnect)$", description="Mặc định theo config"),
+    format: str = Query("text", pattern="^(text|json)$", description="json: frame kèm cursor để resume"),
+    after_cursor: str | None = Query(None, description="Resume: chỉ gửi các dòng sau cursor này (bỏ qua tail)"),
+    priority: str | None = Query(None, description="Mức tối đa: 0..7 hoặc emerg|alert|crit|err|warning|notice|info|debug"),
+    include: str | None = Query(None, max_length=512, description="Chỉ giữ dòng chứa chuỗi / khớp regex"),
+    exclude: str | None = Query(None, max_length=512, description="Bỏ dòng chứa chuỗi / khớp regex"),
+    match: str = Query("substring", pattern="^(substring|regex)$"),
+    ignore_case: bool = Query(False),
+    since_ms: int | None = Query(None, ge=0),
+    until_ms: int | None = Query(None, ge=0),
 ):
+    """
+    Stream log 1 service. Filter (priority / include / exclude / since_ms / until_ms) được
+    compile 1 lần và áp dụng phía server trước khi vào hàng đợi của client, cho cả tail lẫn live.
+    """
     await ws.accept()
     svc = _validate_service(service)
+    flt = _build_filter(priority, include, exclude, match, ignore_case, since_ms, until_ms)
     try:
-        await hub.subscribe(svc, ws, tail)
-        while True:
-            await asyncio.sleep(60)
+        await hub.subscribe(svc, ws, tail, overflow, fmt=format, after_cursor=after_cursor, flt=flt)
+        await wait_disconnect(ws)
     except WebSocketDisconnect:
         pass
     finally:
         # fix tên hàm (trước đây có khoảng trắng)
         await hub.unsubscribe(svc, ws)
 
+@router.websocket("/ws/containers/logs")
+async def container_logs_ws(
+    ws: WebSocket,
+    container: str = Query(..., description="Tên container (phải có trong config)"),
+    tail: int = Query(TAIL_DEFAULT, ge=0, le=5000),
+    overflow: str | None = Query(None, pattern="^(drop_oldest|disconnect)$", description="Mặc định theo config"),
+    format: str = Query("text", pattern="^(text|json)$", description="json: frame kèm cursor (timestamp docker) để resume"),
+    after_cursor: str | None = Query(None, description="Resume: chỉ gửi các dòng sau timestamp này (bỏ qua tail)"),
+    priority: str | None = Query(None, description="err: chỉ stderr"),
+    include: str | None = Query(None, max_length=512),
+    exclude: str | None = Query(None, max_length=512),
+    match: str = Query("substring", pattern="^(substring|regex)$"),
+    ignore_case: bool = Query(False),
+    since_ms: int | None = Query(None, ge=0),
+    until_ms: int | None = Query(None, ge=0),
+):
+    """Giống /ws/logs nhưng cho container (docker logs -f), 1 follower / container dùng chung."""
+    await ws.accept()
+    name = _validate_container(container)
+    flt = _build_filter(priority, include, exclude, match, ignore_case, since_ms, until_ms)
+    try:
+        await container_log_hub.subscribe(name, ws, tail, overflow, fmt=format, after_cursor=after_cursor, flt=flt)
+        await wait_disconnect(ws)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await container_log_hub.unsubscribe(name, ws)
+
 @router.websocket("/ws/containers")
 async def ws_containers(
     ws: WebSocket,
-    container: str = Query(None, description="Tên container"),
+    container: str = Query(None, description="Tên container (phải có trong config)"),
     interval_ms: int = Query(5000, ge=50, le=60000),
 ):
     """
     WebSocket để gửi số liệu realtime của container.
+    Dữ liệu lấy từ container_feed (1 lần docker stats / chu kỳ, dùng chung với Collector),
+    nên tần suất thực tế không nhanh hơn chu kỳ lấy mẫu của collector.
     """
     
     await ws.accept()
+    if container is not None:
+        container = _validate_container(container)
+    sub = container_feed.subscribe(container, interval_ms)
     try:
-        while True:
-            if not container:
-                metrics = get_metrics_from_containers(settings.CONTAINERS.keys())
-            else:
-                metrics = get_metrics_from_containers([container])
-            container_payload = []
-            if container is not None:
-                payload = {}
-                data = metrics.get(container)
-                if data:
-                    payload = {
-                        "ts_ms": int(time.time() * 1000),
-                        "container_name": container,
-                        "cpu_percent": data["cpu_percent"],
-                        "mem_bytes": data["mem_bytes"],
-                        "mem_limit": data["mem_limit"],
-                    }
-                    await ws.send_text(json.dumps(payload))
-
-            else:
-                for name, data in metrics.items():
-
-                    container_payload.append({
-                        "container_name": name,
-                        "cpu_percent": data["cpu_percent"],
-                        "mem_bytes": data["mem_bytes"],
-                        "mem_limit": data["mem_limit"],
-                    })
-                payload = {
-                    "ts_ms": int(time.time() * 1000),
-                    "containers": container_payload,
-                }
-                await ws.send_text(json.dumps(payload))
-            await asyncio.sleep(max(0.05, interval_ms / 1000))
+        async for data in iter_queue(ws, sub.queue):
+            await send_json_bytes(ws, data)
     except WebSocketDisconnect:
         return
-    
\ No newline at end of file
+    finally:
+        container_feed.unsubscribe(sub)
+
+
+@router.websocket("/ws/mux")
+async def mux_ws(ws: WebSocket):
+    """1 kết nối cho nhiều kênh (live, containers, alerts, logs...), xem giao thức ở api/mux.py."""
+    await ws.accept()
+    await mux.serve(ws)
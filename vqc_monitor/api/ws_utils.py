@@ -0,0 +1,39 @@
+# app/api/ws_utils.py
+import asyncio
+from typing import Any, AsyncIterator
+from fastapi import WebSocket
+
+
+async def iter_queue(ws: WebSocket, queue: asyncio.Queue) -> AsyncIterator[Any]:
+    """
+    Lấy item từ queue cho tới khi client ngắt kết nối.
+    Theo dõi ws.receive() song song để phát hiện disconnect ngay cả khi queue đang rỗng.
+    Message client gửi lên bị bỏ qua.
+    """
+    recv = asyncio.create_task(ws.receive())
+    get = None
+    try:
+        while True:
+            if get is None:
+                get = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({get, recv}, return_when=asyncio.FIRST_COMPLETED)
+            if recv in done:
+                if recv.result().get("type") == "websocket.disconnect":
+                    return
+                recv = asyncio.create_task(ws.receive())
+            if get in done:
+                item = get.result()
+                get = None
+                yield item
+    finally:
+        for t in (recv, get):
+            if t is not None and not t.done():
+                t.cancel()
+
+
+async def wait_disconnect(ws: WebSocket):
+    """Chờ tới khi client ngắt kết nối (bỏ qua message client gửi lên)."""
+    while True:
+        msg = await ws.receive()
+        if msg.get("type") == "websocket.disconnect":
+            return
@@ -0,0 +1,115 @@
+# app/core/alert_bus.py
+"""
+Pub/sub in-process cho alert mới.
+- repo.save_alert / save_container_alert đẩy alert vào session.info, publish khi session commit
+  (không đẩy alert của transaction bị rollback).
+- Mỗi subscriber có 1 asyncio.Queue riêng (hoặc callback on_batch, vd /ws/mux), lọc theo app_id / container_name.
+- Mỗi lần publish, batch được lọc 1 lần cho mỗi (kind, key); frame {"type": "new"} của batch encode 1 lần
+  (AlertBatch.frame) rồi gửi lại cùng bytes cho mọi subscriber.
+- publish() an toàn khi gọi từ thread khác (worker/threadpool) nhờ call_soon_threadsafe.
+"""
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Set
+from vqc_monitor.core.serialization import dumps
+
+APP = "app"
+CONTAINER = "container"
+QUEUE_MAX = 256  # số batch tối đa chờ gửi / subscriber
+
+
+class AlertBatch(list):
+    """Danh sách alert đã lọc cho 1 (kind, key), dùng chung giữa các subscriber -> không được sửa."""
+    __slots__ = ("_frame",)
+
+    def __init__(self, alerts=()):
+        super().__init__(alerts)
+        self._frame: Optional[bytes] = None
+
+    @property
+    def frame(self) -> bytes:
+        """{"type": "new", "alerts": [...]} đã encode (lười, 1 lần)."""
+        if self._frame is None:
+            self._frame = dumps({"type": "new", "alerts": self})
+        return self._frame
+
+
+def _select(kind: str, key: Optional[str], alerts: List[Dict[str, Any]]) -> AlertBatch:
+    if key is None:
+        return AlertBatch(alerts)
+    field = "app_id" if kind == APP else "container_name"
+    return AlertBatch(a for a in alerts if a.get(field) == key)
+
+
+class AlertSubscription:
+    __slots__ = ("kind", "key", "queue", "dropped", "on_batch")
+
+    def __init__(self, kind: str, key: Optional[str], maxsize: int,
+                 on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.kind = kind
+        self.key = key
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        # có callback -> gọi trực tiếp trên event loop, không dùng queue
+        self.on_batch = on_batch
+
+    def offer(self, batch: AlertBatch):
+        if self.on_batch is not None:
+            self.on_batch(batch)
+            return
+        if self.queue.full():
+            # client chậm: bỏ batch cũ nhất, giữ batch mới
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(batch)
+
+
+class AlertBus:
+    def __init__(self):
+        self._subs: Set[AlertSubscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self, kind: str, key: Optional[str] = None, maxsize: int = QUEUE_MAX,
+                  on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> AlertSubscription:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        sub = AlertSubscription(kind, key, maxsize, on_batch)
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: AlertSubscription):
+        self._subs.discard(sub)
+
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def publish(self, kind: str, alerts: List[Dict[str, Any]]):
+        if not alerts or not self._subs:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is not None and running is not self._loop:
+            self._loop.call_soon_threadsafe(self._dispatch, kind, alerts)
+        else:
+            self._dispatch(kind, alerts)
+
+    def _dispatch(self, kind: str, alerts: List[Dict[str, Any]]):
+        batches: Dict[Optional[str], AlertBatch] = {}
+        for sub in list(self._subs):
+            if sub.kind != kind:
+                continue
+            batch = batches.get(sub.key)
+            if batch is None:
+                batch = batches[sub.key] = _select(kind, sub.key, alerts)
+            if batch:
+                sub.offer(batch)
+
+
+alert_bus = AlertBus()
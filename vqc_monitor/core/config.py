@@ -17,6 +17,8 @@ class Service(BaseModel):
     version: str
     cpu_threshold: Optional[float] = 80  # future use
     memory_threshold_mb: Optional[float] = 1024  # future use
+    log_rate_limit: Optional[float] = None  # dòng/giây cho /ws/logs, None = theo log_rate_limit chung
+    sample_interval_ms: Optional[int] = None  # chu kỳ lấy mẫu riêng, None = sample_interval_ms chung
 
 
 class Container(BaseModel):
@@ -25,6 +27,30 @@ class Container(BaseModel):
     version: str
     memory_threshold_mb: Optional[float] = 1024  # future use
     cpu_threshold: Optional[float] = 5  # future use
+    sample_interval_ms: Optional[int] = None  # chu kỳ lấy mẫu riêng, None = sample_interval_ms chung
+
+
+class AlertRule(BaseModel):
+    """Rule alert bổ sung (ngoài ngưỡng cpu/memory/disk có sẵn), compile 1 lần bởi metrics/alert_rules."""
+    type: str  # "threshold" (vượt ngưỡng suốt cửa sổ) | "rate" (tăng nhanh hơn threshold / phút) | "hysteresis"
+    metric: str  # "cpu" (%) | "memory" (MB) | "disk" (% phân vùng /, chỉ cho __system__)
+    target: str = "*"  # app_id / "__system__" / tên container, "*" = mọi entity của scope
+    scope: str = "app"  # "app" | "container"
+    threshold: float
+    clear: Optional[float] = None  # hysteresis: chỉ báo lại sau khi giá trị xuống dưới mức này
+    window_ms: Optional[int] = None  # None = alert_window_ms chung
+    alert_type: Optional[str] = None  # tên alert lưu DB, mặc định "<metric>_<type>"
+
+
+class NotifySink(BaseModel):
+    """Nơi nhận thông báo alert (core/notify)."""
+    type: str  # "webhook" | "script" | "file"
+    name: Optional[str] = None  # tên hiển thị trong /alerts/notify/stats, mặc định "<type>:<url|command|path>"
+    url: Optional[str] = None  # webhook: POST JSON
+    headers: dict[str, str] = Field(default_factory=dict)  # webhook: vd Authorization
+    command: Optional[str] = None  # script: payload JSON qua stdin, exit code != 0 là lỗi
+    path: Optional[str] = None  # file: mỗi lần gửi append 1 dòng JSON
+    timeout_s: float = 10
 
 
 class FileConfig(BaseModel):
@@ -33,6 +59,62 @@ class FileConfig(BaseModel):
     cpu_threshold: float = 80
     memory_threshold: float = 80
     disk_threshold: float = 90
+    live_delta_epsilon: float = 0.01
+    live_keyframe_every: int = 30
+    log_queue_max: int = 1000
+    log_overflow_policy: str = "drop_oldest"
+    log_frame_max_lines: int = 200
+    log_frame_max_bytes: int = 65536
+    log_frame_flush_ms: int = 50
+    log_rate_limit: float = 0
+    log_ring_max_lines: int = 5000
+    log_ring_max_bytes: int = 4194304
+    log_follow_mode: str = "per_service"
+    log_index_enabled: bool = False
+    log_index_path: str = ""
+    log_index_batch: int = 500
+    log_index_flush_ms: int = 1000
+    log_index_retention_days: int = 7
+    alert_window_ms: int = 300000
+    alert_cooldown_ms: int = 900000
+    alert_coverage: float = 0.8
+    alert_queue_max: int = 600
+    alert_batch_max: int = 50
+    notify_sinks: list[NotifySink] = Field(default_factory=list)
+    notify_batch_ms: int = 200
+    notify_queue_max: int = 1000
+    notify_retry_max: int = 5
+    notify_retry_base_ms: int = 1000
+    proc_sample_max: int = 64
+    sched_coalesce_ms: int = 20
+    burst_enabled: bool = False
+    burst_pre_alert_ratio: float = 0.8
+    burst_interval_ms: int = 100
+    burst_hold_ms: int = 10000
+    burst_max_ms: int = 120000
+    burst_max_active: int = 8
+    burst_link_grace_ms: int = 60000
+    hires_retention_days: float = 2
+    deadband_enabled: bool = False
+    deadband_cpu: Optional[float] = 0.5
+    deadband_mem_mb: Optional[float] = 1.0
+    deadband_io_bps: Optional[float] = 4096
+    deadband_max_gap_ms: int = 60000
+    discovery_enabled: bool = False
+    discovery_root: str = "system.slice"
+    discovery_include: list[str] = Field(default_factory=lambda: ["*.service"])
+    discovery_exclude: list[str] = Field(default_factory=list)
+    discovery_interval_ms: int = 30000
+    discovery_max_units: int = 5000
+    discovery_cpu_threshold: Optional[float] = None
+    discovery_memory_threshold_mb: Optional[float] = None
+    anomaly_enabled: bool = False
+    anomaly_alpha: float = 0.02
+    anomaly_z: float = 4.0
+    anomaly_warmup: int = 300
+    anomaly_consecutive: int = 3
+    anomaly_checkpoint_ms: int = 60000
+    alert_rules: list[AlertRule] = Field(default_factory=list)
     services: list[Service] = Field(default_factory=list)  # name + version
     containers: list[Container] = Field(default_factory=list)  # name + version
 
@@ -46,6 +128,9 @@ class AppInfo(BaseModel):
     cpu_threshold: Optional[float] = 80  # future use
     memory_threshold_mb: Optional[float] = 1024  # future use
     version_real: Optional[str] = None
+    log_rate_limit: Optional[float] = None
+    discovered: bool = False  # tự phát hiện qua metrics/discovery, không có trong config.yaml
+    sample_interval_ms: Optional[int] = None
 
 
 class ContainerInfo(BaseModel):
@@ -56,6 +141,7 @@ class ContainerInfo(BaseModel):
     version_real: Optional[str] = None
     cpu_threshold: Optional[float] = 5  # future use
     memory_threshold_mb: Optional[float] = 1024  # future use
+    sample_interval_ms: Optional[int] = None
 
 
 class Settings(BaseModel):
@@ -68,6 +154,60 @@ class Settings(BaseModel):
     TOTAL_RAM_BYTES: int = 0
     ALERT_WINDOW_MS: int = 300000  # 5 minutes
     ALERT_COOLDOWN_MS: int = 900000  # 15 minutes
+    ALERT_COVERAGE: float = 0.8  # tỉ lệ sample tối thiểu trong cửa sổ so với số sample kỳ vọng
+    LIVE_DELTA_EPSILON: float = 0.01  # /ws/live proto=2: sai số tương đối
+    LIVE_KEYFRAME_EVERY: int = 30  # /ws/live proto=2: keyframe mỗi N frame
+    LOG_QUEUE_MAX: int = 1000  # số dòng log tối đa chờ gửi / client
+    LOG_OVERFLOW_POLICY: str = "drop_oldest"  # "drop_oldest" | "disconnect"
+    LOG_FRAME_MAX_LINES: int = 200  # gộp tối đa N dòng / frame
+    LOG_FRAME_MAX_BYTES: int = 65536
+    LOG_FRAME_FLUSH_MS: int = 50  # flush frame sau ~50ms kể cả chưa đủ dòng
+    LOG_RATE_LIMIT: float = 0  # dòng/giây / service, 0 = không giới hạn
+    LOG_RING_MAX_LINES: int = 5000  # ring buffer / follower, = tail tối đa của /ws/logs
+    LOG_RING_MAX_BYTES: int = 4194304  # 4MB
+    LOG_FOLLOW_MODE: str = "per_service"  # "per_service" | "multiplex" (1 journalctl cho mọi service)
+    LOG_INDEX_ENABLED: bool = False  # index log các service vào SQLite FTS5 (/logs/search)
+    LOG_INDEX_PATH: str = ""  # file DB riêng cho index log, trống = monitor.logs.db cạnh DB_PATH
+    LOG_INDEX_BATCH: int = 500  # số entry / transaction
+    LOG_INDEX_FLUSH_MS: int = 1000  # ghi batch sau tối đa N ms
+    LOG_INDEX_RETENTION_DAYS: int = 7  # số ngày (partition) giữ lại
+    ALERT_QUEUE_MAX: int = 600  # số tick tối đa chờ alert_worker đánh giá, đầy thì bỏ tick cũ nhất
+    ALERT_BATCH_MAX: int = 50  # số tick tối đa / transaction của alert_worker
+    NOTIFY_SINKS: list[NotifySink] = Field(default_factory=list)  # trống = không gửi thông báo
+    NOTIFY_BATCH_MS: int = 200  # gộp alert tới trong N ms (cùng tick) thành 1 lần gửi
+    NOTIFY_QUEUE_MAX: int = 1000  # số lần gửi tối đa chờ / sink, đầy thì bỏ cũ nhất
+    NOTIFY_RETRY_MAX: int = 5  # số lần thử lại / lần gửi
+    NOTIFY_RETRY_BASE_MS: int = 1000  # backoff: base * 2^n (tối đa 60s)
+    PROC_SAMPLE_MAX: int = 64  # số process tối đa đọc / cgroup / lần sample (metrics/procs)
+    SCHED_COALESCE_MS: int = 20  # nguồn tới hạn cách nhau <= N ms được gom 1 batch (metrics/scheduler)
+    BURST_ENABLED: bool = False  # lấy mẫu dày khi app gần ngưỡng alert (metrics/burst)
+    BURST_PRE_ALERT_RATIO: float = 0.8  # bắt đầu burst khi giá trị >= ratio x ngưỡng cpu / memory
+    BURST_INTERVAL_MS: int = 100  # chu kỳ lấy mẫu trong burst
+    BURST_HOLD_MS: int = 10000  # giữ burst thêm N ms sau lần cuối còn trên mức pre-alert
+    BURST_MAX_MS: int = 120000  # độ dài tối đa 1 burst
+    BURST_MAX_ACTIVE: int = 8  # số app burst đồng thời tối đa
+    BURST_LINK_GRACE_MS: int = 60000  # burst đã kết thúc vẫn chờ alert (worker trễ) trong N ms
+    HIRES_RETENTION_DAYS: float = 2  # retention bảng samples_hires
+    DEADBAND_ENABLED: bool = False  # chỉ lưu sample khi giá trị đổi quá dung sai (core/deadband)
+    DEADBAND_CPU: Optional[float] = 0.5  # dung sai cpu (điểm %), None = phải bằng đúng
+    DEADBAND_MEM_MB: Optional[float] = 1.0  # dung sai memory (MB)
+    DEADBAND_IO_BPS: Optional[float] = 4096  # dung sai io đọc / ghi (B/s)
+    DEADBAND_MAX_GAP_MS: int = 60000  # luôn lưu ít nhất 1 sample / N ms; đọc carry-forward tối đa N ms
+    DISCOVERY_ENABLED: bool = False  # tự theo dõi mọi unit dưới DISCOVERY_ROOT (metrics/discovery)
+    DISCOVERY_ROOT: str = "system.slice"  # tương đối với /sys/fs/cgroup (hoặc path tuyệt đối)
+    DISCOVERY_INCLUDE: list[str] = Field(default_factory=lambda: ["*.service"])  # glob theo tên unit
+    DISCOVERY_EXCLUDE: list[str] = Field(default_factory=list)
+    DISCOVERY_INTERVAL_MS: int = 30000  # quét lại mỗi N ms
+    DISCOVERY_MAX_UNITS: int = 5000
+    DISCOVERY_CPU_THRESHOLD: Optional[float] = None  # ngưỡng alert cho unit tự phát hiện, None = không alert
+    DISCOVERY_MEMORY_THRESHOLD_MB: Optional[float] = None
+    ANOMALY_ENABLED: bool = False  # phát hiện bất thường EWMA z-score / (entity, metric) (metrics/anomaly)
+    ANOMALY_ALPHA: float = 0.02  # hệ số EWMA / sample (~1/alpha sample gần nhất)
+    ANOMALY_Z: float = 4.0  # |z| tối thiểu để coi là bất thường
+    ANOMALY_WARMUP: int = 300  # số sample học baseline trước khi được báo
+    ANOMALY_CONSECUTIVE: int = 3  # số sample bất thường liên tiếp mới báo
+    ANOMALY_CHECKPOINT_MS: int = 60000  # ghi state xuống bảng anomaly_state mỗi N ms
+    ALERT_RULES: list[AlertRule] = Field(default_factory=list)  # rule thêm, xem AlertRule
     # Sau khi resolve, APPS = {app_id: AppInfo}
     APPS: dict[str, AppInfo] = Field(default_factory=dict)
     CONTAINERS: dict[str, ContainerInfo] = Field(default_factory=dict)
@@ -82,6 +222,62 @@ class Settings(BaseModel):
         self.CPU_THRESHOLD = fc.cpu_threshold
         self.MEMORY_THRESHOLD = fc.memory_threshold
         self.DISK_THRESHOLD = fc.disk_threshold
+        self.LIVE_DELTA_EPSILON = fc.live_delta_epsilon
+        self.LIVE_KEYFRAME_EVERY = fc.live_keyframe_every
+        self.LOG_QUEUE_MAX = fc.log_queue_max
+        self.LOG_OVERFLOW_POLICY = fc.log_overflow_policy
+        self.LOG_FRAME_MAX_LINES = fc.log_frame_max_lines
+        self.LOG_FRAME_MAX_BYTES = fc.log_frame_max_bytes
+        self.LOG_FRAME_FLUSH_MS = fc.log_frame_flush_ms
+        self.LOG_RATE_LIMIT = fc.log_rate_limit
+        self.LOG_RING_MAX_LINES = fc.log_ring_max_lines
+        self.LOG_RING_MAX_BYTES = fc.log_ring_max_bytes
+        self.LOG_FOLLOW_MODE = fc.log_follow_mode
+        self.LOG_INDEX_ENABLED = fc.log_index_enabled
+        self.LOG_INDEX_PATH = fc.log_index_path
+        self.LOG_INDEX_BATCH = fc.log_index_batch
+        self.LOG_INDEX_FLUSH_MS = fc.log_index_flush_ms
+        self.LOG_INDEX_RETENTION_DAYS = fc.log_index_retention_days
+        self.ALERT_WINDOW_MS = fc.alert_window_ms
+        self.ALERT_COOLDOWN_MS = fc.alert_cooldown_ms
+        self.ALERT_COVERAGE = fc.alert_coverage
+        self.ALERT_QUEUE_MAX = fc.alert_queue_max
+        self.ALERT_BATCH_MAX = fc.alert_batch_max
+        self.NOTIFY_SINKS = fc.notify_sinks
+        self.NOTIFY_BATCH_MS = fc.notify_batch_ms
+        self.NOTIFY_QUEUE_MAX = fc.notify_queue_max
+        self.NOTIFY_RETRY_MAX = fc.notify_retry_max
+        self.NOTIFY_RETRY_BASE_MS = fc.notify_retry_base_ms
+        self.PROC_SAMPLE_MAX = fc.proc_sample_max
+        self.SCHED_COALESCE_MS = fc.sched_coalesce_ms
+        self.BURST_ENABLED = fc.burst_enabled
+        self.BURST_PRE_ALERT_RATIO = fc.burst_pre_alert_ratio
+        self.BURST_INTERVAL_MS = fc.burst_interval_ms
+        self.BURST_HOLD_MS = fc.burst_hold_ms
+        self.BURST_MAX_MS = fc.burst_max_ms
+        self.BURST_MAX_ACTIVE = fc.burst_max_active
+        self.BURST_LINK_GRACE_MS = fc.burst_link_grace_ms
+        self.HIRES_RETENTION_DAYS = fc.hires_retention_days
+        self.DEADBAND_ENABLED = fc.deadband_enabled
+        self.DEADBAND_CPU = fc.deadband_cpu
+        self.DEADBAND_MEM_MB = fc.deadband_mem_mb
+        self.DEADBAND_IO_BPS = fc.deadband_io_bps
+        self.DEADBAND_MAX_GAP_MS = fc.deadband_max_gap_ms
+        self.DISCOVERY_ENABLED = fc.discovery_enabled
+        self.DISCOVERY_ROOT = fc.discovery_root
+        self.DISCOVERY_INCLUDE = fc.discovery_include
+        self.DISCOVERY_EXCLUDE = fc.discovery_exclude
+        self.DISCOVERY_INTERVAL_MS = fc.discovery_interval_ms
+        self.DISCOVERY_MAX_UNITS = fc.discovery_max_units
+        self.DISCOVERY_CPU_THRESHOLD = fc.discovery_cpu_threshold
+        self.DISCOVERY_MEMORY_THRESHOLD_MB = fc.discovery_memory_threshold_mb
+        self.ANOMALY_ENABLED = fc.anomaly_enabled
+        self.ANOMALY_ALPHA = fc.anomaly_alpha
+        self.ANOMALY_Z = fc.anomaly_z
+        self.ANOMALY_WARMUP = fc.anomaly_warmup
+        self.ANOMALY_CONSECUTIVE = fc.anomaly_consecutive
+        self.ANOMALY_CHECKPOINT_MS = fc.anomaly_checkpoint_ms
+        self.ALERT_RULES = fc.alert_rules
         # Resolve services -> APPS
         self.APPS = resolve_services_to_cgroups(fc.services)
         self.CONTAINERS = resolve_containers_to_info(fc.containers)
@@ -128,6 +324,8 @@ def resolve_services_to_cgroups(services: list[Service]) -> dict[str, AppInfo]:
             memory_threshold_mb=svc.memory_threshold_mb,
             cpu_threshold=svc.cpu_threshold,
             version_real=real_version,
+            log_rate_limit=svc.log_rate_limit,
+            sample_interval_ms=svc.sample_interval_ms,
         )
 
     return out
@@ -257,6 +455,7 @@ def resolve_containers_to_info(containers: list[Container]) -> dict[str, "Contai
                     version_real=real_version,
                     cpu_threshold=ctr.cpu_threshold,
                     memory_threshold_mb=ctr.memory_threshold_mb,
+                    sample_interval_ms=ctr.sample_interval_ms,
                 )
             else:
                 out[ctr.name] = ContainerInfo(
@@ -267,6 +466,7 @@ def resolve_containers_to_info(containers: list[Container]) -> dict[str, "Contai
                     version_real=None,
                     cpu_threshold=ctr.cpu_threshold,
                     memory_threshold_mb=ctr.memory_threshold_mb,
+                    sample_interval_ms=ctr.sample_interval_ms,
                 )
         except subprocess.CalledProcessError as e:
             print(f"[WARN] docker inspect thất bại cho {ctr.name}: {e}")
@@ -277,10 +477,20 @@ def resolve_containers_to_info(containers: list[Container]) -> dict[str, "Contai
                 version=ctr.version,
                 running=False,
                 version_real=real_version,
+                sample_interval_ms=ctr.sample_interval_ms,
             )
     return out
 
 
+_reload_hooks: list = []
+
+
+def on_reload(fn):
+    """Đăng ký hàm gọi lại (không tham số) sau mỗi lần reload config, vd compile lại rule alert."""
+    _reload_hooks.append(fn)
+    return fn
+
+
 def reload_list_services() -> dict[str, AppInfo]:
     """
     Reload lại file config và cập nhật lại list_services.
@@ -295,6 +505,11 @@ def reload_list_services() -> dict[str, AppInfo]:
         f"[INFO] Reloaded config: sample_interval_ms={fc.sample_interval_ms}, "
         f"retention_days={fc.retention_days}, {len(fc.services)} services"
     )
+    for fn in _reload_hooks:
+        try:
+            fn()
+        except Exception as e:
+            print(f"[WARN] reload hook {getattr(fn, '__name__', fn)} lỗi: {e}")
     return list_services
 
 
@@ -0,0 +1,284 @@
+# app/core/container_logs.py
+"""
+Stream log container (bản container của core/logs.LogHub), chỉ cho container trong settings.CONTAINERS.
+- 1 follower `docker logs -f --timestamps` / container, dùng chung cho mọi websocket.
+- Ring buffer + tail từ RAM, hàng đợi gửi riêng / client (core/fanout), frame gộp + rate limit (core/log_stream).
+- Timestamp RFC3339Nano của docker (độ rộng cố định, so sánh được như chuỗi) làm cursor:
+  follower chạy lại / client resume bằng `--since <ts>` rồi bỏ các dòng <= ts.
+- stderr được đánh priority=3 (err), stdout priority=6 (info) để dùng chung LogFilter.
+"""
+import asyncio
+import re
+from asyncio.subprocess import PIPE
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+from fastapi import HTTPException, WebSocket
+from vqc_monitor.core.config import settings
+from vqc_monitor.core.fanout import Subscriber, default_skip_marker
+from vqc_monitor.core.log_stream import (
+    FrameCoalescer, LineRing, LogClient, LogFilter, LogLine, broadcast_frame, json_skip_marker,
+)
+
+CONTAINER_RE = re.compile(r"^[\w][\w.\-]{0,127}$")
+TS_CURSOR_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,9})?Z$")
+MAX_LINE_BYTES = 16 * 1024
+_READ_LIMIT = 1024 * 1024
+PRIO_STDOUT = 6
+PRIO_STDERR = 3
+
+
+class _ContainerFollow:
+    __slots__ = ("name", "task", "procs", "coalescer", "ring", "ready", "clients", "pending", "last_ts")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.task: Optional[asyncio.Task] = None
+        self.procs: List[asyncio.subprocess.Process] = []
+        self.coalescer: Optional[FrameCoalescer] = None
+        self.ring = LineRing(settings.LOG_RING_MAX_LINES, settings.LOG_RING_MAX_BYTES)
+        self.ready = asyncio.Event()
+        self.clients: Dict[WebSocket, LogClient] = {}
+        self.pending = 0
+        self.last_ts: Optional[str] = None  # timestamp docker của dòng cuối đã nạp/phát
+
+
+class ContainerLogHub:
+    def __init__(self):
+        self._follows: Dict[str, _ContainerFollow] = {}
+        self._lock = asyncio.Lock()
+        self.ring_hits = 0
+        self.ring_misses = 0
+        self.restarts = 0
+
+    async def subscribe(self, container: str, ws: WebSocket, tail: int, overflow: Optional[str] = None,
+                        fmt: str = "text", after_cursor: Optional[str] = None,
+                        flt: Optional[LogFilter] = None, sink=None) -> Subscriber:
+        """Giống LogHub.subscribe; cursor là timestamp docker của dòng cuối client đã nhận."""
+        if after_cursor is not None and not TS_CURSOR_RE.match(after_cursor):
+            raise HTTPException(400, "Invalid cursor")
+        if sink is None:
+            sub = Subscriber(
+                ws,
+                maxsize=settings.LOG_QUEUE_MAX + max(tail, settings.LOG_RING_MAX_LINES if after_cursor else 0),
+                policy=overflow or settings.LOG_OVERFLOW_POLICY,
+                skip_marker=json_skip_marker if fmt == "json" else default_skip_marker,
+                on_close=lambda s: asyncio.create_task(self.unsubscribe(container, ws)),
+            ).start()
+        else:
+            # kênh của /ws/mux: dùng chung hàng đợi gửi của kết nối; khoá client là sink thay cho ws
+            sub = ws = sink
+        client = LogClient(sub, fmt, flt)
+        flt = client.filter
+        async with self._lock:
+            f = self._follows.get(container)
+            if f is None:
+                f = self._follows[container] = _ContainerFollow(container)
+            if f.task is None or f.task.done():
+                f.ready = asyncio.Event()
+                f.ring = LineRing(settings.LOG_RING_MAX_LINES, settings.LOG_RING_MAX_BYTES)
+                f.last_ts = None
+                f.coalescer = FrameCoalescer(
+                    lambda lines, suppressed: self._broadcast_frame(f, lines, suppressed),
+                    max_lines=settings.LOG_FRAME_MAX_LINES,
+                    max_bytes=settings.LOG_FRAME_MAX_BYTES,
+                    flush_ms=settings.LOG_FRAME_FLUSH_MS,
+                    rate_limit=settings.LOG_RATE_LIMIT,
+                )
+                f.task = asyncio.create_task(self._follow_task(f))
+            f.pending += 1
+        try:
+            try:
+                await asyncio.wait_for(f.ready.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                pass
+
+            backlog = None
+            if after_cursor is not None:
+                if f.ready.is_set():
+                    backlog = f.ring.after(after_cursor)
+                    if backlog is not None and flt is not None:
+                        backlog = flt.apply(backlog)
+            elif tail > 0 and f.ready.is_set():
+                backlog = f.ring.tail(tail, flt)
+
+            skipped = 0
+            if backlog is not None:
+                self.ring_hits += 1
+            elif after_cursor is not None or tail > 0:
+                self.ring_misses += 1
+                if after_cursor is not None:
+                    args = ["--since", after_cursor]
+                    limit = settings.LOG_RING_MAX_LINES
+                else:
+                    n = tail if flt is None or not flt.has_text_filter else max(tail, settings.LOG_RING_MAX_LINES)
+                    args = ["--tail", str(n)]
+                    limit = tail
+                lines = await _read_logs(container, args)
+                if after_cursor is not None:
+                    lines = [l for l in lines if l[1] is None or l[1] > after_cursor]
+                cur = next((l[1] for l in reversed(lines) if l[1]), None)
+                if flt is not None:
+                    lines = flt.apply(lines)
+                backlog = lines[-limit:] if limit > 0 else []
+                skipped = len(lines) - len(backlog)
+                gap = f.ring.after(cur) if cur else None
+                if gap:
+                    backlog += flt.apply(gap) if flt is not None else gap
+
+            # không có await từ đây tới khi đăng ký client: backlog + live nối tiếp nhau
+            if skipped:
+                sub.put(sub.skip_marker(skipped))
+            if backlog:
+                client.put_lines(backlog, settings.LOG_FRAME_MAX_LINES, settings.LOG_FRAME_MAX_BYTES)
+            f.clients[ws] = client
+        finally:
+            f.pending -= 1
+        return sub
+
+    async def unsubscribe(self, container: str, ws: WebSocket):
+        async with self._lock:
+            f = self._follows.get(container)
+            if f is None:
+                return
+            client = f.clients.pop(ws, None)
+            if client:
+                await client.sub.close()
+            if f.clients or f.pending:
+                return
+            self._follows.pop(container, None)
+            for proc in f.procs:
+                _terminate(proc)
+            if f.task:
+                f.task.cancel()
+            if f.coalescer:
+                f.coalescer.close()
+
+    def stats(self) -> Dict[str, dict]:
+        out = {}
+        for name, f in self._follows.items():
+            out[name] = {
+                "suppressed_total": f.coalescer.suppressed_total if f.coalescer else 0,
+                "ring_lines": len(f.ring),
+                "ring_bytes": f.ring.nbytes,
+                "clients": [{**c.sub.stats(), "format": c.fmt, "filtered": c.filter is not None}
+                            for c in f.clients.values()],
+            }
+        return out
+
+    async def _follow_task(self, f: _ContainerFollow):
+        """Seed ring bằng `docker logs --tail N`, rồi `docker logs -f --since <ts cuối>`; container dừng thì đợi & chạy lại."""
+        try:
+            lines = await _read_logs(f.name, ["--tail", str(f.ring.max_lines)])
+            f.ring.extend(lines)
+            if len(lines) >= f.ring.max_lines:
+                f.ring.truncated = True
+            f.last_ts = next((l[1] for l in reversed(lines) if l[1]), None)
+            f.ready.set()
+            while True:
+                since = f.last_ts
+                args = ["--since", since] if since else ["--tail", "0"]
+                cmd = ["docker", "logs", "-f", "--timestamps", *args, f.name]
+                proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE, limit=_READ_LIMIT)
+                f.procs = [proc]
+                self.restarts += 1
+                await asyncio.gather(
+                    self._pump(f, proc.stdout, PRIO_STDOUT, since),
+                    self._pump(f, proc.stderr, PRIO_STDERR, since),
+                )
+                await proc.wait()
+                f.coalescer.flush()
+                # container dừng / docker logs thoát: client vẫn giữ kết nối, thử lại sau
+                await asyncio.sleep(2)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            f.coalescer.add(f"[docker logs error] {e}", priority=PRIO_STDERR)
+        finally:
+            f.ready.set()
+            if f.coalescer:
+                f.coalescer.flush()
+            for proc in f.procs:
+                _terminate(proc)
+            if self._follows.get(f.name) is f and not f.clients and not f.pending:
+                self._follows.pop(f.name, None)
+
+    async def _pump(self, f: _ContainerFollow, stream: asyncio.StreamReader, priority: int, since: Optional[str]):
+        while True:
+            raw = await stream.readline()
+            if not raw:
+                return
+            text, ts, ts_us = _parse_line(raw)
+            if ts is not None:
+                # --since bao gồm cả dòng có đúng timestamp đó -> bỏ dòng đã phát.
+                # Chỉ so với mốc --since: stdout/stderr đọc song song nên ts giữa 2 luồng có thể lệch thứ tự.
+                if since is not None and ts <= since:
+                    continue
+                if f.last_ts is None or ts > f.last_ts:
+                    f.last_ts = ts
+            f.coalescer.add(text, ts, priority, ts_us)
+
+    def _broadcast_frame(self, f: _ContainerFollow, lines: List[LogLine], suppressed: int):
+        f.ring.extend(lines)
+        broadcast_frame(list(f.clients.values()), lines, suppressed)
+
+
+async def _read_logs(container: str, args: list) -> List[LogLine]:
+    """`docker logs --timestamps <args>` (không -f): gộp stdout + stderr theo timestamp."""
+    cmd = ["docker", "logs", "--timestamps", *args, container]
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE, limit=_READ_LIMIT)
+        out: Deque[LogLine] = deque()
+        err: Deque[LogLine] = deque()
+
+        async def read(stream, dst, priority):
+            async for raw in stream:
+                text, ts, ts_us = _parse_line(raw)
+                dst.append((text, ts, priority, ts_us))
+
+        await asyncio.gather(read(proc.stdout, out, PRIO_STDOUT), read(proc.stderr, err, PRIO_STDERR))
+        await proc.wait()
+    except Exception as e:
+        return [(f"[docker logs error] {e}", None, PRIO_STDERR, None)]
+    lines = list(out) + list(err)
+    # sort ổn định theo ts; dòng không có ts giữ thứ tự tương đối
+    lines.sort(key=lambda l: l[1] or "")
+    return lines
+
+
+def _parse_line(raw: bytes) -> Tuple[str, Optional[str], Optional[int]]:
+    """'2024-05-01T10:00:00.123456789Z msg' -> (line, ts, ts_us)."""
+    line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+    if len(line) > MAX_LINE_BYTES:
+        line = line[:MAX_LINE_BYTES]
+    ts, _, _ = line.partition(" ")
+    if not TS_CURSOR_RE.match(ts):
+        return line, None, None
+    try:
+        # datetime chỉ tới micro giây
+        base, _, frac = ts[:-1].partition(".")
+        dt = datetime.fromisoformat(f"{base}.{(frac + '000000')[:6]}+00:00")
+        ts_us = int(dt.timestamp()) * 1_000_000 + dt.microsecond
+    except ValueError:
+        ts_us = None
+    return line, ts, ts_us
+
+
+def _terminate(proc: Optional[asyncio.subprocess.Process]):
+    if proc and proc.returncode is None:
+        try:
+            proc.terminate()
+        except ProcessLookupError:
+            pass
+
+
+def _validate_container(name: str) -> str:
+    name = name.strip()
+    if not CONTAINER_RE.match(name):
+        raise HTTPException(400, "Invalid container name")
+    if name not in settings.CONTAINERS:
+        raise HTTPException(403, "Container not allowed")
+    return name
+
+
+container_log_hub = ContainerLogHub()
@@ -2,7 +2,13 @@ from datetime import datetime, timedelta
 import os
 import asyncio
 from vqc_monitor.db import repo
+from vqc_monitor.db.base import SessionLocal
 from vqc_monitor.core.config import settings
+def _clean_old_records():
+    with SessionLocal() as db:
+        repo.clean_old_records(db, settings.RETENTION_DAYS, settings.HIRES_RETENTION_DAYS)
+
+
 async def daily_cleanup():
     loop = asyncio.get_event_loop()
     while True:
@@ -12,5 +18,9 @@ async def daily_cleanup():
             target_time += timedelta(days=1)
         wait_seconds = (target_time - now).total_seconds()
         await asyncio.sleep(wait_seconds)
-        await loop.run_in_executor(None, repo.clean_old_records, settings.RETENTION_DAYS)
+        await loop.run_in_executor(None, _clean_old_records)
+        if settings.LOG_INDEX_ENABLED:
+            from vqc_monitor.core import log_index
+            # index log có retention riêng, xoá theo partition ngày
+            await loop.run_in_executor(None, log_index.drop_old_partitions, settings.LOG_INDEX_RETENTION_DAYS)
         print(f"Daily cleanup executed at {datetime.now()}")
\ No newline at end of file
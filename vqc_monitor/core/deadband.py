@@ -0,0 +1,98 @@
+# app/core/deadband.py
+"""
+Nén deadband cho bảng samples (opt-in, DEADBAND_ENABLED).
+- Ghi: 1 sample chỉ được lưu khi có metric lệch khỏi giá trị ĐÃ LƯU gần nhất quá dung sai của metric đó
+  (DEADBAND_CPU điểm %, DEADBAND_MEM_MB, DEADBAND_IO_BPS; None = phải bằng đúng), hoặc đã quá
+  DEADBAND_MAX_GAP_MS từ lần lưu trước. App dừng -> lưu sample đang bị giữ để chuỗi kết thúc đúng chỗ.
+- Đọc: giá trị đã lưu được coi là giữ nguyên (carry-forward) tới sample kế, tối đa DEADBAND_MAX_GAP_MS;
+  expand_held() dựng lại chuỗi theo chu kỳ lấy mẫu để repo.get_stats / get_samples (coverage alert)
+  và replay thấy đủ sample như khi không nén. Khoảng trống dài hơn max gap vẫn là "không có dữ liệu".
+- Chỉ áp cho bảng samples (app + __system__); sample trong RAM (history_feed, alert_worker, burst) không nén.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from vqc_monitor.core.config import settings
+
+_MB = 1024 * 1024
+
+
+def interval_ms(app_id: str) -> int:
+    """Chu kỳ lấy mẫu của app (dùng để dựng lại các sample bị lược)."""
+    info = settings.APPS.get(app_id)
+    return max(1, (info.sample_interval_ms if info is not None else None) or settings.SAMPLE_INTERVAL_MS)
+
+
+def _within(old: float, new: float, tol: Optional[float]) -> bool:
+    return old == new if tol is None else abs(new - old) <= tol
+
+
+class Deadband:
+    def __init__(self):
+        self._stored: Dict[str, tuple] = {}  # app_id -> sample đã lưu gần nhất
+        self._held: Dict[str, tuple] = {}  # app_id -> sample mới nhất bị lược
+        self.seen = 0
+        self.stored = 0
+
+    def _changed(self, last: tuple, s: tuple) -> bool:
+        if s[1] - last[1] >= settings.DEADBAND_MAX_GAP_MS:
+            return True
+        mem_tol = settings.DEADBAND_MEM_MB * _MB if settings.DEADBAND_MEM_MB is not None else None
+        return not (_within(last[2], s[2], settings.DEADBAND_CPU)
+                    and _within(last[3], s[3], mem_tol)
+                    and _within(last[4], s[4], settings.DEADBAND_IO_BPS)
+                    and _within(last[5], s[5], settings.DEADBAND_IO_BPS))
+
+    def filter(self, samples: Sequence[tuple]) -> List[tuple]:
+        """sample (app_id, ts_ms, cpu, mem, r, w) của 1 batch -> các sample cần ghi DB."""
+        if not settings.DEADBAND_ENABLED:
+            return list(samples)
+        out = []
+        for s in samples:
+            self.seen += 1
+            last = self._stored.get(s[0])
+            if last is None or self._changed(last, s):
+                self._stored[s[0]] = s
+                self._held.pop(s[0], None)
+                out.append(s)
+            else:
+                self._held[s[0]] = s
+        self.stored += len(out)
+        return out
+
+    def flush(self, app_id: str) -> Optional[tuple]:
+        """App dừng / bị bỏ: trả sample đang bị giữ (nếu có) để ghi, quên state."""
+        self._stored.pop(app_id, None)
+        s = self._held.pop(app_id, None)
+        if s is not None:
+            self.stored += 1
+        return s
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.DEADBAND_ENABLED,
+            "seen": self.seen,
+            "stored": self.stored,
+            "ratio": round(self.stored / self.seen, 4) if self.seen else None,
+        }
+
+
+def expand_held(ts: np.ndarray, cols: np.ndarray, step_ms: int, max_gap_ms: int,
+                end_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dựng lại chuỗi đã nén: mỗi sample lặp lại mỗi step_ms tới sample kế (tối đa max_gap_ms, không quá end_ms).
+    ts tăng dần (int64), cols shape (n, k). Chuỗi không nén đi qua gần như nguyên vẹn (làm tròn theo chu kỳ).
+    """
+    n = len(ts)
+    if n == 0:
+        return ts, cols
+    nxt = np.empty(n, dtype=np.int64)
+    nxt[:-1] = ts[1:]
+    nxt[-1] = max(int(ts[-1]), end_ms + 1)
+    hold_end = np.minimum(nxt, ts + max_gap_ms)
+    reps = np.maximum(1, np.rint((hold_end - ts) / step_ms)).astype(np.int64)
+    idx = np.repeat(np.arange(n), reps)
+    offs = np.arange(len(idx), dtype=np.int64) - np.repeat(np.cumsum(reps) - reps, reps)
+    return ts[idx] + offs * step_ms, cols[idx]
+
+
+deadband = Deadband()
@@ -0,0 +1,209 @@
+# app/core/fanout.py
+"""
+Hàng đợi gửi có giới hạn cho từng subscriber websocket.
+- Producer (LogHub, feed metrics, alert bus...) chỉ gọi put(): không await, không bao giờ bị client chậm chặn.
+- Mỗi subscriber có 1 sender task riêng gửi lần lượt item trong hàng đợi.
+- Khi hàng đợi đầy:
+    + drop_oldest: bỏ item cũ nhất (trừ item put với keep=True), trước item tiếp theo gửi marker "N lines skipped"
+      (1 marker / tag nếu item có tag, vd id kênh của /ws/mux)
+    + disconnect : đóng kết nối client chậm (code 1013 - try again later)
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from fastapi import WebSocket
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DISCONNECT)
+
+
+def default_skip_marker(n: int) -> str:
+    return f"[... {n} lines skipped]"
+
+
+class Subscriber:
+    """
+    Item là str (send_text) hoặc bytes (send_bytes).
+    weight: số "dòng" item đại diện (frame gộp nhiều dòng), dùng để đếm phần bị bỏ.
+    tag: nhóm của item (vd id kênh mux); phần bị bỏ được đếm và báo riêng theo tag: skip_marker(n, tag).
+    keep: item không bao giờ bị bỏ khi tràn (alert, bucket đã đóng...); hàng đợi chỉ toàn item keep thì vượt maxsize.
+    """
+
+    def __init__(self, ws: WebSocket, maxsize: int = 1000, policy: str = DROP_OLDEST,
+                 max_bytes: int = 4 * 1024 * 1024,
+                 skip_marker: Callable[[int], Any] = default_skip_marker,
+                 on_close: Optional[Callable[["Subscriber"], None]] = None,
+                 on_drop: Optional[Callable[[int], None]] = None,
+                 on_evict: Optional[Callable[[Any, int], None]] = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {policy}")
+        self.ws = ws
+        self.maxsize = max(1, maxsize)
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.skip_marker = skip_marker
+        self.on_close = on_close
+        self.on_drop = on_drop  # gọi với weight của item bị bỏ (vd counter Prometheus)
+        self.on_evict = on_evict  # gọi với (tag, weight) của item bị bỏ (vd ép keyframe cho kênh delta)
+        self.closed = False
+        self._q: Deque[Tuple[float, Any, int, int, Any, bool]] = deque()  # (t_enqueue, item, weight, size, tag, keep)
+        self._bytes = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._skipped: Dict[Any, int] = {}  # tag -> số bị bỏ chưa báo
+        # ---- stats ----
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def start(self) -> "Subscriber":
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    def put(self, item: Any, weight: int = 1, tag: Any = None, keep: bool = False) -> bool:
+        """Non-blocking. Trả False nếu subscriber đã đóng / bị ngắt do chậm."""
+        if self.closed:
+            return False
+        size = len(item)
+        self._q.append((time.monotonic(), item, weight, size, tag, keep))
+        self._bytes += size
+        self.enqueued += weight
+        while len(self._q) > self.maxsize or (self._bytes > self.max_bytes and len(self._q) > 1):
+            if self.policy == DISCONNECT:
+                self._abort()
+                return False
+            if not self._evict_oldest():
+                break
+        self._wakeup.set()
+        return True
+
+    def _evict_oldest(self) -> bool:
+        """Bỏ item không-keep cũ nhất. False nếu hàng đợi chỉ còn item keep."""
+        for i, entry in enumerate(self._q):
+            if not entry[5]:
+                break
+        else:
+            return False
+        del self._q[i]
+        _, _, w, sz, tag, _ = entry
+        self._bytes -= sz
+        self._skipped[tag] = self._skipped.get(tag, 0) + w
+        self.dropped += w
+        if self.on_drop is not None:
+            self.on_drop(w)
+        if self.on_evict is not None:
+            self.on_evict(tag, w)
+        return True
+
+    def discard(self, tag: Any, report: bool = True) -> int:
+        """
+        Bỏ mọi item không-keep của tag đang chờ (vd delta phụ thuộc frame vừa bị bỏ), đếm vào skipped.
+        report=False: item bị thay bằng item mới hơn cùng loại (gộp), không tính là bị bỏ.
+        """
+        kept: Deque[Tuple[float, Any, int, int, Any, bool]] = deque()
+        n = 0
+        for entry in self._q:
+            if entry[4] == tag and not entry[5]:
+                self._bytes -= entry[3]
+                n += entry[2]
+            else:
+                kept.append(entry)
+        if n:
+            self._q = kept
+            if not report:
+                return n
+            self._skipped[tag] = self._skipped.get(tag, 0) + n
+            self.dropped += n
+            if self.on_drop is not None:
+                self.on_drop(n)
+        return n
+
+    def queued(self) -> int:
+        return len(self._q)
+
+    def stats(self) -> dict:
+        oldest_ms = (time.monotonic() - self._q[0][0]) * 1000 if self._q else 0.0
+        return {
+            "client": _client_label(self.ws),
+            "policy": self.policy,
+            "queued": len(self._q),
+            "queued_bytes": self._bytes,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "bytes_sent": self.bytes_sent,
+            "lag_ms": round(max(self.last_lag_ms, oldest_ms), 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+        }
+
+    async def close(self):
+        self.closed = True
+        self._q.clear()
+        self._bytes = 0
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def _abort(self):
+        # client quá chậm với policy=disconnect
+        self.closed = True
+        self._q.clear()
+        self._bytes = 0
+        self._wakeup.set()
+        asyncio.create_task(self._close_ws(1013))
+
+    async def _close_ws(self, code: int):
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+        if self.on_close:
+            self.on_close(self)
+
+    async def _send(self, item: Any):
+        if isinstance(item, str):
+            await self.ws.send_text(item)
+        else:
+            await self.ws.send_bytes(bytes(item))
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                if not self._q:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                if self._skipped:
+                    skipped, self._skipped = self._skipped, {}
+                    for tag, n in skipped.items():
+                        await self._send(self.skip_marker(n) if tag is None else self.skip_marker(n, tag))
+                t_enq, item, weight, size, _, _ = self._q.popleft()
+                self._bytes -= size
+                await self._send(item)
+                lag = (time.monotonic() - t_enq) * 1000
+                self.last_lag_ms = lag
+                if lag > self.max_lag_ms:
+                    self.max_lag_ms = lag
+                self.sent += weight
+                self.bytes_sent += size
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # socket lỗi / đã đóng
+            self.closed = True
+            if self.on_close:
+                self.on_close(self)
+
+
+def _client_label(ws: WebSocket) -> str:
+    c = getattr(ws, "client", None)
+    return f"{c.host}:{c.port}" if c else "?"
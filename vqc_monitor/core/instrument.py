@@ -0,0 +1,259 @@
+# app/core/instrument.py
+"""
+Số liệu nội bộ của chính vqc-monitor, xuất dạng Prometheus text (GET /metrics).
+- Counter / Histogram không dùng lock: chỉ là phép cộng int/float trên slot có sẵn (list), phần lớn chạy
+  trên event loop; từ threadpool có thể mất 1 lần cộng khi 2 thread trùng nhau, chấp nhận được cho số liệu
+  giám sát. Histogram bucket cố định, tìm bucket bằng bisect (không cấp phát khi ghi).
+- Gauge lấy giá trị lúc scrape qua callback (độ sâu hàng đợi, số client...), không tốn gì lúc chạy.
+- Label cố định lúc khai báo; labels(...) trả child đã cache -> nên giữ child ở biến module cho đường nóng.
+Đo chi phí ghi: python -m vqc_monitor.core.instrument
+"""
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# giây: 0.1ms .. 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+GaugeValue = Union[float, Dict[Tuple[str, ...], float]]
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if isinstance(v, int) or float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: cần {len(self.labelnames)} label")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: float = 1):
+        self.value += n
+
+
+class Counter(_Family):
+    """Tên nên kết thúc bằng _total (quy ước Prometheus)."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, n: float = 1):
+        self.labels().inc(n)
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for key, c in self._children.items():
+            out.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_num(c.value)}")
+        return out
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # slot cuối = +Inf
+        self.sum = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("h", "t0")
+
+    def __init__(self, h: _HistogramChild):
+        self.h = h
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.h.observe(time.perf_counter() - self.t0)
+        return False
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, v: float):
+        self.labels().observe(v)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for key, h in self._children.items():
+            acc = 0
+            for bound, n in zip(self.buckets + (math.inf,), list(h.counts)):
+                acc += n
+                le = 'le="' + _fmt_num(bound) + '"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_num(h.sum)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {acc}")
+        return out
+
+
+class Gauge(_Family):
+    """Giá trị đọc lúc scrape: fn() -> số, hoặc {tuple label: số}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], GaugeValue], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            v = self.fn()
+        except Exception as e:
+            return [f"# {self.name} lỗi: {_escape(str(e))}"]
+        out = self.header()
+        items = v.items() if isinstance(v, dict) else [((), v)]
+        for key, val in items:
+            out.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_num(val)}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+
+    def _add(self, fam: _Family):
+        if fam.name in self._families:
+            return self._families[fam.name]
+        self._families[fam.name] = fam
+        if not fam.labelnames and not isinstance(fam, Gauge):
+            fam.labels()  # không label: xuất 0 ngay từ đầu
+        return fam
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], GaugeValue], labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, fn, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for fam in self._families.values():
+            lines.extend(fam.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ---- metrics dùng chung ----
+DB_SECONDS = registry.histogram("vqc_db_seconds", "Thời gian 1 thao tác repo (ghi / truy vấn)", ("op",))
+DB_COMMIT_SECONDS = registry.histogram("vqc_db_commit_seconds", "Thời gian commit transaction", ("site",))
+
+
+def timed(hist: Histogram, *labels: str):
+    """Decorator đo thời gian hàm vào hist.labels(*labels)."""
+    child = hist.labels(*labels)
+
+    def deco(fn):
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - t0)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return deco
+
+
+def bench(n: int = 1_000_000) -> Dict[str, float]:
+    """ns / thao tác ghi (counter.inc, histogram.observe, timer context) so với vòng lặp rỗng."""
+    reg = Registry()
+    c = reg.counter("bench_total", "bench").labels()
+    h = reg.histogram("bench_seconds", "bench").labels()
+    rng = range(n)
+    out = {}
+    t0 = time.perf_counter()
+    for _ in rng:
+        pass
+    base = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in rng:
+        c.inc()
+    out["counter_inc_ns"] = (time.perf_counter() - t0 - base) / n * 1e9
+    t0 = time.perf_counter()
+    for i in rng:
+        h.observe(0.003)
+    out["histogram_observe_ns"] = (time.perf_counter() - t0 - base) / n * 1e9
+    m = n // 10
+    t0 = time.perf_counter()
+    for _ in range(m):
+        with h.time():
+            pass
+    out["histogram_timer_ns"] = (time.perf_counter() - t0 - base / 10) / m * 1e9
+    return {k: round(v, 1) for k, v in out.items()}
+
+
+if __name__ == "__main__":
+    for k, v in bench().items():
+        print(f"{k:<24} {v:>8.1f}")
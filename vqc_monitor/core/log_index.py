@@ -0,0 +1,317 @@
+# app/core/log_index.py
+"""
+Index log các service đang theo dõi vào SQLite FTS5 để tìm kiếm lịch sử (/logs/search).
+- File DB riêng (settings.LOG_INDEX_PATH) để ghi log không tranh khoá ghi với DB metrics.
+- 1 tiến trình `journalctl -f -o json -u a -u b ...`; cursor cuối lưu cùng transaction với batch
+  nên khởi động lại tiếp tục đúng chỗ (--after-cursor), không trùng, không mất.
+- Ghi theo batch: LOG_INDEX_BATCH entry hoặc sau LOG_INDEX_FLUSH_MS, 1 transaction / batch, chạy trong thread.
+- Tập unit (settings.APPS, đổi khi reload config / discovery) được so lại mỗi UNITS_CHECK_S:
+  đổi thì chạy lại journalctl với tập mới từ cursor cuối.
+- Partition theo ngày (UTC): log_entries_YYYYMMDD (bảng thường, index (service, ts_ms)) +
+  log_fts_YYYYMMDD (FTS5 external content, nạp bằng trigger). Retention = DROP TABLE partition cũ.
+"""
+import asyncio
+import time
+from asyncio.subprocess import PIPE
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Set
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+from vqc_monitor.core.config import settings
+from vqc_monitor.core.logs import _READ_LIMIT, _UNIT_FIELDS, _field_str, _parse_entry
+
+DAY_MS = 86400 * 1000
+UNITS_CHECK_S = 5.0  # chu kỳ so tập unit đang follow với settings.APPS
+
+
+def _db_path() -> str:
+    return settings.LOG_INDEX_PATH or str(Path(settings.DB_PATH).with_suffix(".logs.db"))
+
+
+engine = create_engine(f"sqlite:///{_db_path()}", connect_args={"check_same_thread": False}, poolclass=NullPool)
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragma(dbapi_conn, conn_record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL;")
+    cursor.execute("PRAGMA synchronous=NORMAL;")
+    cursor.close()
+
+
+# ---------- partition ----------
+_known_days: Set[str] = set()
+
+
+def _day_of(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y%m%d")
+
+
+def _day_start_ms(day: str) -> int:
+    return int(datetime.strptime(day, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _ensure_partition(conn, day: str):
+    if day in _known_days:
+        return
+    # day luôn là 8 chữ số do _day_of tạo ra -> an toàn khi ghép vào tên bảng
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS log_entries_{day} (
+            id INTEGER PRIMARY KEY,
+            ts_ms INTEGER NOT NULL,
+            service TEXT NOT NULL,
+            priority INTEGER,
+            cursor TEXT,
+            message TEXT NOT NULL
+        )"""))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_log_entries_{day}_svc_ts ON log_entries_{day}(service, ts_ms)"))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_log_entries_{day}_ts ON log_entries_{day}(ts_ms)"))
+    conn.execute(text(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS log_fts_{day}
+        USING fts5(message, content='log_entries_{day}', content_rowid='id', tokenize='unicode61')"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS log_entries_{day}_ai AFTER INSERT ON log_entries_{day} BEGIN
+            INSERT INTO log_fts_{day}(rowid, message) VALUES (new.id, new.message);
+        END"""))
+    _known_days.add(day)
+
+
+def init_db():
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS log_index_state (key TEXT PRIMARY KEY, value TEXT)"))
+        rows = conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB 'log_entries_[0-9]*'"
+        )).fetchall()
+    _known_days.update(r[0].removeprefix("log_entries_") for r in rows)
+
+
+def load_cursor() -> Optional[str]:
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT value FROM log_index_state WHERE key='cursor'")).fetchone()
+    return row[0] if row else None
+
+
+def write_batch(rows: List[dict], cursor: Optional[str]):
+    """Ghi 1 batch + cursor cuối trong cùng 1 transaction."""
+    by_day = {}
+    for r in rows:
+        by_day.setdefault(_day_of(r["ts_ms"]), []).append(r)
+    with engine.begin() as conn:
+        for day, items in by_day.items():
+            _ensure_partition(conn, day)
+            conn.execute(text(
+                f"INSERT INTO log_entries_{day} (ts_ms, service, priority, cursor, message) "
+                "VALUES (:ts_ms, :service, :priority, :cursor, :message)"
+            ), items)
+        if cursor:
+            conn.execute(text(
+                "INSERT INTO log_index_state (key, value) VALUES ('cursor', :c) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+            ), {"c": cursor})
+
+
+def drop_old_partitions(retention_days: int) -> List[str]:
+    """Xoá partition có ngày cũ hơn retention_days (DROP TABLE, nhanh hơn DELETE từng dòng)."""
+    if not _known_days:
+        init_db()
+    cutoff = _day_of(int(time.time() * 1000) - retention_days * DAY_MS)
+    dropped = []
+    with engine.begin() as conn:
+        for day in sorted(_known_days):
+            if day >= cutoff:
+                continue
+            conn.execute(text(f"DROP TABLE IF EXISTS log_fts_{day}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS log_entries_{day}"))
+            dropped.append(day)
+    _known_days.difference_update(dropped)
+    return dropped
+
+
+def search(q: Optional[str], service: Optional[str], start_ms: Optional[int], end_ms: Optional[int],
+           limit: int = 100, offset: int = 0) -> dict:
+    """
+    q: cú pháp FTS5 (vd: `timeout AND upstream`, `"connection refused"`, `err*`); None = chỉ lọc theo thời gian.
+    Có q: xếp theo bm25 (điểm tính trong từng partition nên chỉ gần đúng giữa các ngày khác nhau).
+    Không q: mới nhất trước.
+    Raise ValueError nếu q sai cú pháp.
+    """
+    if not _known_days:
+        init_db()
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+    start_ms = start_ms if start_ms is not None else 0
+    days = [d for d in sorted(_known_days, reverse=True)
+            if _day_start_ms(d) <= end_ms and _day_start_ms(d) + DAY_MS > start_ms]
+    need = offset + limit + 1  # +1 để biết còn trang sau
+    params = {"q": q, "svc": service, "start": start_ms, "end": end_ms, "need": need}
+    svc_cond = "AND e.service = :svc" if service else ""
+    rows = []
+    with engine.connect() as conn:
+        for day in days:
+            if q:
+                sql = (f"SELECT e.id, e.ts_ms, e.service, e.priority, e.cursor, e.message, bm25(log_fts_{day}) AS rank "
+                       f"FROM log_fts_{day} JOIN log_entries_{day} e ON e.id = log_fts_{day}.rowid "
+                       f"WHERE log_fts_{day} MATCH :q AND e.ts_ms BETWEEN :start AND :end {svc_cond} "
+                       f"ORDER BY rank LIMIT :need")
+            else:
+                sql = (f"SELECT e.id, e.ts_ms, e.service, e.priority, e.cursor, e.message, NULL AS rank "
+                       f"FROM log_entries_{day} e WHERE e.ts_ms BETWEEN :start AND :end {svc_cond} "
+                       f"ORDER BY e.ts_ms DESC LIMIT :need")
+            try:
+                rows.extend(conn.execute(text(sql), params).mappings().all())
+            except OperationalError as e:
+                raise ValueError(str(e.orig)) from None
+            if not q and len(rows) >= need:
+                # partition duyệt từ mới tới cũ -> đủ dòng thì dừng
+                break
+    if q:
+        rows.sort(key=lambda r: r["rank"])
+    page = rows[offset:offset + limit]
+    return {
+        "items": [dict(r) for r in page],
+        "has_more": len(rows) > offset + limit,
+    }
+
+
+# ---------- ingest ----------
+class LogIndexer:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self.indexed = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0  # thời gian ghi batch gần nhất
+        self.last_ts_ms = 0  # ts của entry mới nhất đã index
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Dừng follow; batch đang gom được ghi nốt (finally của _consume) trước khi trả về."""
+        if self._proc and self._proc.returncode is None:
+            self._proc.terminate()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.LOG_INDEX_ENABLED,
+            "indexed": self.indexed,
+            "batches": self.batches,
+            "last_batch_ms": round(self.last_batch_ms, 1),
+            "lag_ms": int(time.time() * 1000) - self.last_ts_ms if self.last_ts_ms else None,
+            "partitions": sorted(_known_days),
+        }
+
+    async def _run(self):
+        await asyncio.to_thread(init_db)
+        cursor = await asyncio.to_thread(load_cursor)
+        while True:
+            services = _services()
+            if not services:
+                # chưa có app nào: đợi reload config / discovery thêm unit
+                await asyncio.sleep(UNITS_CHECK_S)
+                continue
+            cmd = ["journalctl", "-f", "--no-pager", "-o", "json"]
+            for svc in sorted(services):
+                cmd += ["-u", svc]
+            # lần đầu chưa có cursor: index từ thời điểm hiện tại
+            cmd += ["--after-cursor", cursor] if cursor else ["-n", "0"]
+            try:
+                self._proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE, limit=_READ_LIMIT)
+                cursor = await self._consume(self._proc, services, cursor)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARN] log index: {e}")
+            finally:
+                if self._proc and self._proc.returncode is None:
+                    self._proc.terminate()
+            if _services() == services:
+                # journalctl chết bất ngờ (không phải do đổi tập unit) -> đợi chút rồi chạy lại
+                await asyncio.sleep(1)
+
+    async def _consume(self, proc, services: Set[str], cursor: Optional[str]) -> Optional[str]:
+        """Đọc tới khi journalctl EOF hoặc tập unit đổi; trả cursor cuối đã ghi."""
+        batch: List[dict] = []
+        flush_s = max(0.01, settings.LOG_INDEX_FLUSH_MS / 1000)
+        deadline = None
+        next_check = time.monotonic() + UNITS_CHECK_S
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_check:
+                    if _services() != services:
+                        return cursor
+                    next_check = now + UNITS_CHECK_S
+                wake = next_check if deadline is None else min(deadline, next_check)
+                try:
+                    raw = await asyncio.wait_for(proc.stdout.readline(), max(0.0, wake - now))
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    if not raw:
+                        return cursor
+                    row = _entry_row(raw, services)
+                    if row is not None:
+                        batch.append(row)
+                        cursor = row["cursor"] or cursor
+                        if deadline is None:
+                            deadline = time.monotonic() + flush_s
+                if batch and (len(batch) >= settings.LOG_INDEX_BATCH or time.monotonic() >= deadline):
+                    await self._flush(batch, cursor)
+                    batch, deadline = [], None
+        finally:
+            if batch:
+                await self._flush(batch, cursor)
+
+    async def _flush(self, batch: List[dict], cursor: Optional[str]):
+        t0 = time.perf_counter()
+        await asyncio.to_thread(write_batch, batch, cursor)
+        self.last_batch_ms = (time.perf_counter() - t0) * 1000
+        self.indexed += len(batch)
+        self.batches += 1
+        self.last_ts_ms = batch[-1]["ts_ms"]
+
+
+def _services() -> Set[str]:
+    return {f"{app_id}.service" for app_id in settings.APPS}
+
+
+def _entry_row(raw: bytes, services: Set[str]) -> Optional[dict]:
+    e = _parse_entry(raw)
+    if e is None:
+        return None
+    service = None
+    for key in _UNIT_FIELDS:
+        unit = _field_str(e.get(key))
+        if unit in services:
+            service = unit
+            break
+    if service is None:
+        return None
+    try:
+        ts_ms = int(e.get("__REALTIME_TIMESTAMP")) // 1000
+    except (TypeError, ValueError):
+        ts_ms = int(time.time() * 1000)
+    try:
+        priority = int(_field_str(e.get("PRIORITY")))
+    except ValueError:
+        priority = None
+    return {
+        "ts_ms": ts_ms,
+        "service": service,
+        "priority": priority,
+        "cursor": e.get("__CURSOR"),
+        "message": _field_str(e.get("MESSAGE")),
+    }
+
+
+log_indexer = LogIndexer()
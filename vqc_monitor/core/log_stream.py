@@ -0,0 +1,323 @@
+# app/core/log_stream.py
+"""
+Các khối dùng chung cho stream log (LogHub, ...):
+- FrameCoalescer: gộp nhiều dòng thành 1 frame websocket, flush theo số dòng / bytes / timer (~50ms),
+  kèm rate limit (token bucket) và báo số dòng bị bỏ.
+- frame_lines: chia backlog thành frame cùng quy tắc.
+- LineRing: ring buffer các dòng gần nhất của 1 follower (giới hạn theo dòng + bytes) để phục vụ tail.
+- LogFilter: filter phía server / subscriber (priority, include/exclude substring|regex, khoảng thời gian).
+- LogClient + broadcast_frame: phát 1 frame cho mọi client của 1 follower (dùng chung cho LogHub, ContainerLogHub).
+Mỗi dòng là LogLine = (text, cursor, priority, ts_us); cursor là __CURSOR của journal,
+priority là mức syslog 0..7; các field có thể None nếu nguồn không có.
+Frame text: các dòng nối bằng "\n". Frame json: {"lines": [...], "cursor": <cursor dòng cuối>}.
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from vqc_monitor.core.fanout import Subscriber
+from vqc_monitor.core.serialization import dumps
+
+SUPPRESSED_MARKER = "[... {n} lines suppressed (rate limit)]"
+
+LogLine = Tuple[str, Optional[str], Optional[int], Optional[int]]
+
+PRIORITY_NAMES = {
+    "emerg": 0, "alert": 1, "crit": 2, "err": 3, "error": 3,
+    "warning": 4, "warn": 4, "notice": 5, "info": 6, "debug": 7,
+}
+
+
+def frame_lines(lines: Iterable[LogLine], max_lines: int, max_bytes: int) -> Iterator[List[LogLine]]:
+    batch: List[LogLine] = []
+    size = 0
+    for item in lines:
+        n = len(item[0]) + 1
+        if batch and (len(batch) >= max_lines or size + n > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(item)
+        size += n
+    if batch:
+        yield batch
+
+
+def last_cursor(lines: List[LogLine]) -> Optional[str]:
+    for item in reversed(lines):
+        if item[1]:
+            return item[1]
+    return None
+
+
+def encode_text_frame(lines: List[LogLine], suppressed: int = 0) -> str:
+    text = "\n".join(item[0] for item in lines)
+    if suppressed:
+        marker = suppressed_marker(suppressed)
+        text = f"{text}\n{marker}" if text else marker
+    return text
+
+
+def encode_json_frame(lines: List[LogLine], suppressed: int = 0) -> bytes:
+    frame = {"lines": [item[0] for item in lines], "cursor": last_cursor(lines)}
+    if suppressed:
+        frame["suppressed"] = suppressed
+    return dumps(frame)
+
+
+def json_skip_marker(n: int) -> bytes:
+    # marker của fanout.Subscriber cho client format=json
+    return dumps({"lines": [], "cursor": None, "skipped": n})
+
+
+def suppressed_marker(n: int) -> str:
+    return SUPPRESSED_MARKER.format(n=n)
+
+
+class LineRing:
+    """Giữ tối đa max_lines dòng / max_bytes bytes gần nhất (LogLine)."""
+
+    def __init__(self, max_lines: int = 5000, max_bytes: int = 4 * 1024 * 1024):
+        self.max_lines = max(1, max_lines)
+        self.max_bytes = max_bytes
+        self._lines: Deque[LogLine] = deque()
+        self._bytes = 0
+        # True nếu phần đầu lịch sử đã bị cắt (đầy lúc seed hoặc bị evict)
+        # -> không phục vụ được tail lớn hơn len(ring)
+        self.truncated = False
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def extend(self, lines: Iterable[LogLine]):
+        for item in lines:
+            self._lines.append(item)
+            self._bytes += len(item[0]) + 1
+        while len(self._lines) > self.max_lines or (self._bytes > self.max_bytes and len(self._lines) > 1):
+            self._bytes -= len(self._lines.popleft()[0]) + 1
+            self.truncated = True
+
+    def after(self, cursor: str) -> Optional[List[LogLine]]:
+        """Các dòng sau cursor; None nếu cursor không còn trong ring."""
+        out = []
+        for item in reversed(self._lines):
+            if item[1] == cursor:
+                out.reverse()
+                return out
+            out.append(item)
+        return None
+
+    def tail(self, n: int, flt: Optional["LogFilter"] = None) -> Optional[List[LogLine]]:
+        """
+        n dòng cuối (khớp flt nếu có). None nếu ring không đủ để trả lời chắc chắn
+        (ít hơn n dòng khớp và phần đầu lịch sử đã bị cắt).
+        """
+        if n <= 0:
+            return []
+        if flt is None and n >= len(self._lines):
+            return list(self._lines) if not self.truncated or n == len(self._lines) else None
+        # deque không slice được; đi từ cuối cho nhanh khi n nhỏ
+        out = []
+        for item in reversed(self._lines):
+            if flt is None or flt.match(item):
+                out.append(item)
+                if len(out) >= n:
+                    break
+        if len(out) < n and self.truncated:
+            return None
+        out.reverse()
+        return out
+
+
+class FrameCoalescer:
+    """
+    emit(lines, suppressed) được gọi (đồng bộ, trên event loop) mỗi khi 1 frame sẵn sàng;
+    suppressed = số dòng bị rate limit bỏ kể từ frame trước.
+    rate_limit: số dòng/giây tối đa (0/None = không giới hạn), burst mặc định = rate_limit (tối thiểu 1).
+    """
+
+    def __init__(self, emit: Callable[[List[LogLine], int], None], max_lines: int = 200,
+                 max_bytes: int = 64 * 1024, flush_ms: int = 50,
+                 rate_limit: Optional[float] = None, burst: Optional[float] = None):
+        self._emit = emit
+        self.max_lines = max(1, max_lines)
+        self.max_bytes = max(1, max_bytes)
+        self.flush_s = max(0, flush_ms) / 1000
+        self.rate_limit = rate_limit or 0
+        # bucket phải chứa được ít nhất 1 token, nếu không rate_limit < 1 (vd 0.5 dòng/s) sẽ chặn mọi dòng
+        self.burst = max(1.0, burst or self.rate_limit)
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._lines: List[LogLine] = []
+        self._bytes = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.suppressed = 0        # chưa báo cho client
+        self.suppressed_total = 0  # tích luỹ
+
+    def add(self, line: str, cursor: Optional[str] = None,
+            priority: Optional[int] = None, ts_us: Optional[int] = None):
+        if self.rate_limit and not self._take_token():
+            self.suppressed += 1
+            self.suppressed_total += 1
+            self._arm_timer()
+            return
+        self._lines.append((line, cursor, priority, ts_us))
+        self._bytes += len(line) + 1
+        if len(self._lines) >= self.max_lines or self._bytes >= self.max_bytes:
+            self.flush()
+        else:
+            self._arm_timer()
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        lines, suppressed = self._lines, self.suppressed
+        if not lines and not suppressed:
+            return
+        self._lines, self._bytes, self.suppressed = [], 0, 0
+        self._emit(lines, suppressed)
+
+    def close(self):
+        self.flush()
+
+    def _arm_timer(self):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_s, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self.flush()
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_limit)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+def parse_priority(value: Optional[str]) -> Optional[int]:
+    """'err' | 'warning' | '3' ... -> 0..7; None nếu không truyền."""
+    if value is None or value == "":
+        return None
+    v = value.strip().lower()
+    if v.isdigit() and 0 <= int(v) <= 7:
+        return int(v)
+    if v in PRIORITY_NAMES:
+        return PRIORITY_NAMES[v]
+    raise ValueError(f"Invalid priority: {value}")
+
+
+class LogFilter:
+    """
+    Filter compile 1 lần / subscriber.
+    - priority: chỉ nhận dòng có priority <= giá trị này (0=emerg ... 7=debug); dòng không rõ priority được giữ
+    - include / exclude: substring (mặc định) hoặc regex (regex=True)
+    - since_ms / until_ms: giới hạn theo thời gian của entry
+    """
+    MAX_PATTERN = 512
+
+    def __init__(self, priority: Optional[int] = None, include: Optional[str] = None,
+                 exclude: Optional[str] = None, regex: bool = False, ignore_case: bool = False,
+                 since_ms: Optional[int] = None, until_ms: Optional[int] = None):
+        self.priority = priority
+        self.since_us = since_ms * 1000 if since_ms is not None else None
+        self.until_us = until_ms * 1000 if until_ms is not None else None
+        self._include = self._compile(include, regex, ignore_case)
+        self._exclude = self._compile(exclude, regex, ignore_case)
+        # key dùng để dùng chung frame đã encode giữa các client cùng filter
+        self.key = (priority, include, exclude, regex, ignore_case, since_ms, until_ms)
+        self.has_text_filter = self._include is not None or self._exclude is not None
+        self.active = (priority is not None or since_ms is not None or until_ms is not None
+                       or self._include is not None or self._exclude is not None)
+
+    def _compile(self, pattern: Optional[str], regex: bool, ignore_case: bool) -> Optional[Callable[[str], bool]]:
+        if not pattern:
+            return None
+        if len(pattern) > self.MAX_PATTERN:
+            raise ValueError("Pattern too long")
+        if regex:
+            try:
+                rx = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+            except re.error as e:
+                raise ValueError(f"Invalid regex: {e}") from None
+            return lambda text: rx.search(text) is not None
+        if ignore_case:
+            needle = pattern.lower()
+            return lambda text: needle in text.lower()
+        return lambda text: pattern in text
+
+    def match(self, item: LogLine) -> bool:
+        text, _, prio, ts = item[0], item[1], item[2], item[3]
+        if self.priority is not None and prio is not None and prio > self.priority:
+            return False
+        if ts is not None:
+            if self.since_us is not None and ts < self.since_us:
+                return False
+            if self.until_us is not None and ts > self.until_us:
+                return False
+        if self._include is not None and not self._include(text):
+            return False
+        if self._exclude is not None and self._exclude(text):
+            return False
+        return True
+
+    def apply(self, lines: List[LogLine]) -> List[LogLine]:
+        if not self.active:
+            return lines
+        return [item for item in lines if self.match(item)]
+
+
+class LogClient:
+    """1 websocket đang xem log: hàng đợi gửi + định dạng frame (text | json) + filter (None = nhận hết)."""
+    __slots__ = ("sub", "fmt", "filter")
+
+    def __init__(self, sub: Subscriber, fmt: str, flt: Optional[LogFilter] = None):
+        self.sub = sub
+        self.fmt = fmt
+        self.filter = flt if flt is not None and flt.active else None
+
+    def put_frame(self, lines: List[LogLine], suppressed: int = 0):
+        data = encode_json_frame(lines, suppressed) if self.fmt == "json" else encode_text_frame(lines, suppressed)
+        self.sub.put(data, weight=len(lines) + (1 if suppressed else 0))
+
+    def put_lines(self, lines: List[LogLine], max_lines: int, max_bytes: int):
+        for frame in frame_lines(lines, max_lines, max_bytes):
+            self.put_frame(frame)
+
+
+def broadcast_frame(clients: Iterable[LogClient], lines: List[LogLine], suppressed: int):
+    """
+    Lọc + encode 1 lần / (filter, định dạng): client cùng filter dùng chung frame đã encode.
+    put() không await: client chậm chỉ làm đầy hàng đợi của chính nó.
+    """
+    filtered: Dict[tuple, List[LogLine]] = {}
+    encoded: Dict[tuple, tuple] = {}
+    for client in clients:
+        fkey = client.filter.key if client.filter is not None else None
+        key = (client.fmt, fkey)
+        hit = encoded.get(key)
+        if hit is None:
+            if fkey is None:
+                sel = lines
+            else:
+                sel = filtered.get(fkey)
+                if sel is None:
+                    sel = filtered[fkey] = client.filter.apply(lines)
+            if not sel and not suppressed:
+                hit = (None, 0)
+            elif client.fmt == "json":
+                hit = (encode_json_frame(sel, suppressed), len(sel) + (1 if suppressed else 0))
+            else:
+                hit = (encode_text_frame(sel, suppressed), len(sel) + (1 if suppressed else 0))
+            encoded[key] = hit
+        data, weight = hit
+        if data is not None:
+            client.sub.put(data, weight=weight)
@@ -1,11 +1,22 @@
 import asyncio
 import re
-from typing import Dict, Set, Optional
+import time
+from collections import deque
+from typing import Deque, Dict, List, Set, Optional, Tuple
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException
 from fastapi.responses import PlainTextResponse
 from starlette.concurrency import run_in_threadpool
 from asyncio.subprocess import PIPE
 import shlex
+from datetime import datetime
+from vqc_monitor.core.config import settings
+from vqc_monitor.core.serialization import loads
+from vqc_monitor.core.fanout import Subscriber, default_skip_marker
+from vqc_monitor.core.instrument import registry
+from vqc_monitor.core.log_stream import (
+    FrameCoalescer, LineRing, LogClient, LogFilter, LogLine, broadcast_frame,
+    json_skip_marker, parse_priority,
+)
 
 # Tùy bạn lấy từ config của app (services hợp lệ)
 ALLOWED_SERVICES: Set[str] = set()  # set ở startup từ config.yaml
@@ -17,106 +28,512 @@ TAIL_DEFAULT = 200
 router = APIRouter(prefix="/logs", tags=["logs"])
 
 
+_JOURNAL_ENTRIES = registry.counter("vqc_log_journal_entries_total", "Entry journal đã nhận (sau khi bỏ trùng)")
+_FRAMES = registry.counter("vqc_log_frames_total", "Frame log đã phát tới subscriber")
+_LINES = registry.counter("vqc_log_lines_total", "Dòng log đã phát tới subscriber")
+_DROPPED_LINES = registry.counter("vqc_log_dropped_lines_total", "Dòng log bị bỏ do hàng đợi client đầy")
+_RING_HITS = registry.counter("vqc_log_ring_hits_total", "Tail / resume lấy được từ ring RAM")
+_RING_MISSES = registry.counter("vqc_log_ring_misses_total", "Tail / resume phải gọi journalctl")
+
+CURSOR_RE = re.compile(r"^[\w=;\-]{1,512}$")  # s=...;i=...;b=...;m=...;t=...;x=...
+
+
+class _Follow:
+    """Trạng thái follower của 1 service."""
+    __slots__ = ("service", "task", "proc", "coalescer", "ring", "ready", "clients", "pending",
+                 "last_pos", "seeded", "in_mux")
+
+    def __init__(self, service: str):
+        self.service = service
+        self.task: Optional[asyncio.Task] = None
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.coalescer: Optional[FrameCoalescer] = None
+        self.ring = LineRing(settings.LOG_RING_MAX_LINES, settings.LOG_RING_MAX_BYTES)
+        self.ready = asyncio.Event()  # set sau khi seed ring xong
+        self.clients: Dict[WebSocket, LogClient] = {}
+        self.pending = 0  # subscriber đang chờ ready (giữ follower sống)
+        self.last_pos: Optional[tuple] = None  # vị trí entry cuối đã nạp/phát (xem _entry_pos)
+        self.seeded = False
+        self.in_mux = False  # đã nằm trong tiến trình journalctl multiplex đang chạy
+
+
 class LogHub:
-    """Quản lý subscriber/reader cho mỗi service."""
-    def __init__(self):
-        self._clients: Dict[str, Set[WebSocket]] = {}
-        self._tasks: Dict[str, asyncio.Task] = {}
-        self._procs: Dict[str, asyncio.subprocess.Process] = {}
+    """
+    Quản lý subscriber/reader cho mỗi service.
+    Mỗi client có hàng đợi gửi riêng (core/fanout.Subscriber) nên 1 client chậm
+    không làm chậm client khác hay làm nghẽn pipe của journalctl -f.
+    Dòng log được gộp thành frame nhiều dòng (core/log_stream.FrameCoalescer), có rate limit / service.
+    Mỗi follower giữ ring buffer các dòng gần nhất: subscriber mới lấy tail từ RAM,
+    chỉ gọi journalctl -n khi ring không đủ.
+
+    2 chế độ đọc journal (settings.LOG_FOLLOW_MODE):
+    - per_service: 1 tiến trình `journalctl -fu <svc> -o json` / service
+    - multiplex  : 1 tiến trình `journalctl -f -o json -u a -u b ...` cho mọi service, demux theo
+                   _SYSTEMD_UNIT. Thêm/bớt unit thì khởi động lại với --after-cursor (không mất entry
+                   của unit khác), entry trùng bị loại theo vị trí cuối đã phát của từng unit.
+    """
+    def __init__(self, mode: Optional[str] = None):
+        self.mode = mode or settings.LOG_FOLLOW_MODE
+        self._follows: Dict[str, _Follow] = {}
         self._lock = asyncio.Lock()
+        self.ring_hits = 0
+        self.ring_misses = 0
+        # ---- multiplex ----
+        self._mux_task: Optional[asyncio.Task] = None
+        self._mux_proc: Optional[asyncio.subprocess.Process] = None
+        self._mux_pos: Optional[tuple] = None
+        self._mux_dirty = False
+        self.mux_restarts = 0
 
-    async def subscribe(self, service: str, ws: WebSocket, tail: int):
-        # Đăng ký client
+    async def subscribe(self, service: str, ws: WebSocket, tail: int, overflow: Optional[str] = None,
+                        fmt: str = "text", after_cursor: Optional[str] = None,
+                        flt: Optional[LogFilter] = None, sink=None) -> Subscriber:
+        """
+        fmt="json": frame {"lines": [...], "cursor": ...} để client nhớ cursor cuối.
+        after_cursor: client kết nối lại -> chỉ gửi các dòng sau cursor (từ ring, hoặc
+        journalctl --after-cursor nếu ring không còn giữ cursor đó); bỏ qua tail.
+        flt: chỉ gửi dòng khớp filter (áp dụng trước khi vào hàng đợi, cả backlog lẫn live);
+        tail = số dòng *khớp* cuối cùng.
+        """
+        if after_cursor is not None and not CURSOR_RE.match(after_cursor):
+            raise HTTPException(400, "Invalid cursor")
+        if sink is None:
+            sub = Subscriber(
+                ws,
+                # chừa chỗ cho backlog để tail lớn không tự làm tràn hàng đợi
+                maxsize=settings.LOG_QUEUE_MAX + max(tail, settings.LOG_RING_MAX_LINES if after_cursor else 0),
+                policy=overflow or settings.LOG_OVERFLOW_POLICY,
+                skip_marker=json_skip_marker if fmt == "json" else default_skip_marker,
+                on_close=lambda s: asyncio.create_task(self.unsubscribe(service, ws)),
+                on_drop=_DROPPED_LINES.labels().inc,
+            ).start()
+        else:
+            # kênh của /ws/mux: dùng chung hàng đợi gửi của kết nối; khoá client là sink thay cho ws
+            sub = ws = sink
+        client = LogClient(sub, fmt, flt)
+        flt = client.filter
         async with self._lock:
-            self._clients.setdefault(service, set()).add(ws)
-            # start follower nếu chưa có
-            if service not in self._tasks:
-                self._tasks[service] = asyncio.create_task(self._follow_task(service))
-
-        # Gửi backlog 'tail' dòng gần nhất
-        if tail > 0:
-            cmd = ["journalctl", "-u", service, "-n", str(tail), "--no-pager", "-o", "short-iso"]
+            f = self._follows.get(service)
+            if f is None:
+                # start follower nếu chưa có
+                f = self._follows[service] = _Follow(service)
+            if f.task is None or (self.mode != "multiplex" and f.task.done()):
+                # follower mới, hoặc journalctl đã chết -> chạy lại (seed lại ring)
+                f.ready = asyncio.Event()
+                f.ring = LineRing(settings.LOG_RING_MAX_LINES, settings.LOG_RING_MAX_BYTES)
+                f.seeded = f.in_mux = False
+                f.last_pos = None
+                f.coalescer = self._make_coalescer(f)
+                if self.mode == "multiplex":
+                    f.task = asyncio.create_task(self._mux_add(f))
+                else:
+                    f.task = asyncio.create_task(self._follow_task(f))
+            f.pending += 1
+        try:
             try:
-                proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
-                async for raw in proc.stdout:
-                    await self._send_line(ws, raw)
-                await proc.wait() 
-            except Exception as e:
-                await ws.send_text(f"[journalctl tail error] {e}")
+                await asyncio.wait_for(f.ready.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                pass
+
+            backlog = None
+            if after_cursor is not None:
+                if f.ready.is_set():
+                    backlog = f.ring.after(after_cursor)
+                    if backlog is not None and flt is not None:
+                        backlog = flt.apply(backlog)
+            elif tail > 0 and f.ready.is_set():
+                backlog = f.ring.tail(tail, flt)
+
+            skipped = 0
+            if backlog is not None:
+                self.ring_hits += 1
+                _RING_HITS.inc()
+            elif after_cursor is not None or tail > 0:
+                # ring không đủ: đọc journal trước, rồi nối phần ring sau entry cuối đọc được
+                self.ring_misses += 1
+                _RING_MISSES.inc()
+                if after_cursor is not None:
+                    # giữ tối đa LOG_RING_MAX_LINES dòng mới nhất, phần cũ hơn báo "skipped"
+                    cmd = ["journalctl", "-u", service, "--after-cursor", after_cursor, "--no-pager", "-o", "json"]
+                    limit = settings.LOG_RING_MAX_LINES
+                else:
+                    n = tail
+                    if flt is not None and flt.has_text_filter:
+                        # include/exclude không đẩy xuống journalctl được: đọc rộng hơn rồi lọc
+                        n = max(tail, settings.LOG_RING_MAX_LINES)
+                    cmd = ["journalctl", "-u", service, "-n", str(n), "--no-pager", "-o", "json"]
+                    limit = tail
+                if flt is not None:
+                    cmd += _journal_filter_args(flt)
+                backlog, skipped, cur = await self._backlog_from_journal(cmd, limit, flt)
+                gap = f.ring.after(cur) if cur else None
+                if gap:
+                    backlog += flt.apply(gap) if flt is not None else gap
+
+            # Từ đây tới khi đăng ký client không có await: backlog + frame live sau đó
+            # nối tiếp nhau, không trùng, không hở.
+            if skipped:
+                sub.put(sub.skip_marker(skipped))
+            if backlog:
+                client.put_lines(backlog, settings.LOG_FRAME_MAX_LINES, settings.LOG_FRAME_MAX_BYTES)
+            f.clients[ws] = client
+        finally:
+            f.pending -= 1
+        return sub
 
     async def unsubscribe(self, service: str, ws: WebSocket):
         async with self._lock:
-            clients = self._clients.get(service)
-            if clients and ws in clients:
-                clients.remove(ws)
-            if clients and len(clients) > 0:
+            f = self._follows.get(service)
+            if f is None:
+                return
+            client = f.clients.pop(ws, None)
+            if client:
+                await client.sub.close()
+            if f.clients or f.pending:
                 return
             # Không còn client: dừng task & proc
-            task = self._tasks.pop(service, None)
-            proc = self._procs.pop(service, None)
-            self._clients.pop(service, None)
-            if proc and proc.returncode is None:
-                try:
-                    proc.terminate()
-                except ProcessLookupError:
-                    pass
-            if task:
-                task.cancel()
-
-    async def _follow_task(self, service: str):
-        """Chạy journalctl -fu và broadcast."""
-        cmd = ["journalctl", "-fu", service, "--no-pager", "-o", "short-iso"]
-        proc = None
+            self._follows.pop(service, None)
+            if self.mode != "multiplex":
+                _terminate(f.proc)
+            if f.task:
+                f.task.cancel()
+            if f.coalescer:
+                f.coalescer.close()
+            if self.mode == "multiplex" and f.in_mux:
+                self._mux_restart()
+
+    def follower_count(self) -> int:
+        return len(self._follows)
+
+    def queue_totals(self) -> Tuple[int, int]:
+        """(số client đang nhận log, tổng frame đang chờ gửi) của mọi follower."""
+        clients = queued = 0
+        for f in self._follows.values():
+            for c in f.clients.values():
+                clients += 1
+                queued += c.sub.queued()
+        return clients, queued
+
+    def stats(self) -> Dict[str, dict]:
+        """Thống kê hàng đợi / độ trễ theo từng client, nhóm theo service."""
+        out = {}
+        for svc, f in self._follows.items():
+            out[svc] = {
+                "suppressed_total": f.coalescer.suppressed_total if f.coalescer else 0,
+                "ring_lines": len(f.ring),
+                "ring_bytes": f.ring.nbytes,
+                "clients": [{**c.sub.stats(), "format": c.fmt, "filtered": c.filter is not None}
+                            for c in f.clients.values()],
+            }
+        return out
+
+    def _make_coalescer(self, f: _Follow) -> FrameCoalescer:
+        return FrameCoalescer(
+            lambda lines, suppressed: self._broadcast_frame(f, lines, suppressed),
+            max_lines=settings.LOG_FRAME_MAX_LINES,
+            max_bytes=settings.LOG_FRAME_MAX_BYTES,
+            flush_ms=settings.LOG_FRAME_FLUSH_MS,
+            rate_limit=_rate_limit_for(f.service),
+        )
+
+    async def _backlog_from_journal(self, cmd: list, limit: int, flt: Optional[LogFilter] = None
+                                    ) -> Tuple[List[LogLine], int, Optional[str]]:
+        """
+        Chạy journalctl (không -f), trả (tối đa limit dòng cuối khớp flt, số dòng khớp bị bỏ phía trước,
+        cursor của entry cuối đọc được kể cả entry không khớp - để nối tiếp với ring).
+        """
+        lines: Deque[LogLine] = deque(maxlen=max(1, limit))
+        total = 0
+        cursor = None
+        try:
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE, limit=_READ_LIMIT)
+            async for raw in proc.stdout:
+                e = _parse_entry(raw)
+                if e is None:
+                    continue
+                item = _entry_line(e)
+                cursor = item[1] or cursor
+                if flt is None or flt.match(item):
+                    lines.append(item)
+                    total += 1
+            await proc.wait()
+        except Exception as e:
+            lines.append((f"[journalctl tail error] {e}", None, None, None))
+            total += 1
+        return list(lines), total - len(lines), cursor
+
+    async def _seed(self, f: _Follow) -> Optional[str]:
+        """
+        Nạp ring với tối đa ring.max_lines entry gần nhất, trả cursor của entry cuối
+        để follower tiếp tục đúng sau đó (--after-cursor).
+        """
+        n = f.ring.max_lines
+        cmd = ["journalctl", "-u", f.service, "-n", str(n), "--no-pager", "-o", "json"]
+        lines = []
+        cursor = None
         try:
             proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
-            async with self._lock:
-                self._procs[service] = proc
-            # Đọc dòng và phát cho mọi client
+            async for raw in proc.stdout:
+                e = _parse_entry(raw)
+                if e is None:
+                    continue
+                item = _entry_line(e)
+                cursor = item[1]
+                lines.append(item)
+                f.last_pos = _entry_pos(e)
+            await proc.wait()
+        except Exception as e:
+            print(f"[WARN] journalctl seed thất bại cho {f.service}: {e}")
+            return None
+        finally:
+            f.seeded = True
+        f.ring.extend(lines)
+        if len(lines) >= n:
+            f.ring.truncated = True
+        return cursor
+
+    async def _follow_task(self, f: _Follow):
+        """(per_service) Seed ring, chạy journalctl -fu -o json và broadcast."""
+        service = f.service
+        proc = None
+        try:
+            cursor = await self._seed(f)
+            cmd = ["journalctl", "-fu", service, "--no-pager", "-o", "json"]
+            if cursor:
+                cmd += ["--after-cursor", cursor]
+            else:
+                # không có cursor (journal trống / lỗi): chỉ lấy dòng mới
+                cmd += ["-n", "0"]
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE, limit=_READ_LIMIT)
+            f.proc = proc
+            f.ready.set()
+            # Đọc entry và phát cho mọi client
             while True:
                 raw = await proc.stdout.readline()
                 if not raw:
                     # journalctl kết thúc bất ngờ → thử delay nhỏ rồi thoát (task được tạo lại khi có client mới)
                     await asyncio.sleep(0.2)
                     break
-                await self._broadcast(service, raw)
+                self._dispatch(raw)
         except asyncio.CancelledError:
             pass
         except Exception as e:
-            await self._broadcast_text(service, f"[journalctl follow error] {e}")
+            f.coalescer.add(f"[journalctl follow error] {e}", priority=3)
         finally:
-            if proc and proc.returncode is None:
-                try:
-                    proc.terminate()
-                except ProcessLookupError:
-                    pass
+            f.ready.set()
+            f.coalescer.flush()
+            _terminate(proc)
+            # follower chết bất ngờ: bỏ state để client sau tạo lại
+            if self._follows.get(service) is f and not f.clients and not f.pending:
+                self._follows.pop(service, None)
 
-    async def _broadcast(self, service: str, raw: bytes):
-        async with self._lock:
-            clients = list(self._clients.get(service, []))
-        if not clients:
-            return
-        # Cắt line dài & decode
-        data = raw[:MAX_LINE_BYTES].decode("utf-8", errors="replace").rstrip("\n")
-        # Gửi concurrent nhưng không crash toàn bộ nếu 1 socket lỗi
-        await asyncio.gather(*(self._safe_send(ws, data) for ws in clients), return_exceptions=True)
-
-    async def _broadcast_text(self, service: str, msg: str):
-        async with self._lock:
-            clients = list(self._clients.get(service, []))
-        await asyncio.gather(*(self._safe_send(ws, msg) for ws in clients), return_exceptions=True)
+    # ---------- multiplex ----------
+    async def _mux_add(self, f: _Follow):
+        await self._seed(f)
+        if self._follows.get(f.service) is f:
+            self._mux_restart()
+
+    def _mux_restart(self):
+        # tiến trình hiện tại sẽ EOF, _mux_loop thấy cờ dirty và chạy lại với tập unit mới
+        self._mux_dirty = True
+        if self._mux_task is None or self._mux_task.done():
+            self._mux_task = asyncio.create_task(self._mux_loop())
+        else:
+            _terminate(self._mux_proc)
+
+    async def _mux_loop(self):
+        proc = None
+        try:
+            while True:
+                self._mux_dirty = False
+                follows = [f for f in self._follows.values() if f.seeded]
+                if not follows:
+                    self._mux_pos = None
+                    return
+                # bắt đầu từ vị trí sớm nhất mà 1 unit nào đó còn cần; entry cũ hơn bị _dispatch loại
+                positions = [(self._mux_pos if f.in_mux else f.last_pos) for f in follows]
+                start = _earliest([p for p in positions if p is not None])
+                cmd = ["journalctl", "-f", "--no-pager", "-o", "json"]
+                for f in follows:
+                    cmd += ["-u", f.service]
+                cmd += ["--after-cursor", start[0]] if start else ["-n", "0"]
+                proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE, limit=_READ_LIMIT)
+                self._mux_proc = proc
+                if self._mux_dirty:
+                    # unit được thêm trong lúc spawn (_mux_restart terminate nhầm proc cũ) -> chạy lại với tập mới
+                    _terminate(proc)
+                    await proc.wait()
+                    continue
+                self._mux_pos = start
+                self.mux_restarts += 1
+                for f in follows:
+                    f.in_mux = True
+                    f.proc = proc
+                    f.ready.set()
+                while True:
+                    raw = await proc.stdout.readline()
+                    if not raw:
+                        break
+                    pos = self._dispatch(raw)
+                    if pos is not None:
+                        self._mux_pos = pos
+                _terminate(proc)
+                await proc.wait()
+                if not self._mux_dirty:
+                    # journalctl chết bất ngờ -> đợi chút rồi chạy lại từ vị trí cuối
+                    await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            _terminate(proc)
 
-    async def _send_line(self, ws: WebSocket, raw: bytes):
-        data = raw[:MAX_LINE_BYTES].decode("utf-8", errors="replace").rstrip("\n")
-        await self._safe_send(ws, data)
+    # ---------- dispatch ----------
+    def _dispatch(self, raw: bytes) -> Optional[tuple]:
+        """Parse 1 entry JSON, demux theo unit, bỏ entry trùng, đẩy vào coalescer. Trả vị trí entry."""
+        e = _parse_entry(raw)
+        if e is None:
+            return None
+        pos = _entry_pos(e)
+        f = None
+        for key in _UNIT_FIELDS:
+            unit = e.get(key)
+            if unit:
+                f = self._follows.get(unit)
+                if f is not None:
+                    break
+        if f is None or f.coalescer is None:
+            return pos
+        if f.last_pos is not None and not _is_after(pos, f.last_pos):
+            return pos
+        f.last_pos = pos
+        _JOURNAL_ENTRIES.inc()
+        f.coalescer.add(*_entry_line(e))
+        return pos
+
+    def _broadcast_frame(self, f: _Follow, lines: List[LogLine], suppressed: int):
+        # ring chỉ chứa dòng đã phát -> subscriber mới không nhận trùng dòng đang chờ flush
+        f.ring.extend(lines)
+        _FRAMES.inc()
+        _LINES.inc(len(lines))
+        broadcast_frame(list(f.clients.values()), lines, suppressed)
+
+
+# ---------- journal JSON helpers ----------
+_READ_LIMIT = 1024 * 1024  # 1 entry JSON có thể dài hơn 64KB mặc định của StreamReader
+# journalctl -u khớp cả message systemd viết *về* unit (UNIT=, OBJECT_SYSTEMD_UNIT=...)
+_UNIT_FIELDS = ("_SYSTEMD_UNIT", "UNIT", "OBJECT_SYSTEMD_UNIT", "COREDUMP_UNIT")
+
+
+def _parse_entry(raw: bytes) -> Optional[dict]:
+    try:
+        e = loads(raw)
+    except ValueError:
+        return None
+    return e if isinstance(e, dict) else None
+
+
+def _field_str(v) -> str:
+    # journal trả mảng byte cho giá trị không phải UTF-8, mảng nhiều giá trị khi field lặp
+    if isinstance(v, list):
+        if v and isinstance(v[0], int):
+            return bytes(v).decode("utf-8", errors="replace")
+        return _field_str(v[0]) if v else ""
+    return "" if v is None else str(v)
+
+
+def _format_entry(e: dict) -> str:
+    """Định dạng như `journalctl -o short-iso`: <ts> <host> <ident>[<pid>]: <message>"""
+    try:
+        ts = datetime.fromtimestamp(int(e.get("__REALTIME_TIMESTAMP", 0)) / 1e6).astimezone()
+        ts_s = ts.strftime("%Y-%m-%dT%H:%M:%S%z")
+    except (TypeError, ValueError, OverflowError):
+        ts_s = "-"
+    ident = _field_str(e.get("SYSLOG_IDENTIFIER") or e.get("_COMM") or "")
+    pid = _field_str(e.get("_PID") or e.get("SYSLOG_PID") or "")
+    head = f"{ts_s} {_field_str(e.get('_HOSTNAME', ''))} {ident}"
+    if pid:
+        head += f"[{pid}]"
+    msg = _field_str(e.get("MESSAGE"))
+    line = f"{head}: {msg}"
+    if len(line) > MAX_LINE_BYTES:
+        line = line[:MAX_LINE_BYTES]
+    return line
+
+
+def _entry_line(e: dict) -> LogLine:
+    """Entry journal -> LogLine (text, cursor, priority, realtime_us)."""
+    try:
+        prio = int(_field_str(e.get("PRIORITY")))
+    except ValueError:
+        prio = None
+    try:
+        ts = int(e.get("__REALTIME_TIMESTAMP"))
+    except (TypeError, ValueError):
+        ts = None
+    return (_format_entry(e), e.get("__CURSOR"), prio, ts)
+
+
+def _journal_filter_args(flt: LogFilter) -> list:
+    """Phần filter đẩy xuống được journalctl (priority, khoảng thời gian); phần còn lại lọc trong Python."""
+    args = []
+    if flt.priority is not None:
+        args += ["-p", str(flt.priority)]
+    if flt.since_us is not None:
+        args += ["--since", f"@{flt.since_us / 1e6:.6f}"]
+    if flt.until_us is not None:
+        args += ["--until", f"@{flt.until_us / 1e6:.6f}"]
+    return args
+
+
+def _entry_pos(e: dict) -> tuple:
+    """(cursor, seqnum_id, seqnum, realtime_us) — dùng để so thứ tự entry."""
+    cursor = e.get("__CURSOR") or ""
+    seq_id, seq = "", -1
+    for part in cursor.split(";"):
+        if part.startswith("s="):
+            seq_id = part[2:]
+        elif part.startswith("i="):
+            try:
+                seq = int(part[2:], 16)
+            except ValueError:
+                pass
+    try:
+        rt = int(e.get("__REALTIME_TIMESTAMP", 0))
+    except (TypeError, ValueError):
+        rt = 0
+    return (cursor, seq_id, seq, rt)
+
+
+def _is_after(a: tuple, b: tuple) -> bool:
+    # cùng seqnum_id -> so seqnum; khác (journal khác nguồn) -> so realtime
+    if a[1] and a[1] == b[1] and a[2] >= 0 and b[2] >= 0:
+        return a[2] > b[2]
+    return a[3] > b[3]
 
-    async def _safe_send(self, ws: WebSocket, text: str):
+
+def _earliest(positions: list) -> Optional[tuple]:
+    best = None
+    for p in positions:
+        if best is None or _is_after(best, p):
+            best = p
+    return best
+
+
+def _terminate(proc: Optional[asyncio.subprocess.Process]):
+    if proc and proc.returncode is None:
         try:
-            await ws.send_text(text)
-        except Exception:
-            # client có thể đã đóng
+            proc.terminate()
+        except ProcessLookupError:
             pass
 
 
+def _rate_limit_for(service: str) -> float:
+    info = settings.APPS.get(service.removesuffix(".service"))
+    if info is not None and info.log_rate_limit is not None:
+        return info.log_rate_limit
+    return settings.LOG_RATE_LIMIT
+
+
 hub = LogHub()
 
 
@@ -132,6 +549,66 @@ def _validate_service(name: str) -> str:
     return name
 
 
+def _build_filter(priority: Optional[str] = None, include: Optional[str] = None,
+                  exclude: Optional[str] = None, match: str = "substring", ignore_case: bool = False,
+                  since_ms: Optional[int] = None, until_ms: Optional[int] = None) -> Optional[LogFilter]:
+    """Validate & compile filter từ query param; None nếu không có điều kiện nào."""
+    try:
+        flt = LogFilter(
+            priority=parse_priority(priority),
+            include=include, exclude=exclude,
+            regex=(match == "regex"), ignore_case=ignore_case,
+            since_ms=since_ms, until_ms=until_ms,
+        )
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid log filter: {e}")
+    return flt if flt.active else None
+
+
+@router.get("/subscribers")
+def list_subscribers():
+    # queued / dropped / lag_ms theo từng client đang xem log
+    return hub.stats()
+
+
+@router.get("/containers/subscribers")
+def list_container_log_subscribers():
+    from vqc_monitor.core.container_logs import container_log_hub
+
+    return container_log_hub.stats()
+
+
+@router.get("/search")
+async def search_logs(
+    q: Optional[str] = Query(None, max_length=512, description="Full-text (cú pháp FTS5), vd: timeout, \"connection refused\", err*"),
+    service: Optional[str] = Query(None, description="e.g. nginx or nginx.service"),
+    start_ms: Optional[int] = Query(None, ge=0),
+    end_ms: Optional[int] = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0, le=100000),
+):
+    """Tìm log lịch sử đã index (cần log_index_enabled). Có q: xếp theo độ liên quan; không q: mới nhất trước."""
+    from vqc_monitor.core import log_index
+
+    if not settings.LOG_INDEX_ENABLED:
+        raise HTTPException(404, "Log index is disabled")
+    svc = _validate_service(service) if service else None
+    t0 = time.perf_counter()
+    try:
+        out = await run_in_threadpool(log_index.search, q or None, svc, start_ms, end_ms, limit, offset)
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid query: {e}")
+    out["took_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return out
+
+
+@router.get("/index/stats")
+def log_index_stats():
+    from vqc_monitor.core.log_index import log_indexer
+
+    return log_indexer.stats()
+
+
 # @router.get("/services")
 # def list_allowed_services():
 #     # tiện cho FE
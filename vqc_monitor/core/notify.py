@@ -0,0 +1,311 @@
+# app/core/notify.py
+"""
+Gửi thông báo alert ra ngoài (on-call) qua các sink cấu hình ở settings.NOTIFY_SINKS:
+    webhook : POST JSON, dùng chung 1 httpx.AsyncClient (giữ kết nối)
+    script  : chạy lệnh, payload JSON qua stdin
+    file    : append 1 dòng JSON / lần gửi
+- Nhận alert từ alert_bus (đã commit) trên event loop, không chạm collector / alert_worker.
+- Alert tới trong NOTIFY_BATCH_MS (cùng tick) gộp thành 1 lần gửi; trùng (kind, entity, alert_type)
+  trong ALERT_COOLDOWN_MS thì bỏ.
+- Mỗi sink 1 hàng đợi có giới hạn + 1 task gửi tuần tự, lỗi thì thử lại với backoff base * 2^n.
+- Shutdown (stop): gửi nốt batch đang gom, chờ hàng đợi sink tối đa SHUTDOWN_DRAIN_S rồi huỷ task, đóng httpx client.
+  Sink bị bỏ / đổi cấu hình khi reload cũng được gửi nốt hàng đợi như vậy (chạy nền).
+Payload: {"ts_ms", "count", "alerts": [{"kind": "app"|"container", "entity", "alert_type", "ts_ms", "value", ...}]}
+"""
+import asyncio
+import shlex
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+import httpx
+from vqc_monitor.core.alert_bus import alert_bus, APP, CONTAINER, AlertSubscription
+from vqc_monitor.core.config import NotifySink, on_reload, settings
+from vqc_monitor.core.serialization import dumps
+
+MAX_BACKOFF_S = 60.0
+SHUTDOWN_DRAIN_S = 5.0
+_RETRYABLE_4XX = (408, 425, 429)
+
+
+class DeliveryError(Exception):
+    def __init__(self, msg: str, retryable: bool = True):
+        super().__init__(msg)
+        self.retryable = retryable
+
+
+class _Sink:
+    """1 đích gửi: hàng đợi (body, t_nhận) + task gửi tuần tự."""
+
+    def __init__(self, cfg: NotifySink, notifier: "Notifier"):
+        self.cfg = cfg
+        self.notifier = notifier
+        self.name = cfg.name or f"{cfg.type}:{cfg.url or cfg.command or cfg.path}"
+        self._queue: Deque[Tuple[bytes, float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._busy = False
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._latency_sum_ms = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float):
+        """Chờ gửi nốt hàng đợi (tối đa timeout giây) rồi huỷ task gửi."""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._queue or self._busy) and not self._task.done() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._queue:
+            self.dropped += len(self._queue)
+            print(f"[WARN] notify {self.name}: bỏ {len(self._queue)} batch chưa gửi khi dừng sink")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def enqueue(self, body: bytes, received: float):
+        if len(self._queue) >= max(1, settings.NOTIFY_QUEUE_MAX):
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((body, received))
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queue:
+                body, received = self._queue.popleft()
+                self._busy = True
+                try:
+                    await self._deliver(body, received)
+                finally:
+                    self._busy = False
+
+    async def _deliver(self, body: bytes, received: float):
+        attempt = 0
+        while True:
+            try:
+                await self.send(body)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+                retryable = getattr(e, "retryable", True)
+                if not retryable or attempt >= settings.NOTIFY_RETRY_MAX:
+                    self.failed += 1
+                    print(f"[WARN] notify {self.name} thất bại sau {attempt + 1} lần: {self.last_error}")
+                    return
+                await asyncio.sleep(min(MAX_BACKOFF_S, settings.NOTIFY_RETRY_BASE_MS / 1000 * (2 ** attempt)))
+                attempt += 1
+                self.retries += 1
+                continue
+            latency = (time.monotonic() - received) * 1000
+            self.delivered += 1
+            self.last_latency_ms = latency
+            self.max_latency_ms = max(self.max_latency_ms, latency)
+            self._latency_sum_ms += latency
+            return
+
+    async def send(self, body: bytes):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "type": self.cfg.type,
+            "queue_depth": len(self._queue),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+            "last_latency_ms": round(self.last_latency_ms, 3),
+            "avg_latency_ms": round(self._latency_sum_ms / self.delivered, 3) if self.delivered else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 3),
+        }
+
+
+class WebhookSink(_Sink):
+    async def send(self, body: bytes):
+        headers = {"Content-Type": "application/json", **self.cfg.headers}
+        resp = await self.notifier.http().post(self.cfg.url, content=body, headers=headers,
+                                               timeout=self.cfg.timeout_s)
+        if resp.status_code >= 400:
+            retryable = resp.status_code >= 500 or resp.status_code in _RETRYABLE_4XX
+            raise DeliveryError(f"HTTP {resp.status_code}", retryable)
+
+
+class ScriptSink(_Sink):
+    async def send(self, body: bytes):
+        proc = await asyncio.create_subprocess_exec(
+            *shlex.split(self.cfg.command),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, err = await asyncio.wait_for(proc.communicate(body), timeout=self.cfg.timeout_s)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise DeliveryError(f"timeout sau {self.cfg.timeout_s}s")
+        if proc.returncode != 0:
+            raise DeliveryError(f"exit {proc.returncode}: {err.decode(errors='replace').strip()[:200]}")
+
+
+class FileSink(_Sink):
+    async def send(self, body: bytes):
+        await asyncio.to_thread(self._append, body)
+
+    def _append(self, body: bytes):
+        with open(self.cfg.path, "ab") as f:
+            f.write(body + b"\n")
+
+
+_SINK_TYPES = {"webhook": (WebhookSink, "url"), "script": (ScriptSink, "command"), "file": (FileSink, "path")}
+
+
+class Notifier:
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sinks: List[_Sink] = []
+        self._retiring: Set[asyncio.Task] = set()  # sink cũ (reload) đang gửi nốt hàng đợi
+        self._subs: List[AlertSubscription] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pending: List[dict] = []
+        self._pending_since = 0.0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._last_sent: Dict[Tuple[str, str, str], int] = {}
+        self._pruned_ms = 0
+        self.received = 0
+        self.deduped = 0
+        self.batches = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._configure()
+
+    async def stop(self):
+        """Shutdown: bỏ subscribe, gửi nốt batch đang gom, chờ sink gửi xong (có giới hạn), đóng httpx client."""
+        self._loop = None  # reload sau lúc này không dựng lại sink
+        for sub in self._subs:
+            alert_bus.unsubscribe(sub)
+        self._subs = []
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush()
+        sinks, self._sinks = self._sinks, []
+        await asyncio.gather(*(s.close(SHUTDOWN_DRAIN_S) for s in sinks), *self._retiring)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def reload(self):
+        """Hook reload config (có thể gọi từ threadpool)."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._configure)
+
+    def http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=10, max_keepalive_connections=5))
+        return self._client
+
+    def _configure(self):
+        """Dựng lại danh sách sink; sink có cấu hình không đổi giữ nguyên hàng đợi + số liệu."""
+        old = {s.cfg.model_dump_json(): s for s in self._sinks}
+        sinks: List[_Sink] = []
+        for cfg in settings.NOTIFY_SINKS:
+            key = cfg.model_dump_json()
+            if key in old:
+                sinks.append(old.pop(key))
+                continue
+            kind = _SINK_TYPES.get(cfg.type.strip().lower())
+            if kind is None or not getattr(cfg, kind[1]):
+                print(f"[WARN] notify sink không hợp lệ (type={cfg.type}), bỏ qua")
+                continue
+            sink = kind[0](cfg, self)
+            sink.start()
+            sinks.append(sink)
+        for s in old.values():
+            # sink bị bỏ / đổi cấu hình: gửi nốt hàng đợi (tối đa SHUTDOWN_DRAIN_S), phần còn lại tính vào dropped
+            task = asyncio.create_task(s.close(SHUTDOWN_DRAIN_S))
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+        self._sinks = sinks
+
+        if sinks and not self._subs:
+            self._subs = [
+                alert_bus.subscribe(APP, on_batch=lambda b: self._on_alerts(APP, b)),
+                alert_bus.subscribe(CONTAINER, on_batch=lambda b: self._on_alerts(CONTAINER, b)),
+            ]
+        elif not sinks and self._subs:
+            for sub in self._subs:
+                alert_bus.unsubscribe(sub)
+            self._subs = []
+
+    def _prune(self):
+        """Bỏ key đã hết cooldown (alert kế của key đó không bị dedupe nữa), tối đa 1 lần / ALERT_COOLDOWN_MS."""
+        now_ms = int(time.time() * 1000)
+        cooldown = settings.ALERT_COOLDOWN_MS
+        if now_ms - self._pruned_ms < cooldown:
+            return
+        self._pruned_ms = now_ms
+        self._last_sent = {k: ts for k, ts in self._last_sent.items() if now_ms - ts < cooldown}
+
+    def _on_alerts(self, kind: str, batch: List[dict]):
+        self._prune()
+        for a in batch:
+            self.received += 1
+            entity = a.get("app_id") if kind == APP else a.get("container_name")
+            key = (kind, entity, a.get("alert_type"))
+            ts = a.get("ts_ms") or 0
+            last = self._last_sent.get(key)
+            if last is not None and 0 <= ts - last < settings.ALERT_COOLDOWN_MS:
+                self.deduped += 1
+                continue
+            self._last_sent[key] = ts
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append({"kind": kind, "entity": entity, **a})
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(settings.NOTIFY_BATCH_MS / 1000, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        alerts, self._pending = self._pending, []
+        if not alerts:
+            return
+        self.batches += 1
+        body = dumps({"ts_ms": int(time.time() * 1000), "count": len(alerts), "alerts": alerts})
+        for sink in self._sinks:
+            sink.enqueue(body, self._pending_since)
+
+    def send_test(self) -> int:
+        """Gửi 1 alert giả tới mọi sink (kiểm tra cấu hình), không qua dedupe."""
+        alert = {"kind": APP, "entity": "__system__", "app_id": "__system__", "alert_type": "test",
+                 "ts_ms": int(time.time() * 1000), "value": 0}
+        body = dumps({"ts_ms": alert["ts_ms"], "count": 1, "alerts": [alert], "test": True})
+        for sink in self._sinks:
+            sink.enqueue(body, time.monotonic())
+        return len(self._sinks)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "deduped": self.deduped,
+            "batches": self.batches,
+            "pending": len(self._pending),
+            "sinks": [s.stats() for s in self._sinks],
+        }
+
+
+notifier = Notifier()
+on_reload(notifier.reload)
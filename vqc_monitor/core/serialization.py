@@ -0,0 +1,61 @@
+# app/core/serialization.py
+"""
+Lớp serialize JSON dùng chung cho REST + websocket.
+- Ưu tiên orjson (nhanh hơn nhiều lần), fallback về json chuẩn nếu không cài.
+- dumps() luôn trả bytes để 1 payload encode 1 lần có thể gửi lại cho mọi subscriber.
+"""
+import json
+from typing import Any
+from fastapi import WebSocket
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - tuỳ môi trường
+    orjson = None
+
+
+def _default(obj: Any):
+    # pydantic model (AppInfo, ContainerInfo, ...)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTS)
+
+    def loads(data: bytes | str) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(
+            obj, default=_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    def loads(data: bytes | str) -> Any:
+        return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """Response class mặc định cho routers (thay cho JSONResponse của FastAPI)."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+async def send_json_bytes(ws: WebSocket, payload: Any):
+    """
+    Gửi JSON qua websocket dưới dạng binary frame.
+    payload có thể là object (sẽ encode) hoặc bytes đã encode sẵn (dùng lại cho nhiều client).
+    """
+    data = payload if isinstance(payload, (bytes, bytearray, memoryview)) else dumps(payload)
+    await ws.send_bytes(bytes(data))
@@ -21,6 +21,18 @@ class Sample(Base):
     io_write_Bps: Mapped[float] = mapped_column(Float)
     __table_args__ = (PrimaryKeyConstraint("app_id", "ts_ms"), )
 
+class SampleHires(Base):
+    """Sample độ phân giải cao (BURST_INTERVAL_MS) quanh 1 alert, xem metrics/burst. Retention ngắn."""
+    __tablename__ = "samples_hires"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    alert_id: Mapped[int] = mapped_column(Integer, ForeignKey("alerts.id", ondelete="CASCADE"), index=True)
+    app_id: Mapped[str] = mapped_column(String)
+    ts_ms: Mapped[int] = mapped_column(BigInteger)                  # epoch ms
+    cpu_percent: Mapped[float] = mapped_column(Float)
+    mem_bytes: Mapped[int] = mapped_column(BigInteger)
+    io_read_Bps: Mapped[float] = mapped_column(Float)
+    io_write_Bps: Mapped[float] = mapped_column(Float)
+
 class Alert(Base):
     __tablename__ = "alerts"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -67,4 +79,14 @@ class ContainerMetric(Base):
     container_name: Mapped[str] = mapped_column(String, ForeignKey("containers.name", ondelete="CASCADE"))
     ts_ms: Mapped[int] = mapped_column(BigInteger)                  # epoch ms
     cpu_percent: Mapped[float] = mapped_column(Float)
-    mem_bytes: Mapped[int] = mapped_column(BigInteger)
\ No newline at end of file
+    mem_bytes: Mapped[int] = mapped_column(BigInteger)
+class AnomalyState(Base):
+    __tablename__ = "anomaly_state"
+    scope: Mapped[str] = mapped_column(String)                       # "app" | "container"
+    entity: Mapped[str] = mapped_column(String)                      # app_id / container_name
+    metric: Mapped[str] = mapped_column(String)                      # "cpu" | "memory"
+    mean: Mapped[float] = mapped_column(Float)                       # EWMA
+    var: Mapped[float] = mapped_column(Float)                        # EW variance
+    n: Mapped[int] = mapped_column(BigInteger)                       # số sample đã học
+    updated_ms: Mapped[int] = mapped_column(BigInteger)
+    __table_args__ = (PrimaryKeyConstraint("scope", "entity", "metric"), )
@@ -1,16 +1,44 @@
 from math import ceil
 from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select, text
+from sqlalchemy import select, text, event
 from vqc_monitor.db.models import Container, ContainerAlert, ContainerStateTimeline, Sample
 from vqc_monitor.db.base import SessionLocal
 from vqc_monitor.core.config import ContainerInfo, reload_list_services
 from vqc_monitor.db.models import App
 from vqc_monitor.core.config import AppInfo
 from vqc_monitor.db.models import Alert, StateTimeline
-from vqc_monitor.metrics.alert import monitor_alerts_db_backed, monitor_container_alerts_db_backed
 from datetime import datetime
 from vqc_monitor.db.models import ContainerMetric
+from vqc_monitor.core.alert_bus import alert_bus, APP as BUS_APP, CONTAINER as BUS_CONTAINER
+from vqc_monitor.core.config import settings
+from vqc_monitor.core.deadband import expand_held, interval_ms as deadband_interval_ms
+from vqc_monitor.core.instrument import DB_SECONDS, timed
+import numpy as np
+
+_PENDING_ALERTS = "pending_alerts"
+
+
+def _queue_alert_publish(db: Session, kind: str, alert: dict):
+    # publish sau khi commit (xem _publish_pending_alerts)
+    db.info.setdefault(_PENDING_ALERTS, []).append((kind, alert))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_pending_alerts(session: Session):
+    pending = session.info.pop(_PENDING_ALERTS, None)
+    if not pending:
+        return
+    by_kind: dict[str, list[dict]] = {}
+    for kind, alert in pending:
+        by_kind.setdefault(kind, []).append(alert)
+    for kind, alerts in by_kind.items():
+        alert_bus.publish(kind, alerts)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_pending_alerts(session: Session):
+    session.info.pop(_PENDING_ALERTS, None)
 
 def ensure_system_app(db: Session):
     row = db.get(App, "__system__")
@@ -29,22 +57,98 @@ def upsert_apps(db: Session, items: dict[str, AppInfo]):
 
 
 
-def insert_sample(db: Session, app_id: str, ts_ms: int, cpu: float, mem: int, r: float, w: float):
-    s = Sample(app_id=app_id, ts_ms=ts_ms, cpu_percent=cpu, mem_bytes=mem, io_read_Bps=r, io_write_Bps=w)
-    db.merge(s)  # upsert theo (app_id, ts_ms)
-    db.flush()
-    monitor_alerts_db_backed(db, app_id, ts_ms, cpu, mem)
+@timed(DB_SECONDS, "insert_samples")
+def insert_samples(db: Session, rows: list[tuple]):
+    """Ghi cả tick 1 lần (executemany): rows = [(app_id, ts_ms, cpu, mem, r, w)], upsert theo (app_id, ts_ms)."""
+    if not rows:
+        return
+    db.execute(text("""
+      INSERT OR REPLACE INTO samples (app_id, ts_ms, cpu_percent, mem_bytes, io_read_Bps, io_write_Bps)
+      VALUES (:app_id, :ts_ms, :cpu, :mem, :r, :w)
+    """), [{"app_id": r[0], "ts_ms": r[1], "cpu": r[2], "mem": r[3], "r": r[4], "w": r[5]} for r in rows])
 
 
 def list_apps():
     return reload_list_services()
 
+@timed(DB_SECONDS, "get_samples_array")
+def get_samples_array(db: Session, app_id: str, ts_from: int, ts_to: int):
+    """
+    (ts int64[n], cols float64[n, 4] = cpu, mem, io_r, io_w) theo thời gian.
+    Bật deadband: dựng lại các sample bị lược (carry-forward, xem core/deadband), kể cả giá trị đang giữ
+    từ trước ts_from.
+    """
+    params = (app_id, ts_from, ts_to)
+    sql = ("SELECT ts_ms, cpu_percent, mem_bytes, io_read_Bps, io_write_Bps FROM samples "
+           "WHERE app_id = ? AND ts_ms BETWEEN ? AND ? ORDER BY ts_ms")
+    if settings.DEADBAND_ENABLED:
+        max_gap = settings.DEADBAND_MAX_GAP_MS
+        # thêm sample đã lưu cuối cùng trước ts_from (giá trị đang được giữ khi khoảng đọc bắt đầu)
+        sql = ("SELECT * FROM (SELECT ts_ms, cpu_percent, mem_bytes, io_read_Bps, io_write_Bps FROM samples "
+               "WHERE app_id = ? AND ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms DESC LIMIT 1) UNION ALL " + sql)
+        params = (app_id, ts_from - max_gap, ts_from) + params
+    # cursor DBAPI trực tiếp: tuple thuần, nhanh hơn nhiều so với Row của SQLAlchemy cho chuỗi dài
+    cur = db.connection().connection.cursor()
+    try:
+        rows = cur.execute(sql, params).fetchall()
+    finally:
+        cur.close()
+    if not rows:
+        return np.empty(0, np.int64), np.empty((0, 4))
+    arr = np.array(rows, dtype=np.float64)
+    ts, cols = arr[:, 0].astype(np.int64), arr[:, 1:]
+    if settings.DEADBAND_ENABLED:
+        end_ms = min(ts_to, int(datetime.now().timestamp() * 1000))
+        ts, cols = expand_held(ts, cols, deadband_interval_ms(app_id), settings.DEADBAND_MAX_GAP_MS, end_ms)
+        keep = (ts >= ts_from) & (ts <= ts_to)
+        ts, cols = ts[keep], cols[keep]
+    return ts, cols
+
+
+def _get_stats_expanded(db: Session, app_id: str, ts_from: int, ts_to: int, bucket_ms: int) -> list[dict]:
+    """Cùng kết quả với SQL trong get_stats nhưng trên chuỗi đã dựng lại (deadband)."""
+    ts, cols = get_samples_array(db, app_id, ts_from, ts_to)
+    if len(ts) == 0:
+        return []
+    t = (ts // bucket_ms) * bucket_ms
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(t)) + 1))
+    counts = np.diff(np.append(starts, len(t)))
+    sums = np.add.reduceat(cols, starts, axis=0)
+    mins = np.minimum.reduceat(cols, starts, axis=0)
+    maxs = np.maximum.reduceat(cols, starts, axis=0)
+    avgs = sums / counts[:, None]
+    return [
+        {
+            "t": int(t[s]),
+            "cpu_avg": float(avgs[i, 0]),
+            "cpu_min": float(mins[i, 0]),
+            "cpu_max": float(maxs[i, 0]),
+            "mem_avg": int(avgs[i, 1]),
+            "mem_min": int(mins[i, 1]),
+            "mem_max": int(maxs[i, 1]),
+            "io_r_avg": float(avgs[i, 2]),
+            "io_w_avg": float(avgs[i, 3]),
+        } for i, s in enumerate(starts)
+    ]
+
+
+@timed(DB_SECONDS, "get_stats")
 def get_stats(db: Session, app_id: str, ts_from: int, ts_to: int, max_points: int = 1000, bucket_ms: Optional[int] = 5000):
 
     # Tính bucket_ms nếu không truyền
     if bucket_ms is None:
         bucket_ms = max(1, ceil((ts_to - ts_from) / max(1, min(max_points, 1000))))
 
+    if settings.DEADBAND_ENABLED:
+        # sample bị lược không có trong bảng -> tổng hợp trên chuỗi đã dựng lại
+        return {
+            "app_id": app_id,
+            "start": ts_from,
+            "end": ts_to,
+            "bucket_ms": bucket_ms,
+            "points": _get_stats_expanded(db, app_id, ts_from, ts_to, bucket_ms),
+        }
+
     sql = text("""
       SELECT
         ((ts_ms / :bucket_ms) * :bucket_ms) AS t,
@@ -90,11 +194,62 @@ def get_stats(db: Session, app_id: str, ts_from: int, ts_to: int, max_points: in
     }
 
 
+@timed(DB_SECONDS, "get_samples")
+def get_samples(db: Session, app_id: str, ts_from: int, ts_to: int):
+    """Sample thô (ts_ms, cpu, mem, io_r, io_w) theo thứ tự thời gian."""
+    if settings.DEADBAND_ENABLED:
+        ts, cols = get_samples_array(db, app_id, ts_from, ts_to)
+        return [(int(t), float(c[0]), int(c[1]), float(c[2]), float(c[3])) for t, c in zip(ts, cols)]
+    rows = db.execute(text("""
+      SELECT ts_ms, cpu_percent, mem_bytes, io_read_Bps, io_write_Bps
+      FROM samples
+      WHERE app_id = :app_id AND ts_ms BETWEEN :start AND :end
+      ORDER BY ts_ms ASC
+    """), {"app_id": app_id, "start": ts_from, "end": ts_to}).all()
+    return [tuple(r) for r in rows]
+
+
+def get_last_alert_times(db: Session, app_id: str) -> dict[str, int]:
+    """alert_type -> ts_ms của alert gần nhất (cooldown của metrics/alert_rules)."""
+    rows = db.execute(text("""
+      SELECT alert_type, MAX(ts_ms) FROM alerts WHERE app_id = :app_id GROUP BY alert_type
+    """), {"app_id": app_id}).all()
+    return {r[0]: r[1] for r in rows}
+
+
+@timed(DB_SECONDS, "save_alert")
 def save_alert(db: Session, app_id: str, alert_type: str, ts_ms: int, value: float):
     alert = Alert(app_id=app_id, alert_type=alert_type, ts_ms=ts_ms, value=value)
     db.add(alert)
     db.flush()
+    _queue_alert_publish(db, BUS_APP, alert_to_dict(alert))
+
+@timed(DB_SECONDS, "insert_hires_samples")
+def insert_hires_samples(db: Session, alert_id: int, app_id: str, rows: list[tuple]):
+    """Lưu cửa sổ burst cho 1 alert: rows = [(ts_ms, cpu, mem, r, w)] (executemany)."""
+    if not rows:
+        return
+    db.execute(text("""
+      INSERT INTO samples_hires (alert_id, app_id, ts_ms, cpu_percent, mem_bytes, io_read_Bps, io_write_Bps)
+      VALUES (:alert_id, :app_id, :ts_ms, :cpu, :mem, :r, :w)
+    """), [{"alert_id": alert_id, "app_id": app_id, "ts_ms": r[0], "cpu": r[1], "mem": r[2], "r": r[3], "w": r[4]}
+           for r in rows])
 
+
+@timed(DB_SECONDS, "get_hires_samples")
+def get_hires_samples(db: Session, alert_id: int) -> list[dict]:
+    rows = db.execute(text("""
+      SELECT ts_ms, cpu_percent, mem_bytes, io_read_Bps, io_write_Bps FROM samples_hires
+      WHERE alert_id = :alert_id ORDER BY ts_ms
+    """), {"alert_id": alert_id}).all()
+    return [{"ts_ms": r[0], "cpu_percent": r[1], "mem_bytes": r[2], "io_read_Bps": r[3], "io_write_Bps": r[4]}
+            for r in rows]
+
+
+def alert_to_dict(a: Alert) -> dict:
+    return {"id": a.id, "app_id": a.app_id, "alert_type": a.alert_type, "ts_ms": a.ts_ms, "value": a.value}
+
+@timed(DB_SECONDS, "get_alerts")
 def get_alerts(db: Session, limit: int, app_id: Optional[str] = None):
     stmt = None
     if app_id:
@@ -109,6 +264,7 @@ def get_alerts(db: Session, limit: int, app_id: Optional[str] = None):
 
     return db.scalars(stmt).all()
 
+@timed(DB_SECONDS, "open_or_close_state_timeline")
 def open_or_close_state_timeline(db: Session, app_id: str, state: str):
     ts_ms = datetime.now().timestamp() * 1000
     # Kiểm tra trạng thái hiện tại
@@ -169,13 +325,18 @@ def upsert_containers(db: Session, items: dict[str, ContainerInfo]):
         else:
             db.add(Container(name=container_name, image=ctr_info.image, version=ctr_info.version))
 
-def insert_container_sample(db: Session, container_name: str, ts_ms: int, cpu: float, mem: int):
-    s = ContainerMetric(container_name=container_name, ts_ms=ts_ms, cpu_percent=cpu, mem_bytes=mem)
-    db.merge(s)  # upsert theo (container_name, ts_ms)
-    db.flush()
-    monitor_container_alerts_db_backed(db, container_name, ts_ms, cpu, mem)
+@timed(DB_SECONDS, "insert_container_samples")
+def insert_container_samples(db: Session, rows: list[tuple]):
+    """Ghi cả tick 1 lần (executemany): rows = [(container_name, ts_ms, cpu, mem)]."""
+    if not rows:
+        return
+    db.execute(text("""
+      INSERT INTO container_metrics (container_name, ts_ms, cpu_percent, mem_bytes)
+      VALUES (:name, :ts_ms, :cpu, :mem)
+    """), [{"name": r[0], "ts_ms": r[1], "cpu": r[2], "mem": r[3]} for r in rows])
 
 
+@timed(DB_SECONDS, "get_container_stats")
 def get_container_stats(db: Session, container_name: str, ts_from: int, ts_to: int, max_points: int = 1000, bucket_ms: Optional[int] = 5000):
 
     # Tính bucket_ms nếu không truyền
@@ -223,11 +384,56 @@ def get_container_stats(db: Session, container_name: str, ts_from: int, ts_to: i
     }
 
 
+def load_anomaly_states(db: Session):
+    """Checkpoint của metrics/anomaly: [(scope, entity, metric, mean, var, n, updated_ms)]."""
+    rows = db.execute(text("""
+      SELECT scope, entity, metric, mean, var, n, updated_ms FROM anomaly_state
+    """)).all()
+    return [tuple(r) for r in rows]
+
+
+@timed(DB_SECONDS, "save_anomaly_states")
+def save_anomaly_states(db: Session, rows: list[dict]):
+    """Upsert hàng loạt state detector (1 câu lệnh, executemany)."""
+    if not rows:
+        return
+    db.execute(text("""
+      INSERT INTO anomaly_state (scope, entity, metric, mean, var, n, updated_ms)
+      VALUES (:scope, :entity, :metric, :mean, :var, :n, :updated_ms)
+      ON CONFLICT(scope, entity, metric) DO UPDATE SET
+        mean = excluded.mean, var = excluded.var, n = excluded.n, updated_ms = excluded.updated_ms
+    """), rows)
+
+
+def get_container_samples(db: Session, container_name: str, ts_from: int, ts_to: int):
+    """Sample thô (ts_ms, cpu, mem) của container theo thứ tự thời gian."""
+    rows = db.execute(text("""
+      SELECT ts_ms, cpu_percent, mem_bytes
+      FROM container_metrics
+      WHERE container_name = :name AND ts_ms BETWEEN :start AND :end
+      ORDER BY ts_ms ASC
+    """), {"name": container_name, "start": ts_from, "end": ts_to}).all()
+    return [tuple(r) for r in rows]
+
+
+def get_last_container_alert_times(db: Session, container_name: str) -> dict[str, int]:
+    rows = db.execute(text("""
+      SELECT alert_type, MAX(ts_ms) FROM container_alerts WHERE container_name = :name GROUP BY alert_type
+    """), {"name": container_name}).all()
+    return {r[0]: r[1] for r in rows}
+
+
+@timed(DB_SECONDS, "save_container_alert")
 def save_container_alert(db: Session, container_name: str, alert_type: str, ts_ms: int, value: float):
     alert = ContainerAlert(container_name=container_name, alert_type=alert_type, ts_ms=ts_ms, value=value)
     db.add(alert)
     db.flush()
+    _queue_alert_publish(db, BUS_CONTAINER, container_alert_to_dict(alert))
 
+def container_alert_to_dict(a: ContainerAlert) -> dict:
+    return {"id": a.id, "container_name": a.container_name, "alert_type": a.alert_type, "ts_ms": a.ts_ms, "value": a.value}
+
+@timed(DB_SECONDS, "get_container_alerts")
 def get_container_alerts(db: Session, limit: int, container_name: Optional[str] = None):
     stmt = None
     if container_name:
@@ -244,6 +450,7 @@ def get_container_alerts(db: Session, limit: int, container_name: Optional[str]
 
 ##CONTAINER STATE TIMELINE
 
+@timed(DB_SECONDS, "open_or_close_state_timeline_container")
 def open_or_close_state_timeline_container(db: Session, container_name: str, state: str):
     ts_ms = datetime.now().timestamp() * 1000
     # Kiểm tra trạng thái hiện tại
@@ -295,9 +502,17 @@ def get_last_state_container(db: Session, container_name: str) -> Optional[Conta
             .limit(1))
     return db.scalars(stmt).first()
 
-def clean_old_records(db: Session, retention_days: int):
+@timed(DB_SECONDS, "clean_old_records")
+def clean_old_records(db: Session, retention_days: int, hires_retention_days: Optional[float] = None):
     cutoff_ts = int((datetime.now().timestamp() - retention_days * 86400) * 1000)
 
+    # Xoá sample độ phân giải cao (retention riêng, không dài hơn retention chung)
+    hires_days = retention_days if hires_retention_days is None else min(retention_days, hires_retention_days)
+    db.execute(
+        text("DELETE FROM samples_hires WHERE ts_ms < :cutoff_ts"),
+        {"cutoff_ts": int((datetime.now().timestamp() - hires_days * 86400) * 1000)}
+    )
+
     # Xoá samples cũ
     db.execute(
         text("DELETE FROM samples WHERE ts_ms < :cutoff_ts"),
@@ -3,11 +3,17 @@ from vqc_monitor.core.daily_cleanup import daily_cleanup
 from vqc_monitor.db.base import create_all
 from vqc_monitor.api.routers import apps, stats, containers
 from vqc_monitor.api import ws
+from vqc_monitor.api import metrics
 from vqc_monitor.api.routers import alert
+from vqc_monitor.core import logs
 from vqc_monitor.metrics.collector import Collector
 from vqc_monitor.db import repo
 from vqc_monitor.core.config import settings    
 from fastapi.middleware.cors import CORSMiddleware           
+from vqc_monitor.core.serialization import FastJSONResponse
+from vqc_monitor.core.alert_bus import alert_bus
+from vqc_monitor.core.notify import notifier
+from vqc_monitor.metrics.burst import burst_capture
 from vqc_monitor.metrics.collector import update_timeline_when_system_start      
 
 
@@ -26,7 +32,7 @@ def create_app():
         repo.upsert_containers(db, settings.CONTAINERS)
         update_timeline_when_system_start()  # Cập nhật timeline khi khởi động
         db.commit()
-    app = FastAPI(title="App Monitor")
+    app = FastAPI(title="App Monitor", default_response_class=FastJSONResponse)
 
 
 
@@ -45,13 +51,29 @@ def create_app():
     app.include_router(ws.router)
     app.include_router(alert.router)
     app.include_router(containers.router)
+    app.include_router(logs.router)
+    app.include_router(metrics.router)
+    app.add_middleware(metrics.WebSocketMetricsMiddleware)
     
     
 
     @app.on_event("startup")
     async def _start():
+        alert_bus.bind_loop(asyncio.get_running_loop())
+        notifier.start()
+        burst_capture.start()
         asyncio.create_task(collector.run())
         asyncio.create_task(daily_cleanup())
+        if settings.LOG_INDEX_ENABLED:
+            from vqc_monitor.core.log_index import log_indexer
+            log_indexer.start()
+
+    @app.on_event("shutdown")
+    async def _stop():
+        await notifier.stop()
+        if settings.LOG_INDEX_ENABLED:
+            from vqc_monitor.core.log_index import log_indexer
+            await log_indexer.stop()
     return app
 
 app = create_app()
\ No newline at end of file
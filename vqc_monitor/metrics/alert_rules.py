@@ -0,0 +1,362 @@
+# app/metrics/alert_rules.py
+"""
+Rule engine cho alert (thay cho monitor_alerts_db_backed cũ: query DB + dựng lại dict ngưỡng cho từng sample).
+- Ngưỡng + rule được compile từ config 1 lần, compile lại khi reload config (core/config.on_reload).
+- metrics/alert_worker gọi evaluate() 1 lần / tick với toàn bộ sample của tick; disk (statvfs) chỉ đọc 1 lần / tick.
+- Rule mặc định giữ ngữ nghĩa cũ: cpu/memory vượt ngưỡng suốt ALERT_WINDOW_MS (đủ coverage, không sample nào
+  <= ngưỡng), cooldown ALERT_COOLDOWN_MS / (entity, alert_type); disk của __system__ vượt ngưỡng là báo.
+- Rule thêm từ config (settings.ALERT_RULES):
+    threshold  : như rule mặc định, với ngưỡng / cửa sổ / alert_type riêng
+    rate       : tốc độ tăng trên cửa sổ > threshold (đơn vị metric / phút), vd memory leak
+    hysteresis : báo khi > threshold, chỉ báo lại sau khi đã xuống < clear (không dùng cooldown)
+- State cửa sổ giữ trong RAM; lần đầu gặp 1 entity (và sau mỗi lần compile) nạp lại cửa sổ + alert cuối từ DB.
+- evaluate() chạy trong thread của alert_worker. Reload (invalidate) và discovery thêm/bỏ app (update_apps) chỉ
+  ghi nhận thay đổi; thread đánh giá áp nó ở đầu lượt kế, nên rule / state không bị sửa giữa 1 lượt.
+  update_apps chỉ đổi rule + state của app_id đó, không compile lại cả bộ.
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session
+from vqc_monitor.core.config import AlertRule, on_reload, settings
+from vqc_monitor.db import repo
+from vqc_monitor.metrics.system import _root_disk_usage
+
+APP = "app"
+CONTAINER = "container"
+SYSTEM = "__system__"
+KINDS = ("threshold", "rate", "hysteresis")
+METRICS = ("cpu", "memory", "disk")
+_MB = 1024 * 1024
+
+# (app_id, ts_ms, cpu_percent, mem_bytes, ...) — cùng dạng history_feed.Sample
+# (container_name, ts_ms, cpu_percent, mem_bytes) cho container
+
+
+class CompiledRule:
+    __slots__ = ("kind", "scope", "metric", "target", "threshold", "clear", "window_ms", "alert_type")
+
+    def __init__(self, kind: str, scope: str, metric: str, target: str, threshold: float,
+                 window_ms: int, alert_type: str, clear: Optional[float] = None):
+        self.kind = kind  # threshold | rate | hysteresis | instant (disk mặc định)
+        self.scope = scope
+        self.metric = metric
+        self.target = target
+        self.threshold = threshold
+        self.clear = clear
+        self.window_ms = window_ms
+        self.alert_type = alert_type
+
+
+class _State:
+    __slots__ = ("points", "last_below", "armed")
+
+    def __init__(self):
+        self.points: Deque = deque()  # threshold: ts của chuỗi vượt ngưỡng; rate: (ts, value)
+        self.last_below: Optional[int] = None
+        self.armed = True
+
+
+def _compute_min_samples(observed_first: Optional[int], observed_last: Optional[int],
+                         observed_n: int, window_ms: int,
+                         fallback_interval_ms: int, coverage: float) -> int:
+    """
+    Tính min_samples dựa trên cadence quan sát được trong chính cửa sổ.
+    - Nếu có >=2 mẫu: interval_est = (last-first) / (n-1)
+    - Ngược lại: dùng fallback từ settings.SAMPLE_INTERVAL_MS
+    """
+    if observed_n and observed_n >= 2 and observed_first is not None and observed_last is not None:
+        span = max(1, observed_last - observed_first)
+        interval_est = max(1.0, span / (observed_n - 1))
+    else:
+        interval_est = max(1.0, float(fallback_interval_ms))
+    expected = float(window_ms) / interval_est
+    return max(1, math.floor(expected * coverage))
+
+
+def _value(metric: str, cpu: float, mem: int) -> float:
+    return cpu if metric == "cpu" else mem / _MB
+
+
+class RuleEngine:
+    def __init__(self):
+        self.compiled = False
+        self.version = 0
+        self._rules: Dict[Tuple[str, str], List[CompiledRule]] = {}  # (scope, target) -> rule
+        self._disk_rules: List[CompiledRule] = []
+        self._per_entity: Dict[Tuple[str, str], List[CompiledRule]] = {}  # cache target + "*"
+        self._state: Dict[Tuple[str, str, CompiledRule], _State] = {}
+        self._last_alert: Dict[Tuple[str, str, str], int] = {}
+        self._seeded: set = set()
+        self._cooldown_seeded: set = set()
+        self._custom: Dict[Tuple[str, str], List[CompiledRule]] = {}  # rule từ ALERT_RULES theo (scope, target)
+        self._lock = threading.Lock()  # bảo vệ _pending_apps (ghi từ event loop, đọc trong thread đánh giá)
+        self._pending_apps: Dict[str, object] = {}  # app_id -> AppInfo mới, None = đã bỏ
+        self.cooldown_ms = settings.ALERT_COOLDOWN_MS
+        self.coverage = 0.8
+        self.evaluations = 0
+        self.alerts_raised = 0
+        self.last_eval_ms = 0.0
+
+    # ---- compile ----
+    def invalidate(self):
+        """Hook reload config: compile lại ở lượt evaluate kế (trong thread đánh giá)."""
+        self.compiled = False
+
+    def update_apps(self, changed: Dict[str, object]):
+        """Discovery thêm (app_id -> AppInfo) / bỏ (app_id -> None) app; áp ở lượt evaluate kế."""
+        with self._lock:
+            self._pending_apps.update(changed)
+
+    def compile(self):
+        with self._lock:
+            self._pending_apps = {}  # settings.APPS đã gồm mọi thay đổi đang chờ
+        window = settings.ALERT_WINDOW_MS
+        rules: List[CompiledRule] = []
+        for app_id, info in settings.APPS.items():
+            rules.extend(_app_rules(app_id, info, window))
+        # memory threshold của system là % RAM tổng → chuyển sang MB
+        sys_mem_mb = settings.MEMORY_THRESHOLD * (settings.TOTAL_RAM_BYTES / _MB) / 100.0
+        rules.append(CompiledRule("threshold", APP, "cpu", SYSTEM, settings.CPU_THRESHOLD, window, "cpu"))
+        rules.append(CompiledRule("threshold", APP, "memory", SYSTEM, sys_mem_mb, window, "memory"))
+        rules.append(CompiledRule("instant", APP, "disk", SYSTEM, settings.DISK_THRESHOLD, window, "disk"))
+        for name, info in settings.CONTAINERS.items():
+            if info.cpu_threshold is not None:
+                rules.append(CompiledRule("threshold", CONTAINER, "cpu", name, info.cpu_threshold, window, "cpu"))
+            if info.memory_threshold_mb is not None:
+                rules.append(CompiledRule("threshold", CONTAINER, "memory", name, info.memory_threshold_mb, window, "memory"))
+        custom: Dict[Tuple[str, str], List[CompiledRule]] = {}
+        for r in settings.ALERT_RULES:
+            c = _compile_rule(r, window)
+            if c is not None:
+                rules.append(c)
+                custom.setdefault((c.scope, c.target), []).append(c)
+
+        by_target: Dict[Tuple[str, str], List[CompiledRule]] = {}
+        disk: List[CompiledRule] = []
+        for r in rules:
+            if r.metric == "disk":
+                disk.append(r)
+            else:
+                by_target.setdefault((r.scope, r.target), []).append(r)
+
+        # đổi cả bộ 1 lần; state cũ gắn với rule cũ nên nạp lại từ DB ở lần evaluate sau
+        self._rules = by_target
+        self._disk_rules = disk
+        self._custom = custom
+        self._per_entity = {}
+        self._state = {}
+        self._last_alert = {}
+        self._seeded = set()
+        self._cooldown_seeded = set()
+        self.cooldown_ms = settings.ALERT_COOLDOWN_MS
+        self.coverage = settings.ALERT_COVERAGE
+        self.compiled = True
+        self.version += 1
+
+    def _apply_pending_apps(self):
+        with self._lock:
+            if not self._pending_apps:
+                return
+            changed, self._pending_apps = self._pending_apps, {}
+        window = settings.ALERT_WINDOW_MS
+        for app_id, info in changed.items():
+            key = (APP, app_id)
+            rules = (_app_rules(app_id, info, window) if info is not None else []) + self._custom.get(key, [])
+            if rules:
+                self._rules[key] = rules
+            else:
+                self._rules.pop(key, None)
+            self._per_entity.pop(key, None)
+            self._seeded.discard(key)
+            self._cooldown_seeded.discard(key)
+        # 1 lượt qua state cho cả đợt thay đổi
+        self._state = {k: v for k, v in self._state.items() if k[0] != APP or k[1] not in changed}
+        self._last_alert = {k: v for k, v in self._last_alert.items() if k[0] != APP or k[1] not in changed}
+
+    def rules_for(self, scope: str, entity: str) -> List[CompiledRule]:
+        key = (scope, entity)
+        rules = self._per_entity.get(key)
+        if rules is None:
+            rules = self._rules.get(key, []) + self._rules.get((scope, "*"), [])
+            self._per_entity[key] = rules
+        return rules
+
+    # ---- evaluate ----
+    def evaluate(self, db: Session, ts_ms: int, samples: Sequence[tuple] = (),
+                 container_samples: Sequence[tuple] = (), check_disk: bool = True) -> int:
+        """1 lượt cho cả tick; alert được lưu bằng repo.save_alert / save_container_alert. Trả số alert mới.
+        check_disk=False: bỏ rule disk (vd tick cũ trong 1 batch của alert_worker, disk chỉ có giá trị hiện tại)."""
+        if not self.compiled:
+            self.compile()
+        else:
+            self._apply_pending_apps()
+        t0 = time.perf_counter()
+        raised = 0
+        for s in samples:
+            raised += self._eval_entity(db, APP, s[0], s[1], s[2], s[3])
+        for s in container_samples:
+            raised += self._eval_entity(db, CONTAINER, s[0], s[1], s[2], s[3])
+
+        if check_disk and self._disk_rules:
+            disk_pct = _root_disk_usage()[2]  # 1 lần / tick
+            self._seed_cooldowns(db, APP, SYSTEM)
+            for rule in self._disk_rules:
+                raised += self._apply(db, rule, APP, SYSTEM, ts_ms, disk_pct)
+
+        self.evaluations += 1
+        self.alerts_raised += raised
+        self.last_eval_ms = (time.perf_counter() - t0) * 1000
+        return raised
+
+    def _eval_entity(self, db: Session, scope: str, entity: str, ts: int, cpu: float, mem: int) -> int:
+        rules = self.rules_for(scope, entity)
+        if not rules:
+            return 0
+        if (scope, entity) not in self._seeded:
+            self._seed(db, scope, entity, rules, ts)
+        raised = 0
+        for rule in rules:
+            raised += self._apply(db, rule, scope, entity, ts, _value(rule.metric, cpu, mem))
+        return raised
+
+    def _apply(self, db: Session, rule: CompiledRule, scope: str, entity: str, ts: int, value: float) -> int:
+        if not self._step(rule, self._get_state(scope, entity, rule), ts, value):
+            return 0
+        if rule.kind != "hysteresis":
+            key = (scope, entity, rule.alert_type)
+            last = self._last_alert.get(key)
+            if last is not None and ts - last < self.cooldown_ms:
+                return 0
+            self._last_alert[key] = ts
+        if scope == APP:
+            repo.save_alert(db, entity, rule.alert_type, ts, value)
+        else:
+            repo.save_container_alert(db, entity, rule.alert_type, ts, value)
+        return 1
+
+    def _get_state(self, scope: str, entity: str, rule: CompiledRule) -> _State:
+        key = (scope, entity, rule)
+        st = self._state.get(key)
+        if st is None:
+            st = self._state[key] = _State()
+        return st
+
+    def _step(self, rule: CompiledRule, st: _State, ts: int, value: float) -> bool:
+        """Cập nhật state với 1 sample; True nếu điều kiện alert đạt (chưa xét cooldown)."""
+        kind = rule.kind
+        if kind == "instant":
+            return value > rule.threshold
+        if kind == "hysteresis":
+            if st.armed:
+                if value > rule.threshold:
+                    st.armed = False
+                    return True
+            elif value < rule.clear:
+                st.armed = True
+            return False
+
+        pts = st.points
+        since = ts - rule.window_ms
+        if kind == "threshold":
+            if value <= rule.threshold:
+                st.last_below = ts
+                pts.clear()
+                return False
+            pts.append(ts)
+            while pts[0] < since:
+                pts.popleft()
+            if st.last_below is not None and st.last_below >= since:
+                return False
+            n = len(pts)
+            return n >= _compute_min_samples(pts[0], pts[-1], n, rule.window_ms,
+                                             settings.SAMPLE_INTERVAL_MS, self.coverage)
+
+        # rate: (giá trị mới - giá trị đầu cửa sổ) / phút, cần dữ liệu phủ >= coverage cửa sổ
+        pts.append((ts, value))
+        while pts[0][0] < since:
+            pts.popleft()
+        t_first, v_first = pts[0]
+        span = ts - t_first
+        if len(pts) < 2 or span < rule.window_ms * self.coverage:
+            return False
+        return (value - v_first) * 60000.0 / span > rule.threshold
+
+    # ---- nạp state từ DB ----
+    def _seed(self, db: Session, scope: str, entity: str, rules: List[CompiledRule], ts: int):
+        """Replay sample trong cửa sổ (trước ts) vào state, không phát alert; nạp mốc cooldown."""
+        self._seeded.add((scope, entity))
+        self._seed_cooldowns(db, scope, entity)
+        window = max(r.window_ms for r in rules)
+        if scope == APP:
+            rows = [(r[0], r[1], r[2]) for r in repo.get_samples(db, entity, ts - window, ts - 1)]
+        else:
+            rows = repo.get_container_samples(db, entity, ts - window, ts - 1)
+        for rule in rules:
+            st = self._get_state(scope, entity, rule)
+            for row_ts, cpu, mem in rows:
+                self._step(rule, st, row_ts, _value(rule.metric, cpu, mem))
+
+    def _seed_cooldowns(self, db: Session, scope: str, entity: str):
+        if (scope, entity) in self._cooldown_seeded:
+            return
+        self._cooldown_seeded.add((scope, entity))
+        if scope == APP:
+            last = repo.get_last_alert_times(db, entity)
+        else:
+            last = repo.get_last_container_alert_times(db, entity)
+        for alert_type, ts in last.items():
+            key = (scope, entity, alert_type)
+            if ts is not None and ts > self._last_alert.get(key, -1):
+                self._last_alert[key] = ts
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "rules": sum(len(v) for v in self._rules.values()) + len(self._disk_rules),
+            "entities": len(self._seeded),
+            "evaluations": self.evaluations,
+            "alerts_raised": self.alerts_raised,
+            "last_eval_ms": round(self.last_eval_ms, 3),
+        }
+
+
+def _app_rules(app_id: str, info, window: int) -> List[CompiledRule]:
+    """Rule ngưỡng cpu / memory của 1 app từ AppInfo."""
+    rules = []
+    if info.cpu_threshold is not None:
+        rules.append(CompiledRule("threshold", APP, "cpu", app_id, info.cpu_threshold, window, "cpu"))
+    if info.memory_threshold_mb is not None:
+        rules.append(CompiledRule("threshold", APP, "memory", app_id, info.memory_threshold_mb, window, "memory"))
+    return rules
+
+
+def _compile_rule(r: AlertRule, default_window_ms: int) -> Optional[CompiledRule]:
+    """AlertRule (config) -> CompiledRule; rule sai thì bỏ qua + cảnh báo, không làm hỏng cả bộ."""
+    kind = r.type.strip().lower()
+    metric = r.metric.strip().lower()
+    scope = r.scope.strip().lower()
+    if kind not in KINDS or metric not in METRICS or scope not in (APP, CONTAINER):
+        print(f"[WARN] alert rule không hợp lệ (type={r.type}, metric={r.metric}, scope={r.scope}), bỏ qua")
+        return None
+    if metric == "disk" and (scope != APP or r.target not in (SYSTEM, "*") or kind == "rate"):
+        print(f"[WARN] alert rule disk chỉ áp dụng cho {SYSTEM} (threshold/hysteresis), bỏ qua")
+        return None
+    clear = None
+    if kind == "hysteresis":
+        clear = r.threshold if r.clear is None else r.clear
+        if clear > r.threshold:
+            print(f"[WARN] alert rule hysteresis: clear ({clear}) > threshold ({r.threshold}), bỏ qua")
+            return None
+    window = r.window_ms if r.window_ms and r.window_ms > 0 else default_window_ms
+    if metric == "disk" and kind == "threshold":
+        kind = "instant"  # disk chỉ có 1 giá trị / tick, không có chuỗi sample trong DB
+    target = SYSTEM if metric == "disk" else r.target
+    return CompiledRule(kind, scope, metric, target, r.threshold, window,
+                        r.alert_type or f"{metric}_{r.type.strip().lower()}", clear)
+
+
+rule_engine = RuleEngine()
+on_reload(rule_engine.invalidate)
@@ -0,0 +1,113 @@
+# app/metrics/alert_worker.py
+"""
+Đánh giá alert tách khỏi transaction ghi sample.
+- Collector commit sample xong thì publish() sample của tick vào hàng đợi có giới hạn (không await, không chạm DB).
+- 1 task nền lấy tối đa ALERT_BATCH_MAX tick / lần, chạy rule_engine trong threadpool với session + transaction riêng.
+- Worker chậm: hàng đợi đầy thì bỏ tick cũ nhất (đếm dropped), collector không bao giờ phải chờ.
+- Cùng transaction: metrics/anomaly cập nhật baseline + báo bất thường.
+- stats(): độ sâu hàng đợi, số tick bỏ, độ trễ đánh giá (commit alert - ts của tick).
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, List, Optional, Sequence, Tuple
+from starlette.concurrency import run_in_threadpool
+from vqc_monitor.core.config import settings
+from vqc_monitor.db.base import SessionLocal
+from vqc_monitor.metrics.alert_rules import rule_engine
+from vqc_monitor.metrics.anomaly import anomaly_detector
+from vqc_monitor.core.instrument import DB_COMMIT_SECONDS, registry
+
+_EVAL_SECONDS = registry.histogram("vqc_alert_eval_seconds", "Thời gian đánh giá 1 batch tick (rule + anomaly)")
+_T_COMMIT = DB_COMMIT_SECONDS.labels("alert_worker")
+_DROPPED = registry.counter("vqc_alert_dropped_ticks_total", "Tick bị bỏ do hàng đợi alert đầy")
+
+# (ts_ms, sample app/system, sample container)
+Tick = Tuple[int, Sequence[tuple], Sequence[tuple]]
+
+
+class AlertWorker:
+    def __init__(self):
+        self._queue: Deque[Tick] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.processed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_lag_ms = 0
+        self.max_lag_ms = 0
+        self.last_batch_ms = 0.0
+
+    def publish(self, ts_ms: int, samples: Sequence[tuple], container_samples: Sequence[tuple] = ()):
+        """Gọi trên event loop sau khi commit sample; O(1), không chặn."""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if len(self._queue) >= max(1, settings.ALERT_QUEUE_MAX):
+            self._queue.popleft()
+            self.dropped += 1
+            _DROPPED.inc()
+        self._queue.append((ts_ms, samples, container_samples))
+        self.published += 1
+        self._wakeup.set()
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queue:
+                n = min(len(self._queue), max(1, settings.ALERT_BATCH_MAX))
+                batch = [self._queue.popleft() for _ in range(n)]
+                t0 = time.perf_counter()
+                try:
+                    await run_in_threadpool(self._evaluate, batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[WARN] alert worker lỗi: {e}")
+                    # state RAM có thể đã ghi nhận alert chưa commit -> nạp lại từ DB ở lượt kế
+                    rule_engine.invalidate()
+                    continue
+                self.batches += 1
+                self.processed += n
+                self.last_batch_ms = (time.perf_counter() - t0) * 1000
+                self.last_lag_ms = int(time.time() * 1000) - batch[0][0]
+                self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    def _evaluate(self, batch: List[Tick]):
+        with SessionLocal() as db:
+            last = len(batch) - 1
+            with _EVAL_SECONDS.time():
+                for i, (ts_ms, samples, container_samples) in enumerate(batch):
+                    # disk chỉ có giá trị hiện tại -> đọc 1 lần cho tick mới nhất của batch
+                    rule_engine.evaluate(db, ts_ms, samples, container_samples, check_disk=(i == last))
+                    anomaly_detector.observe(db, ts_ms, samples, container_samples)
+            with _T_COMMIT.time():
+                db.commit()
+
+    def stats(self) -> dict:
+        oldest = self._queue[0][0] if self._queue else None
+        return {
+            "queue_depth": len(self._queue),
+            "queue_max": settings.ALERT_QUEUE_MAX,
+            "published": self.published,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "last_lag_ms": self.last_lag_ms,
+            "max_lag_ms": self.max_lag_ms,
+            "pending_lag_ms": int(time.time() * 1000) - oldest if oldest is not None else 0,
+            "last_batch_ms": round(self.last_batch_ms, 3),
+            "rules": rule_engine.stats(),
+            "anomaly": anomaly_detector.stats(),
+        }
+
+
+alert_worker = AlertWorker()
@@ -0,0 +1,175 @@
+# app/metrics/anomaly.py
+"""
+Phát hiện bất thường dạng streaming cho từng chuỗi (scope, entity, metric), O(1) / sample.
+- Baseline = EWMA + phương sai EW (alpha = ANOMALY_ALPHA); z = (x - mean) / std tính TRƯỚC khi cập nhật.
+- |z| >= ANOMALY_Z liên tiếp ANOMALY_CONSECUTIVE sample (sau ANOMALY_WARMUP sample học) -> alert
+  "<metric>_anomaly" qua repo.save_alert / save_container_alert (bảng + websocket alert sẵn có),
+  cooldown ALERT_COOLDOWN_MS như rule thường.
+- State nằm trong các array liền mạch (mean/var/n/streak), chỉ số theo dict key -> slot;
+  checkpoint các slot thay đổi xuống bảng anomaly_state mỗi ANOMALY_CHECKPOINT_MS, nạp lại khi khởi động.
+- Chạy trong metrics/alert_worker (cùng transaction với rule engine), không chạm collector.
+"""
+from array import array
+from math import sqrt
+from typing import Dict, List, Sequence, Tuple
+from sqlalchemy.orm import Session
+from vqc_monitor.core.config import settings
+from vqc_monitor.db import repo
+
+APP = "app"
+CONTAINER = "container"
+METRICS = ("cpu", "memory")
+_MB = 1024 * 1024
+# std tối thiểu (tránh z rất lớn khi chuỗi gần như hằng số): tuyệt đối theo metric + 1% mean
+_MIN_STD = {"cpu": 1.0, "memory": 1.0}
+_MIN_STD_REL = 0.01
+
+Key = Tuple[str, str, str]
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self._index: Dict[Key, int] = {}
+        self._keys: List[Key] = []
+        self._mean = array("d")
+        self._var = array("d")
+        self._n = array("q")
+        self._streak = array("l")
+        self._dirty = bytearray()
+        self._loaded = False
+        self._last_checkpoint_ms = 0
+        self._last_alert: Dict[Key, int] = {}
+        self._cooldown_seeded: set = set()
+        self.observed = 0
+        self.anomalies = 0
+        self.checkpoints = 0
+
+    def _slot(self, key: Key) -> int:
+        i = self._index.get(key)
+        if i is None:
+            i = self._index[key] = len(self._keys)
+            self._keys.append(key)
+            self._mean.append(0.0)
+            self._var.append(0.0)
+            self._n.append(0)
+            self._streak.append(0)
+            self._dirty.append(0)
+        return i
+
+    def _load(self, db: Session, now_ms: int):
+        self._loaded = True
+        self._last_checkpoint_ms = now_ms
+        for scope, entity, metric, mean, var, n, _ in repo.load_anomaly_states(db):
+            i = self._slot((scope, entity, metric))
+            self._mean[i] = mean
+            self._var[i] = var
+            self._n[i] = n
+
+    def observe(self, db: Session, ts_ms: int, samples: Sequence[tuple] = (),
+                container_samples: Sequence[tuple] = ()) -> int:
+        """Cập nhật baseline với sample của 1 tick; trả số alert bất thường đã lưu."""
+        if not settings.ANOMALY_ENABLED:
+            return 0
+        if not self._loaded:
+            self._load(db, ts_ms)
+        raised = 0
+        for s in samples:
+            raised += self._observe_entity(db, APP, s[0], s[1], s[2], s[3])
+        for s in container_samples:
+            raised += self._observe_entity(db, CONTAINER, s[0], s[1], s[2], s[3])
+        if ts_ms - self._last_checkpoint_ms >= settings.ANOMALY_CHECKPOINT_MS:
+            self.checkpoint(db, ts_ms)
+        return raised
+
+    def _observe_entity(self, db: Session, scope: str, entity: str, ts: int, cpu: float, mem: int) -> int:
+        raised = 0
+        for metric in METRICS:
+            x = cpu if metric == "cpu" else mem / _MB
+            key = (scope, entity, metric)
+            i = self._slot(key)
+            z = self._update(i, metric, x)
+            self.observed += 1
+            if z is None or abs(z) < settings.ANOMALY_Z:
+                self._streak[i] = 0
+                continue
+            self._streak[i] += 1
+            # báo 1 lần / đợt bất thường, khi đủ số sample liên tiếp
+            if self._streak[i] != max(1, settings.ANOMALY_CONSECUTIVE):
+                continue
+            if self._passed_cooldown(db, key, ts):
+                alert_type = f"{metric}_anomaly"
+                if scope == APP:
+                    repo.save_alert(db, entity, alert_type, ts, x)
+                else:
+                    repo.save_container_alert(db, entity, alert_type, ts, x)
+                self._last_alert[key] = ts
+                self.anomalies += 1
+                raised += 1
+        return raised
+
+    def _update(self, i: int, metric: str, x: float):
+        """1 bước EWMA; trả z-score so với baseline trước đó (None khi còn warmup)."""
+        n = self._n[i]
+        self._dirty[i] = 1
+        if n == 0:
+            self._mean[i] = x
+            self._var[i] = 0.0
+            self._n[i] = 1
+            return None
+        alpha = settings.ANOMALY_ALPHA
+        mean = self._mean[i]
+        var = self._var[i]
+        diff = x - mean
+        std = max(sqrt(var), _MIN_STD[metric], abs(mean) * _MIN_STD_REL)
+        incr = alpha * diff
+        self._mean[i] = mean + incr
+        self._var[i] = (1 - alpha) * (var + diff * incr)
+        self._n[i] = n + 1
+        return diff / std if n >= settings.ANOMALY_WARMUP else None
+
+    def _passed_cooldown(self, db: Session, key: Key, ts: int) -> bool:
+        scope, entity, metric = key
+        if (scope, entity) not in self._cooldown_seeded:
+            self._cooldown_seeded.add((scope, entity))
+            last = (repo.get_last_alert_times(db, entity) if scope == APP
+                    else repo.get_last_container_alert_times(db, entity))
+            for m in METRICS:
+                t = last.get(f"{m}_anomaly")
+                if t is not None:
+                    self._last_alert[(scope, entity, m)] = max(t, self._last_alert.get((scope, entity, m), t))
+        last_ts = self._last_alert.get(key)
+        return last_ts is None or ts - last_ts >= settings.ALERT_COOLDOWN_MS
+
+    def checkpoint(self, db: Session, now_ms: int):
+        """Upsert các slot đã đổi từ lần checkpoint trước (commit theo transaction của caller)."""
+        rows = []
+        for i, key in enumerate(self._keys):
+            if not self._dirty[i]:
+                continue
+            self._dirty[i] = 0
+            rows.append({"scope": key[0], "entity": key[1], "metric": key[2], "mean": self._mean[i],
+                         "var": self._var[i], "n": self._n[i], "updated_ms": now_ms})
+        repo.save_anomaly_states(db, rows)
+        self._last_checkpoint_ms = now_ms
+        self.checkpoints += 1
+
+    def baseline(self, scope: str, entity: str) -> Dict[str, dict]:
+        out = {}
+        for metric in METRICS:
+            i = self._index.get((scope, entity, metric))
+            if i is not None:
+                out[metric] = {"mean": self._mean[i], "std": sqrt(self._var[i]), "n": self._n[i],
+                               "streak": self._streak[i]}
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.ANOMALY_ENABLED,
+            "series": len(self._keys),
+            "observed": self.observed,
+            "anomalies": self.anomalies,
+            "checkpoints": self.checkpoints,
+        }
+
+
+anomaly_detector = AnomalyDetector()
@@ -0,0 +1,196 @@
+# app/metrics/burst.py
+"""
+Lấy mẫu độ phân giải cao tạm thời khi 1 app tiến gần ngưỡng alert.
+- Sau mỗi batch của collector, app có cpu >= BURST_PRE_ALERT_RATIO x cpu_threshold (hoặc memory tương tự)
+  bắt đầu 1 burst: task riêng đọc cgroup mỗi BURST_INTERVAL_MS (deadline không trôi) vào buffer RAM.
+- Burst kéo dài tới BURST_HOLD_MS sau lần cuối còn trên mức pre-alert, tối đa BURST_MAX_MS; tối đa
+  BURST_MAX_ACTIVE app cùng lúc. Burst bị cắt ở BURST_MAX_MS khi app vẫn trên mức pre-alert thì app chỉ được
+  burst lại sau khi có 1 sample xuống dưới mức đó (BURST_MAX_MS là giới hạn thật, buffer giữ đoạn dẫn tới alert).
+- Alert của app (alert_bus, đã commit) tới trong lúc burst hoặc sau khi kết thúc, tới muộn nhất
+  max(kết thúc, bắt đầu + cửa sổ rule dài nhất của app) + BURST_LINK_GRACE_MS (alert threshold chỉ bắn sau khi
+  vượt ngưỡng suốt cửa sổ) -> ghi cả buffer vào samples_hires gắn alert_id. Không có alert -> bỏ buffer.
+- Chỉ cho app (cgroup đọc rẻ); container qua docker stats quá chậm cho 100ms.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Set
+from vqc_monitor.core.alert_bus import alert_bus, APP as BUS_APP
+from vqc_monitor.core.config import settings
+from vqc_monitor.db import repo
+from vqc_monitor.db.base import SessionLocal
+from vqc_monitor.metrics.cgroup import compute_rates, snapshot
+
+_MB = 1024 * 1024
+
+
+class _Burst:
+    __slots__ = ("app_id", "cgroup", "started", "until", "capped", "buf", "alerts", "task", "expires")
+
+    def __init__(self, app_id: str, cgroup: str, now: float):
+        self.app_id = app_id
+        self.cgroup = cgroup
+        self.started = now
+        self.until = now
+        self.capped = False  # lần extend cuối bị cắt bởi BURST_MAX_MS
+        self.buf: Deque[tuple] = deque(maxlen=max(1, settings.BURST_MAX_MS // max(1, settings.BURST_INTERVAL_MS)) + 1)
+        self.alerts: List[int] = []  # alert_id cần gắn cửa sổ burst
+        self.task: Optional[asyncio.Task] = None
+        self.expires = 0.0  # đã kết thúc: chờ alert tới lúc này
+
+    def extend(self, now: float):
+        cap = self.started + settings.BURST_MAX_MS / 1000
+        hold = now + settings.BURST_HOLD_MS / 1000
+        self.capped = hold > cap
+        self.until = min(cap, hold)
+
+
+def _rule_window_ms(app_id: str) -> int:
+    """Cửa sổ rule alert dài nhất áp cho app (ALERT_WINDOW_MS + rule thêm trong ALERT_RULES)."""
+    windows = [r.window_ms for r in settings.ALERT_RULES
+               if r.window_ms and r.scope.strip().lower() == "app" and r.target in ("*", app_id)]
+    return max([settings.ALERT_WINDOW_MS, *windows])
+
+
+class BurstCapture:
+    def __init__(self):
+        self._active: Dict[str, _Burst] = {}
+        self._ended: Dict[str, _Burst] = {}
+        self._disarmed: Set[str] = set()  # app có burst bị cắt ở BURST_MAX_MS, chờ xuống dưới mức pre-alert
+        self._sub = None
+        self.started = 0
+        self.skipped = 0  # vượt BURST_MAX_ACTIVE
+        self.samples = 0
+        self.persisted = 0
+        self.discarded = 0
+        self.errors = 0
+
+    def start(self):
+        if self._sub is None:
+            self._sub = alert_bus.subscribe(BUS_APP, on_batch=self._on_alerts)
+
+    def _pre_alert(self, app_id: str, cpu: float, mem: int) -> bool:
+        info = settings.APPS.get(app_id)
+        if info is None or not info.cgroup:
+            return False
+        ratio = settings.BURST_PRE_ALERT_RATIO
+        if info.cpu_threshold is not None and cpu >= info.cpu_threshold * ratio:
+            return True
+        return info.memory_threshold_mb is not None and mem / _MB >= info.memory_threshold_mb * ratio
+
+    def check(self, samples: Sequence[tuple]):
+        """Collector gọi trên event loop sau mỗi batch đã commit (sample (app_id, ts, cpu, mem, r, w))."""
+        if not settings.BURST_ENABLED:
+            return
+        now = time.monotonic()
+        for s in samples:
+            app_id = s[0]
+            if not self._pre_alert(app_id, s[2], s[3]):
+                self._disarmed.discard(app_id)
+                continue
+            b = self._active.get(app_id)
+            if b is None:
+                if app_id in self._disarmed:
+                    continue
+                if len(self._active) >= max(1, settings.BURST_MAX_ACTIVE):
+                    self.skipped += 1
+                    continue
+                b = self._active[app_id] = _Burst(app_id, settings.APPS[app_id].cgroup, now)
+                b.task = asyncio.create_task(self._run(b))
+                self.started += 1
+            b.extend(now)
+
+    async def _run(self, b: _Burst):
+        interval = max(1, settings.BURST_INTERVAL_MS) / 1000
+        prev = None
+        deadline = time.monotonic()
+        try:
+            while time.monotonic() < b.until:
+                try:
+                    snap = await asyncio.to_thread(snapshot, b.cgroup)
+                except (FileNotFoundError, KeyError):
+                    break  # cgroup biến mất
+                t = time.time()
+                if prev is not None:
+                    rates = compute_rates(prev[0], snap, max(1e-6, t - prev[1]))
+                    b.buf.append((int(t * 1000), rates["cpu_percent"], rates["mem_bytes"],
+                                  rates["read_Bps"], rates["write_Bps"]))
+                    self.samples += 1
+                prev = (snap, t)
+                deadline += interval
+                now = time.monotonic()
+                if deadline < now:
+                    deadline = now  # đọc chậm hơn chu kỳ: không chạy bù
+                await asyncio.sleep(deadline - now)
+        finally:
+            self._active.pop(b.app_id, None)
+            if b.capped:
+                self._disarmed.add(b.app_id)
+        if b.alerts:
+            await self._persist(b)
+        else:
+            # alert threshold tới sau khi vượt ngưỡng suốt cửa sổ rule: giữ buffer tới lúc đó (+ grace cho worker trễ)
+            b.expires = max(time.monotonic(), b.started + _rule_window_ms(b.app_id) / 1000) \
+                + settings.BURST_LINK_GRACE_MS / 1000
+            self._ended[b.app_id] = b
+        self._expire()
+
+    def _expire(self):
+        now = time.monotonic()
+        self._disarmed.intersection_update(settings.APPS)  # app đã bị bỏ (discovery / reload)
+        for app_id, b in list(self._ended.items()):
+            if b.expires <= now:
+                del self._ended[app_id]
+                self.discarded += 1
+
+    def _on_alerts(self, batch: List[dict]):
+        if not self._active and not self._ended:
+            return
+        self._expire()
+        for a in batch:
+            app_id = a.get("app_id")
+            b = self._active.get(app_id)
+            if b is not None:
+                b.alerts.append(a["id"])
+                continue
+            b = self._ended.pop(app_id, None)
+            if b is not None:
+                b.alerts.append(a["id"])
+                asyncio.create_task(self._persist(b))
+
+    async def _persist(self, b: _Burst):
+        rows = list(b.buf)
+        try:
+            await asyncio.to_thread(self._write, b.app_id, list(b.alerts), rows)
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARN] lưu burst {b.app_id} lỗi: {e}")
+            return
+        self.persisted += 1
+
+    @staticmethod
+    def _write(app_id: str, alert_ids: List[int], rows: List[tuple]):
+        with SessionLocal() as db:
+            for alert_id in alert_ids:
+                repo.insert_hires_samples(db, alert_id, app_id, rows)
+            db.commit()
+
+    def active_count(self) -> int:
+        return len(self._active)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.BURST_ENABLED,
+            "active": {app_id: len(b.buf) for app_id, b in self._active.items()},
+            "awaiting_alert": len(self._ended),
+            "disarmed": len(self._disarmed),
+            "started": self.started,
+            "skipped": self.skipped,
+            "samples": self.samples,
+            "persisted": self.persisted,
+            "discarded": self.discarded,
+            "errors": self.errors,
+        }
+
+
+burst_capture = BurstCapture()
@@ -59,9 +59,10 @@ def compute_rates(prev: dict, curr: dict, dt_sec: float) -> dict:
         "write_Bps": d_wbytes / dt_sec,
     }
 
-def get_service_uptime(service_name: str) -> Optional[float]:
+def get_service_active_since_us(service_name: str) -> Optional[int]:
     """
-    Trả về số giây service đã chạy (uptime) hoặc None nếu không xác định được.
+    ActiveEnterTimestampMonotonic (µs, cùng gốc với time.monotonic) của service,
+    None nếu không xác định được hoặc service chưa active. Gọi systemctl: không chạy trên event loop.
     """
     try:
         cp = subprocess.run(
@@ -72,14 +73,23 @@ def get_service_uptime(service_name: str) -> Optional[float]:
         if "=" in line:
             _, value = line.split("=", 1)
             value = value.strip()
-            if value.isdigit():
-                # Trả về uptime tính từ lúc hiện tại
-                monotonic_now_us = int(float(time.monotonic() * 1e6))
-                started_us = int(value)
-                uptime_s = (monotonic_now_us - started_us) / 1e6
-                formatted_time = time.strftime("%H:%M:%S", time.gmtime(uptime_s))
-
-                return formatted_time
+            if value.isdigit() and int(value) > 0:
+                return int(value)
     except subprocess.CalledProcessError as e:
         print(f"[WARN] systemctl show thất bại cho {service_name}: {e}")
     return None
+
+
+def format_uptime(started_us: Optional[int]) -> Optional[str]:
+    """Uptime dạng HH:MM:SS tính từ mốc ActiveEnterTimestampMonotonic."""
+    if started_us is None:
+        return None
+    uptime_s = (int(time.monotonic() * 1e6) - started_us) / 1e6
+    return time.strftime("%H:%M:%S", time.gmtime(max(0.0, uptime_s)))
+
+
+def get_service_uptime(service_name: str) -> Optional[str]:
+    """
+    Trả về thời gian service đã chạy (uptime) hoặc None nếu không xác định được.
+    """
+    return format_uptime(get_service_active_since_us(service_name))
@@ -4,60 +4,183 @@ from vqc_monitor.db.base import SessionLocal
 from vqc_monitor.db import repo
 from vqc_monitor.metrics.cgroup import snapshot, compute_rates
 from vqc_monitor.metrics import system as sysm
+from vqc_monitor.metrics.container_feed import container_feed
+from vqc_monitor.metrics.history_feed import history_feed
+from vqc_monitor.metrics.alert_worker import alert_worker
+from vqc_monitor.metrics.discovery import discovery
+from vqc_monitor.metrics.burst import burst_capture
+from vqc_monitor.core.deadband import deadband
+from vqc_monitor.metrics.scheduler import APP, CONTAINER, SYSTEM, scheduler
+from vqc_monitor.core.instrument import DB_COMMIT_SECONDS, registry
 import subprocess
 import shlex
 from datetime import datetime
 from psutil import boot_time
 
+_BATCH_SECONDS = registry.histogram("vqc_collector_batch_seconds", "Thời gian 1 batch lấy mẫu của collector")
+_SOURCE_SECONDS = registry.histogram("vqc_collector_source_seconds", "Thời gian theo từng phần của batch",
+                                     ("source",))
+_T_DISCOVERY = _SOURCE_SECONDS.labels("discovery")
+_T_CGROUP = _SOURCE_SECONDS.labels("cgroup")
+_T_SYSTEM = _SOURCE_SECONDS.labels("system")
+_T_CONTAINERS = _SOURCE_SECONDS.labels("containers")
+_T_DB_WRITE = _SOURCE_SECONDS.labels("db_write")
+_T_COMMIT = DB_COMMIT_SECONDS.labels("collector")
+_SAMPLES = registry.counter("vqc_collector_samples_total", "Số sample collector đã lấy", ("kind",))
+_SAMPLES_APP = _SAMPLES.labels("app")
+_SAMPLES_CONTAINER = _SAMPLES.labels("container")
+
 class Collector:
     def __init__(self):
         self.prev = {}  # app_id -> (snap, t)
         self.sys_prev = None
+        # trạng thái timeline đã ghi (app_id/container -> "running"/"stopped"): chỉ chạm DB khi đổi
+        self.states = {}
+        self.ctr_states = {}
+        self._sched_sig = None
+
+    def _set_state(self, db, app_id: str, state: str):
+        if self.states.get(app_id) != state:
+            repo.open_or_close_state_timeline(db, app_id, state)
+            self.states[app_id] = state
+
+    @staticmethod
+    def _read_snapshots(apps: dict) -> dict:
+        # chạy trong thread: hàng nghìn cgroup không chặn event loop
+        snaps = {}
+        for app_id, app_info in apps.items():
+            try:
+                snaps[app_id] = snapshot(app_info.cgroup)
+            except (FileNotFoundError, KeyError):
+                # cgroup biến mất giữa chừng
+                snaps[app_id] = None
+        return snaps
+
+    async def _discover(self, db):
+        found = await asyncio.to_thread(discovery.scan)
+        added, removed = discovery.apply(found)
+        if added:
+            repo.upsert_apps(db, added)
+        for app_id in removed:
+            self.prev.pop(app_id, None)
+            held = deadband.flush(app_id)
+            if held is not None:
+                repo.insert_samples(db, [held])
+            self._set_state(db, app_id, "stopped")
+            self.states.pop(app_id, None)
+
+    def _sync_schedule(self):
+        """Đồng bộ nguồn của scheduler khi APPS / CONTAINERS / chu kỳ chung đổi."""
+        # APPS / CONTAINERS được thay cả dict khi reload / discovery -> so sánh identity là đủ
+        sig = (settings.APPS, settings.CONTAINERS, settings.SAMPLE_INTERVAL_MS)
+        old = self._sched_sig
+        if old is not None and sig[0] is old[0] and sig[1] is old[1] and sig[2:] == old[2:]:
+            return
+        self._sched_sig = sig
+        default = settings.SAMPLE_INTERVAL_MS
+        intervals = {(SYSTEM, "__system__"): default}
+        for app_id, info in settings.APPS.items():
+            intervals[(APP, app_id)] = info.sample_interval_ms or default
+        for name, info in settings.CONTAINERS.items():
+            intervals[(CONTAINER, name)] = info.sample_interval_ms or default
+        scheduler.sync(intervals)
+        # app bị bỏ khỏi config -> không giữ state cũ
+        for app_id in [a for a in self.prev if a not in settings.APPS]:
+            del self.prev[app_id]
 
-        
     async def run(self):
-        interval = settings.SAMPLE_INTERVAL_MS / 1000
         while True:
-            t1 = time.time()
-            with SessionLocal() as db:
-                # Bỏ những app không còn path (do service tắt → cgroup biến mất)
-                for app_id, app_info in list(settings.APPS.items()):
-                    try:
-                        snap = snapshot(app_info.cgroup)
-                        repo.open_or_close_state_timeline(db, app_id, "running")
-                    except FileNotFoundError:
-                        # cgroup biến mất giữa chừng
-                        self.prev.pop(app_id, None)
-                        repo.open_or_close_state_timeline(db, app_id, "stopped")
-                        continue
-
-                    now_ms = int(t1 * 1000)
-                    if app_id in self.prev:
-                        prev_snap, t0 = self.prev[app_id]
-                        dt = max(1e-6, t1 - t0)
-                        rates = compute_rates(prev_snap, snap, dt)
-                        repo.insert_sample(
-                            db, app_id, now_ms,
-                            rates["cpu_percent"], rates["mem_bytes"],
-                            rates["read_Bps"], rates["write_Bps"]
-                        )
-                    self.prev[app_id] = (snap, t1)
-
-                sys_now = sysm.snapshot()
+            self._sync_schedule()
+            deadline = scheduler.next_deadline()
+            wait = (deadline - time.monotonic()) if deadline is not None else settings.SAMPLE_INTERVAL_MS / 1000
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue  # config có thể đã đổi trong lúc ngủ
+            due = scheduler.pop_due(time.monotonic(), settings.SCHED_COALESCE_MS)
+            t0 = time.perf_counter()
+            await self._run_batch(due)
+            elapsed = time.perf_counter() - t0
+            scheduler.note_batch(elapsed * 1000)
+            _BATCH_SECONDS.observe(elapsed)
+
+    @staticmethod
+    async def _refresh_containers(names: list):
+        with _T_CONTAINERS.time():
+            return await container_feed.refresh(names=names)
+
+    async def _run_batch(self, due: list):
+        """1 batch các nguồn tới hạn cùng lúc: 1 lần đọc cgroup (thread), 1 docker stats, 1 transaction."""
+        apps = settings.APPS
+        app_due = {name: apps[name] for kind, name in due if kind == APP and name in apps}
+        ctr_due = [name for kind, name in due if kind == CONTAINER and name in settings.CONTAINERS]
+        system_due = (SYSTEM, "__system__") in due
+        t1 = time.time()
+        now_ms = int(t1 * 1000)
+        ctr_task = None
+        if ctr_due:
+            # docker stats chạy song song (thread) trong lúc đọc cgroup/system
+            ctr_task = asyncio.create_task(self._refresh_containers(ctr_due))
+            await asyncio.sleep(0)  # cho task kịp đẩy docker stats sang thread
+        written = []  # sample của batch này, publish cho chart đang mở sau khi commit
+        flushed = []  # sample deadband đang giữ của app vừa dừng
+        ctr_written = []
+        with SessionLocal() as db:
+            if discovery.due():
+                with _T_DISCOVERY.time():
+                    await self._discover(db)
+            snaps = {}
+            if app_due:
+                with _T_CGROUP.time():
+                    snaps = await asyncio.to_thread(self._read_snapshots, app_due)
+            # Bỏ những app không còn path (do service tắt → cgroup biến mất)
+            for app_id, snap in snaps.items():
+                if snap is None:
+                    self.prev.pop(app_id, None)
+                    self._set_state(db, app_id, "stopped")
+                    held = deadband.flush(app_id)
+                    if held is not None:
+                        flushed.append(held)
+                    continue
+                self._set_state(db, app_id, "running")
+                if app_id in self.prev:
+                    prev_snap, t0 = self.prev[app_id]
+                    dt = max(1e-6, t1 - t0)
+                    rates = compute_rates(prev_snap, snap, dt)
+                    written.append((app_id, now_ms, rates["cpu_percent"], rates["mem_bytes"],
+                                    rates["read_Bps"], rates["write_Bps"]))
+                self.prev[app_id] = (snap, t1)
+
+            if system_due:
+                with _T_SYSTEM.time():
+                    sys_now = sysm.snapshot()
                 if self.sys_prev:
                     prev_snap, t0 = self.sys_prev
                     dt = max(1e-6, t1 - t0)
                     rates = sysm.compute_rates(prev_snap, sys_now, dt)
-                    repo.insert_sample(db, "__system__", int(t1*1000),
-                                       rates["cpu_percent"], rates["mem_bytes"],
-                                       rates["read_Bps"] + rates.get("net_rx_Bps",0),   # tùy bạn: có thể tách disk/net
-                                       rates["write_Bps"] + rates.get("net_tx_Bps",0))
+                    written.append(("__system__", now_ms, rates["cpu_percent"], rates["mem_bytes"],
+                                    rates["read_Bps"] + rates.get("net_rx_Bps",0),   # tùy bạn: có thể tách disk/net
+                                    rates["write_Bps"] + rates.get("net_tx_Bps",0)))
                     # ↑ Nếu muốn riêng Disk/Net, hãy mở rộng bảng, hoặc thêm cột net_rx/tx_Bps.
                 self.sys_prev = (sys_now, t1)
-                save_container_metrics(list(settings.CONTAINERS.keys()), db)
-
+            # deadband (nếu bật) chỉ lược bản ghi DB; RAM (chart, alert, burst) vẫn nhận đủ sample
+            with _T_DB_WRITE.time():
+                repo.insert_samples(db, flushed + deadband.filter(written))
+            if ctr_task is not None:
+                ctr_metrics = await ctr_task
+                with _T_DB_WRITE.time():
+                    ctr_written = save_container_metrics(ctr_due, db, metrics=ctr_metrics,
+                                                         ts_ms=container_feed.latest_ts_ms, states=self.ctr_states)
+            with _T_COMMIT.time():
                 db.commit()
-            await asyncio.sleep(max(0, interval))
+        _SAMPLES_APP.inc(len(written))
+        _SAMPLES_CONTAINER.inc(len(ctr_written))
+        if written:
+            history_feed.publish(written)
+            # app gần ngưỡng -> lấy mẫu dày tạm thời (metrics/burst)
+            burst_capture.check(written)
+        if written or ctr_written:
+            # alert đánh giá ở worker riêng (transaction riêng), batch không phải chờ
+            alert_worker.publish(now_ms, written, ctr_written)
 
 def update_timeline_when_system_start():
 
@@ -175,8 +298,9 @@ def get_metrics_from_containers(container_names: list[str]):
         if(not container_names):
             return {}
         metrics = {}
-        cmd = "docker stats --no-stream --format \"{{.Name}} {{.CPUPerc}} {{.MemUsage}}\" " + " ".join(container_names)
-        command_args = shlex.split(cmd)
+        # argv dạng list, không ghép chuỗi rồi tách lại: tên container không thể thành tham số docker
+        command_args = ["docker", "stats", "--no-stream", "--format", "{{.Name}} {{.CPUPerc}} {{.MemUsage}}",
+                        "--", *container_names]
         try:
             result = subprocess.run(command_args,
                                     capture_output=True,
@@ -231,17 +355,26 @@ def get_metrics_from_containers(container_names: list[str]):
             return {}
         
 
-def save_container_metrics(containers: list[str], db):
-        metrics = get_metrics_from_containers(containers)
+def save_container_metrics(containers: list[str], db, metrics: dict | None = None, ts_ms: int | None = None,
+                           states: dict | None = None):
+        # metrics: snapshot có sẵn từ container_feed; None -> tự gọi docker stats
+        # states: cache trạng thái timeline đã ghi (của collector) -> chỉ query timeline khi đổi
+        if metrics is None:
+            metrics = get_metrics_from_containers(containers)
+        if ts_ms is None:
+            ts_ms = int(time.time()*1000)
 
+        written = []  # (name, ts_ms, cpu, mem) để đánh giá alert cả tick
         for name, metric in metrics.items():
+            if name not in containers:
+                # container chỉ được ws yêu cầu, không lưu DB
+                continue
             if metric:
-                repo.insert_container_sample(
-                    db, name, int(time.time()*1000),
-                    metric["cpu_percent"],
-                    metric["mem_bytes"]
-                )
-                if int(metric["mem_limit"]) == 0:
-                    repo.open_or_close_state_timeline_container(db, name, "stopped")
-                else:
-                    repo.open_or_close_state_timeline_container(db, name, "running")
\ No newline at end of file
+                written.append((name, ts_ms, metric["cpu_percent"], metric["mem_bytes"]))
+                state = "stopped" if int(metric["mem_limit"]) == 0 else "running"
+                if states is None or states.get(name) != state:
+                    repo.open_or_close_state_timeline_container(db, name, state)
+                    if states is not None:
+                        states[name] = state
+        repo.insert_container_samples(db, written)
+        return written
@@ -0,0 +1,142 @@
+# app/metrics/container_feed.py
+"""
+Nguồn metrics container dùng chung.
+- Mỗi chu kỳ chỉ chạy 1 lệnh `docker stats` (trong thread, không chặn event loop).
+- Collector gọi refresh(names) cho các container tới hạn (metrics/scheduler) rồi lưu DB từ chính snapshot đó.
+  Chỉ container có trong config được lấy; tên do client gửi không bao giờ tới lệnh docker.
+- /ws/containers subscribe để nhận snapshot (lọc theo container, throttle theo interval_ms của client).
+  Payload của mỗi snapshot encode 1 lần cho mỗi bộ lọc container (ContainerSnapshot.frame), mọi client
+  cùng bộ lọc nhận chung bytes đó.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, Optional, Set
+from vqc_monitor.core.config import settings
+from vqc_monitor.core.serialization import dumps
+
+
+class ContainerSnapshot:
+    __slots__ = ("ts_ms", "metrics", "_frames")
+
+    def __init__(self, ts_ms: int, metrics: Dict[str, dict]):
+        self.ts_ms = ts_ms
+        self.metrics = metrics
+        self._frames: Dict[Optional[str], bytes] = {}
+
+    def frame(self, container: Optional[str]) -> bytes:
+        """container_payload đã encode (lười, 1 lần / bộ lọc container)."""
+        data = self._frames.get(container)
+        if data is None:
+            data = self._frames[container] = dumps(container_payload(container, self.ts_ms, self.metrics))
+        return data
+
+
+class ContainerFeedSubscription:
+    __slots__ = ("container", "interval_ms", "queue", "on_frame", "_last_sent_ms")
+
+    def __init__(self, container: Optional[str], interval_ms: int,
+                 on_frame: Optional[Callable[[bytes], None]] = None):
+        self.container = container
+        self.interval_ms = interval_ms
+        self.on_frame = on_frame  # có callback -> không dùng queue (vd /ws/mux)
+        # chỉ giữ frame mới nhất, client chậm không làm dồn hàng đợi
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._last_sent_ms = 0
+
+    def offer(self, snap: ContainerSnapshot):
+        # cho phép lệch 10% để không bị trễ 1 chu kỳ khi interval trùng chu kỳ feed
+        if self._last_sent_ms and snap.ts_ms - self._last_sent_ms < self.interval_ms * 0.9:
+            return
+        if self.container is not None and not snap.metrics.get(self.container):
+            return
+        self._last_sent_ms = snap.ts_ms
+        data = snap.frame(self.container)
+        if self.on_frame is not None:
+            self.on_frame(data)
+            return
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(data)
+
+
+def container_payload(container: Optional[str], ts_ms: int, metrics: Dict[str, dict]) -> dict:
+    """Payload gửi client: 1 container (phẳng) hoặc danh sách mọi container."""
+    if container is not None:
+        data = metrics[container]
+        return {
+            "ts_ms": ts_ms,
+            "container_name": container,
+            "cpu_percent": data["cpu_percent"],
+            "mem_bytes": data["mem_bytes"],
+            "mem_limit": data["mem_limit"],
+        }
+    return {
+        "ts_ms": ts_ms,
+        "containers": [
+            {
+                "container_name": name,
+                "cpu_percent": data["cpu_percent"],
+                "mem_bytes": data["mem_bytes"],
+                "mem_limit": data["mem_limit"],
+            } for name, data in metrics.items()
+        ],
+    }
+
+
+class ContainerFeed:
+    def __init__(self):
+        self.latest: Dict[str, dict] = {}
+        self.latest_ts_ms: int = 0
+        self._snap: Optional[ContainerSnapshot] = None
+        self._subs: Set[ContainerFeedSubscription] = set()
+        self._lock = asyncio.Lock()
+
+    def subscribe(self, container: Optional[str] = None, interval_ms: int = 5000,
+                  on_frame: Optional[Callable[[bytes], None]] = None) -> ContainerFeedSubscription:
+        sub = ContainerFeedSubscription(container, interval_ms, on_frame)
+        self._subs.add(sub)
+        # gửi ngay snapshot gần nhất (nếu có) để client không phải đợi 1 chu kỳ
+        if self._snap is not None:
+            sub.offer(self._snap)
+        return sub
+
+    def unsubscribe(self, sub: ContainerFeedSubscription):
+        self._subs.discard(sub)
+
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    async def refresh(self, max_age_ms: int = 0, names: Optional[list[str]] = None) -> Dict[str, dict]:
+        """
+        Lấy 1 snapshot mới (hoặc trả snapshot còn "tươi" trong max_age_ms).
+        names: chỉ lấy các container này (phải có trong config), gộp vào snapshot hiện có;
+        trả về metrics của lần lấy này. None = mọi container trong config.
+        Single-flight: nhiều caller đồng thời chỉ tạo 1 tiến trình docker stats.
+        """
+        from vqc_monitor.metrics.collector import get_metrics_from_containers
+
+        async with self._lock:
+            now_ms = int(time.time() * 1000)
+            if names is None and self.latest_ts_ms and now_ms - self.latest_ts_ms <= max_age_ms:
+                return self.latest
+            if names is None:
+                fetch = list(settings.CONTAINERS)
+            else:
+                fetch = [n for n in names if n in settings.CONTAINERS]
+            metrics = await asyncio.to_thread(get_metrics_from_containers, fetch)
+            if names is None:
+                self.latest = metrics
+            else:
+                self.latest = {n: m for n, m in self.latest.items() if n in settings.CONTAINERS}
+                self.latest.update(metrics)
+            self.latest_ts_ms = int(time.time() * 1000)
+            self._snap = ContainerSnapshot(self.latest_ts_ms, self.latest)
+            for sub in list(self._subs):
+                sub.offer(self._snap)
+            return metrics
+
+
+container_feed = ContainerFeed()
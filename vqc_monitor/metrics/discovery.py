@@ -0,0 +1,142 @@
+# app/metrics/discovery.py
+"""
+Tự phát hiện cgroup (unit systemd) để theo dõi, thay cho việc liệt kê từng service trong config.yaml.
+- Duyệt cây cgroup v2 dưới DISCOVERY_ROOT bằng os.scandir (đi vào các *.slice con), lọc tên unit theo glob
+  DISCOVERY_INCLUDE / DISCOVERY_EXCLUDE. Không gọi systemctl / subprocess.
+- Quét lại mỗi DISCOVERY_INTERVAL_MS (collector gọi, phần đọc FS chạy trong thread), chỉ áp phần thay đổi:
+  unit mới được thêm vào settings.APPS (discovered=True), unit biến mất bị bỏ. Service có trong config.yaml
+  luôn ưu tiên (giữ ngưỡng / version cấu hình).
+- Collector ghi unit mới vào bảng apps và đóng timeline của unit biến mất.
+"""
+import os
+import re
+import time
+from fnmatch import translate
+from typing import Dict, List, Optional, Tuple
+from vqc_monitor.core import config
+from vqc_monitor.core.config import AppInfo, CGROUP_ROOT, on_reload, settings
+
+MAX_DEPTH = 4  # số cấp *.slice lồng nhau tối đa
+
+
+def _compile_globs(patterns: List[str]) -> Optional[re.Pattern]:
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{translate(p)})" for p in patterns))
+
+
+def scan(root: str, include: List[str], exclude: List[str], max_units: int) -> Dict[str, str]:
+    """{tên unit: path cgroup} cho các unit khớp include, không khớp exclude, có cpu.stat."""
+    inc = _compile_globs(include)
+    exc = _compile_globs(exclude)
+    out: Dict[str, str] = {}
+    stack = [(str(CGROUP_ROOT / root), 0)]
+    while stack and len(out) < max_units:
+        path, depth = stack.pop()
+        try:
+            it = os.scandir(path)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                try:
+                    if not e.is_dir(follow_symlinks=False):
+                        continue
+                except OSError:
+                    continue
+                name = e.name
+                if name.endswith(".slice"):
+                    if depth < MAX_DEPTH:
+                        stack.append((e.path, depth + 1))
+                    continue
+                if inc is not None and not inc.match(name):
+                    continue
+                if exc is not None and exc.match(name):
+                    continue
+                if not os.path.exists(os.path.join(e.path, "cpu.stat")):
+                    continue
+                out[name] = e.path
+                if len(out) >= max_units:
+                    break
+    return out
+
+
+def unit_app_id(unit: str) -> str:
+    return unit.removesuffix(".service")
+
+
+class CgroupDiscovery:
+    def __init__(self):
+        self.found: Dict[str, str] = {}  # app_id -> cgroup path của lần quét gần nhất
+        self._next_scan = 0.0
+        self.scans = 0
+        self.last_scan_ms = 0.0
+        self.added = 0
+        self.removed = 0
+
+    def due(self) -> bool:
+        return settings.DISCOVERY_ENABLED and time.monotonic() >= self._next_scan
+
+    def scan(self) -> Dict[str, str]:
+        """Chỉ đọc FS (chạy được trong thread)."""
+        t0 = time.perf_counter()
+        self._next_scan = time.monotonic() + settings.DISCOVERY_INTERVAL_MS / 1000
+        units = scan(settings.DISCOVERY_ROOT, settings.DISCOVERY_INCLUDE, settings.DISCOVERY_EXCLUDE,
+                     settings.DISCOVERY_MAX_UNITS)
+        self.scans += 1
+        self.last_scan_ms = (time.perf_counter() - t0) * 1000
+        return {unit_app_id(u): p for u, p in units.items()}
+
+    def apply(self, found: Dict[str, str]) -> Tuple[Dict[str, AppInfo], List[str]]:
+        """Gộp kết quả quét vào settings.APPS (trên event loop). Trả (unit mới, app_id đã biến mất)."""
+        self.found = found
+        apps = dict(settings.APPS)
+        added: Dict[str, AppInfo] = {}
+        removed: List[str] = []
+        moved = 0  # unit đã biết nhưng đổi đường dẫn cgroup
+        for app_id, info in list(apps.items()):
+            if info.discovered and app_id not in found:
+                del apps[app_id]
+                removed.append(app_id)
+        for app_id, path in found.items():
+            cur = apps.get(app_id)
+            if cur is None:
+                info = AppInfo(
+                    cgroup=path, version="", running=True, trackable=True, discovered=True,
+                    cpu_threshold=settings.DISCOVERY_CPU_THRESHOLD,
+                    memory_threshold_mb=settings.DISCOVERY_MEMORY_THRESHOLD_MB,
+                )
+                apps[app_id] = added[app_id] = info
+            elif cur.discovered and cur.cgroup != path:
+                apps[app_id] = cur.model_copy(update={"cgroup": path})
+                moved += 1
+        if added or removed or moved:
+            # đổi cả dict 1 lần: code khác đang duyệt settings.APPS không thấy dict bị sửa giữa chừng
+            settings.APPS = apps
+            config.list_services = apps
+            self.added += len(added)
+            self.removed += len(removed)
+        if added or removed:
+            # chỉ thêm / bỏ rule của app đổi, áp trong thread của alert_worker (không compile lại cả bộ)
+            from vqc_monitor.metrics.alert_rules import rule_engine
+            rule_engine.update_apps({**added, **{app_id: None for app_id in removed}})
+        return added, removed
+
+    def _reapply(self):
+        # reload config dựng lại APPS từ config.yaml -> gộp lại các unit đã phát hiện
+        if settings.DISCOVERY_ENABLED and self.found:
+            self.apply(self.found)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.DISCOVERY_ENABLED,
+            "units": len(self.found),
+            "scans": self.scans,
+            "last_scan_ms": round(self.last_scan_ms, 3),
+            "added": self.added,
+            "removed": self.removed,
+        }
+
+
+discovery = CgroupDiscovery()
+on_reload(discovery._reapply)
@@ -0,0 +1,175 @@
+# app/metrics/history_feed.py
+"""
+Chart lịch sử tự nối dài: thay cho việc poll lại GET /apps/{app_id}/stats (query + gom lại cả khoảng).
+- Collector publish các sample vừa commit mỗi tick (HistoryFeed.publish).
+- Mỗi chart đang mở là 1 HistoryStream: gửi bucket lịch sử từ repo.get_stats 1 lần, rồi cộng dồn
+  từng sample mới vào bucket đang chạy (O(1) / tick), gửi bucket vừa đóng + giá trị tạm của bucket hiện tại.
+Message:
+    {"type": "history", "app_id", "start", "end", "bucket_ms", "points": [...]}   # giống get_stats
+    {"type": "bucket", "point": {...}}    # bucket vừa hoàn tất (không đổi nữa)
+    {"type": "partial", "point": {...}}   # bucket đang chạy, thay thế partial trước đó
+point có cùng field với get_stats: t, cpu_avg/min/max, mem_avg/min/max, io_r_avg, io_w_avg.
+"""
+from math import ceil
+from typing import Callable, List, Optional, Set, Tuple
+from starlette.concurrency import run_in_threadpool
+from vqc_monitor.db.base import SessionLocal
+from vqc_monitor.db import repo
+
+# (app_id, ts_ms, cpu_percent, mem_bytes, io_read_Bps, io_write_Bps)
+Sample = Tuple[str, int, float, int, float, float]
+
+
+class BucketAgg:
+    """Min/max/avg cộng dồn của 1 bucket, cùng công thức với SQL trong repo.get_stats."""
+    __slots__ = ("bucket_ms", "t", "n", "cpu_sum", "cpu_min", "cpu_max", "mem_sum", "mem_min", "mem_max",
+                 "r_sum", "w_sum")
+
+    def __init__(self, bucket_ms: int):
+        self.bucket_ms = bucket_ms
+        self.t: Optional[int] = None
+        self.n = 0
+
+    def _reset(self, t: int):
+        self.t = t
+        self.n = 0
+        self.cpu_sum = self.mem_sum = self.r_sum = self.w_sum = 0
+        self.cpu_min = self.cpu_max = self.mem_min = self.mem_max = None
+
+    def add(self, ts_ms: int, cpu: float, mem: int, r: float, w: float) -> Optional[dict]:
+        """Cộng 1 sample; trả point của bucket vừa đóng nếu sample thuộc bucket mới."""
+        t = (ts_ms // self.bucket_ms) * self.bucket_ms
+        closed = None
+        if self.t is None or t != self.t:
+            if self.t is not None and self.n:
+                closed = self.point()
+            self._reset(t)
+        self.n += 1
+        self.cpu_sum += cpu
+        self.mem_sum += mem
+        self.r_sum += r
+        self.w_sum += w
+        self.cpu_min = cpu if self.cpu_min is None else min(self.cpu_min, cpu)
+        self.cpu_max = cpu if self.cpu_max is None else max(self.cpu_max, cpu)
+        self.mem_min = mem if self.mem_min is None else min(self.mem_min, mem)
+        self.mem_max = mem if self.mem_max is None else max(self.mem_max, mem)
+        return closed
+
+    def point(self) -> Optional[dict]:
+        if not self.n:
+            return None
+        return {
+            "t": self.t,
+            "cpu_avg": float(self.cpu_sum / self.n),
+            "cpu_min": float(self.cpu_min),
+            "cpu_max": float(self.cpu_max),
+            "mem_avg": int(self.mem_sum / self.n),
+            "mem_min": int(self.mem_min),
+            "mem_max": int(self.mem_max),
+            "io_r_avg": float(self.r_sum / self.n),
+            "io_w_avg": float(self.w_sum / self.n),
+        }
+
+
+class HistorySubscription:
+    __slots__ = ("app_id", "on_sample")
+
+    def __init__(self, app_id: str, on_sample: Callable[[Sample], None]):
+        self.app_id = app_id
+        self.on_sample = on_sample
+
+
+class HistoryFeed:
+    def __init__(self):
+        self._subs: Set[HistorySubscription] = set()
+
+    def subscribe(self, app_id: str, on_sample: Callable[[Sample], None]) -> HistorySubscription:
+        sub = HistorySubscription(app_id, on_sample)
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: HistorySubscription):
+        self._subs.discard(sub)
+
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def publish(self, samples: List[Sample]):
+        """Collector gọi sau khi commit (trên event loop)."""
+        if not self._subs or not samples:
+            return
+        for sub in list(self._subs):
+            for s in samples:
+                if s[0] == sub.app_id:
+                    sub.on_sample(s)
+
+
+history_feed = HistoryFeed()
+
+
+class HistoryStream:
+    """1 chart: lịch sử từ start + bucket mới khi collector ghi sample. emit(dict) không được chặn."""
+
+    def __init__(self, app_id: str, start: int, bucket_ms: Optional[int], emit: Callable[[dict], None],
+                 max_points: int = 1000):
+        self.app_id = app_id
+        self.start = start
+        self.max_points = max_points
+        self.bucket_ms = bucket_ms
+        self.emit = emit
+        self._sub: Optional[HistorySubscription] = None
+        self._agg: Optional[BucketAgg] = None
+        self._buffer: List[Sample] = []
+        self._last_ts = -1
+
+    async def open(self, now_ms: int):
+        # subscribe TRƯỚC khi query: sample commit giữa chừng nằm trong buffer, trùng thì bỏ theo ts
+        self._sub = history_feed.subscribe(self.app_id, self._on_sample)
+        try:
+            if self.bucket_ms is None:
+                self.bucket_ms = max(1, ceil((now_ms - self.start) / max(1, min(self.max_points, 1000))))
+            cur_t = (now_ms // self.bucket_ms) * self.bucket_ms
+            hist, rows = await run_in_threadpool(self._load, cur_t, now_ms)
+        except BaseException:
+            self.close()
+            raise
+        agg = BucketAgg(self.bucket_ms)
+        for ts_ms, cpu, mem, r, w in rows:
+            agg.add(ts_ms, cpu, mem, r, w)
+            self._last_ts = max(self._last_ts, ts_ms)
+        self._agg = agg
+        self.emit({"type": "history", **hist})
+        partial = agg.point()
+        if partial:
+            self.emit({"type": "partial", "point": partial})
+        buffered, self._buffer = self._buffer, []
+        for s in buffered:
+            self._apply(s)
+
+    def close(self):
+        if self._sub is not None:
+            history_feed.unsubscribe(self._sub)
+            self._sub = None
+
+    def _load(self, cur_t: int, now_ms: int):
+        with SessionLocal() as db:
+            # bucket đã đóng lấy từ get_stats; bucket đang chạy cộng dồn lại từ sample thô để nối tiếp chính xác
+            hist = repo.get_stats(db, self.app_id, self.start, cur_t - 1, self.max_points, self.bucket_ms)
+            rows = repo.get_samples(db, self.app_id, max(self.start, cur_t), now_ms)
+        return hist, rows
+
+    def _on_sample(self, s: Sample):
+        if self._agg is None:
+            self._buffer.append(s)
+        else:
+            self._apply(s)
+
+    def _apply(self, s: Sample):
+        _, ts_ms, cpu, mem, r, w = s
+        if ts_ms <= self._last_ts:
+            return
+        self._last_ts = ts_ms
+        closed = self._agg.add(ts_ms, cpu, mem, r, w)
+        if closed:
+            self.emit({"type": "bucket", "point": closed})
+        self.emit({"type": "partial", "point": self._agg.point()})
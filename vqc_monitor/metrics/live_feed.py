@@ -0,0 +1,277 @@
+# app/metrics/live_feed.py
+"""
+Nguồn số liệu realtime (system + services) dùng chung cho /ws/live (mode=combined) và kênh "live" của /ws/mux.
+- 1 task duy nhất đọc /proc + cgroup mỗi tick cho hợp các service đang được yêu cầu,
+  thay vì mỗi kết nối tự đọc & tự tính rate.
+- Mỗi subscriber có hạn gửi riêng (next_due += interval_ms), task thức dậy ở hạn sớm nhất (2 tick cách nhau
+  tối thiểu MIN_TICK_MS, bằng mức sàn 50ms cũ của /ws/live) và chỉ đọc các service mà subscriber tới hạn cần.
+  Rate là trung bình từ lần đọc trước của service đó.
+- cgroup lấy từ settings.APPS[sid].cgroup (config / discovery). Service trong config chưa chạy lúc nạp config
+  (cgroup trống) được resolve qua systemctl; lệnh systemctl (resolve, uptime) chạy trong thread, không chặn loop.
+- Uptime: ActiveEnterTimestampMonotonic đọc 1 lần / service, đọc lại khi cgroup đổi hoặc bị tạo lại (restart).
+- procs=N: kèm top N process (metrics/procs) trong mỗi service, chỉ đọc khi có subscriber yêu cầu.
+- Subscriber cùng (services, procs) và không delta nhận chung 1 payload encode 1 lần / tick; proto=2 giữ
+  trạng thái "đã gửi" riêng nên vẫn encode theo từng subscriber.
+- Task tự dừng khi không còn subscriber.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from vqc_monitor.core.config import resolve_service_to_cgroup, settings
+from vqc_monitor.core.serialization import dumps
+from vqc_monitor.metrics.cgroup import (
+    snapshot as cg_snapshot, compute_rates as cg_rates, format_uptime, get_service_active_since_us,
+)
+from vqc_monitor.metrics.system import snapshot as sys_snapshot, compute_rates as sys_rates
+from vqc_monitor.metrics.procs import proc_samplers, top as top_procs
+
+MIN_TICK_MS = 50
+RESOLVE_RETRY_S = 5.0  # service chưa chạy (chưa có cgroup): resolve lại sau khoảng này
+
+
+def system_payload(prev: dict, curr: dict, dt: float) -> dict:
+    r = sys_rates(prev, curr, max(1e-6, dt))
+    return {
+        "cpu_percent": r["cpu_percent"],
+        "mem_bytes":   r["mem_bytes"],
+        "read_Bps":    r["read_Bps"],
+        "write_Bps":   r["write_Bps"],
+        "net_rx_Bps":  r.get("net_rx_Bps", 0.0),
+        "net_tx_Bps":  r.get("net_tx_Bps", 0.0),
+        # usage tức thời
+        "disk_used_bytes":   curr.get("disk_used_bytes"),
+        "disk_total_bytes":  curr.get("disk_total_bytes"),
+        "disk_used_percent": curr.get("disk_used_percent"),
+        "total_ram": settings.TOTAL_RAM_BYTES,
+        "cpu_threshold": settings.CPU_THRESHOLD,
+        "memory_threshold": settings.MEMORY_THRESHOLD,
+    }
+
+
+def service_payload(sid: str, prev: dict, curr: dict, dt: float, started_us: Optional[int] = None) -> dict:
+    r = cg_rates(prev, curr, max(1e-6, dt))
+    return {
+        "app_id": sid,
+        "cpu_percent": r["cpu_percent"],
+        "mem_bytes":   r["mem_bytes"],
+        # Nếu muốn thêm IO:
+        # "read_Bps": r["read_Bps"], "write_Bps": r["write_Bps"]
+        "cpu_threshold": getattr(settings.APPS.get(sid), "cpu_threshold", None),
+        "memory_threshold_mb": getattr(settings.APPS.get(sid), "memory_threshold_mb", None),
+        "uptime": format_uptime(started_us),
+    }
+
+
+def default_services() -> List[str]:
+    # tất cả service trackable từ config
+    return [sid for sid, info in settings.APPS.items() if getattr(info, "trackable", True)]
+
+
+class LiveSubscription:
+    __slots__ = ("services", "interval_ms", "callback", "encoder", "procs", "next_due")
+
+    def __init__(self, services: Optional[List[str]], interval_ms: int, callback: Callable[[bytes], None], encoder=None,
+                 procs: int = 0):
+        self.services = services  # None = tất cả trackable
+        self.interval_ms = interval_ms
+        self.callback = callback  # nhận payload đã encode
+        self.encoder = encoder  # api/live_delta.DeltaEncoder nếu proto=2
+        self.procs = procs  # top N process / service, 0 = không gửi
+        self.next_due = time.monotonic() + interval_ms / 1000  # hạn gửi kế tiếp (monotonic)
+
+    def wanted(self) -> List[str]:
+        return self.services if self.services is not None else default_services()
+
+    def due(self, now: float) -> bool:
+        # cho phép sớm nửa tick tối thiểu: hạn rơi ngay sau tick này không phải đợi thêm 1 tick
+        if now + MIN_TICK_MS / 2000 < self.next_due:
+            return False
+        self.next_due += self.interval_ms / 1000
+        if self.next_due <= now:
+            # tick bị trễ quá 1 interval: lấy lại nhịp từ bây giờ, không gửi dồn
+            self.next_due = now + self.interval_ms / 1000
+        return True
+
+    def payload(self, ts_ms: int, system: dict, services: Dict[str, dict], procs: Dict[str, List[dict]]) -> dict:
+        out = []
+        for sid in self.wanted():
+            if sid not in services:
+                continue
+            svc = services[sid]
+            if self.procs and sid in procs:
+                svc = {**svc, "procs": procs[sid][:self.procs]}
+            out.append(svc)
+        return {
+            "ts_ms": ts_ms,
+            "system": system,
+            "services": out,
+        }
+
+
+class LiveFeed:
+    def __init__(self):
+        self._subs: Set[LiveSubscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._lookup: Optional[asyncio.Task] = None
+        self._cgroups: Dict[str, str] = {}  # sid -> cgroup đang đọc
+        self._resolved: Dict[str, str] = {}  # sid -> cgroup resolve qua systemctl (app có cgroup trống)
+        self._missing: Dict[str, float] = {}  # sid chưa resolve được -> lúc (monotonic) được thử lại
+        self._started: Dict[str, Optional[int]] = {}  # sid -> ActiveEnterTimestampMonotonic (µs)
+        self.ticks = 0
+
+    def subscribe(self, services: Optional[List[str]], interval_ms: int, callback: Callable[[bytes], None],
+                  encoder=None, procs: int = 0) -> LiveSubscription:
+        sub = LiveSubscription(services, interval_ms, callback, encoder, procs)
+        self._subs.add(sub)
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        else:
+            # task có thể đang ngủ tới hạn của subscriber chậm hơn
+            self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub: LiveSubscription):
+        self._subs.discard(sub)
+
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def _cgroup_of(self, sid: str, resolve_ids: Set[str]) -> Optional[str]:
+        info = settings.APPS.get(sid)
+        if info is None:
+            return None
+        if info.cgroup:
+            return info.cgroup
+        cg = self._resolved.get(sid)
+        if cg is None and not info.discovered and self._missing.get(sid, 0.0) <= time.monotonic():
+            self._missing[sid] = time.monotonic() + RESOLVE_RETRY_S
+            resolve_ids.add(sid)
+        return cg
+
+    async def _run(self):
+        prev_sys = sys_snapshot()
+        t_sys = time.time()
+        prev_svc: Dict[str, Tuple[dict, float]] = {}
+        last_tick = time.monotonic()
+        while self._subs:
+            wake = max(min(s.next_due for s in self._subs), last_tick + MIN_TICK_MS / 1000)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, wake - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() < last_tick + MIN_TICK_MS / 1000:
+                continue
+            mono = time.monotonic()
+            due = [s for s in list(self._subs) if s.due(mono)]
+            if not due:
+                continue
+            last_tick = mono
+            now = time.time()
+            curr_sys = sys_snapshot()
+            system = system_payload(prev_sys, curr_sys, now - t_sys)
+            prev_sys, t_sys = curr_sys, now
+
+            wanted: Set[str] = set()
+            want_procs: Dict[str, int] = {}  # sid -> N lớn nhất được yêu cầu
+            for sub in due:
+                ids = sub.wanted()
+                wanted.update(ids)
+                if sub.procs:
+                    for sid in ids:
+                        want_procs[sid] = max(want_procs.get(sid, 0), sub.procs)
+            services: Dict[str, dict] = {}
+            procs: Dict[str, List[dict]] = {}
+            resolve_ids: Set[str] = set()
+            uptime_ids: List[Tuple[str, str]] = []
+            for sid in wanted:
+                cg = self._cgroup_of(sid, resolve_ids)
+                if cg is None:
+                    continue
+                if self._cgroups.get(sid) != cg:
+                    # cgroup mới hoặc đổi path (discovery): bỏ rate cũ, đọc lại uptime
+                    prev_svc.pop(sid, None)
+                    self._started.pop(sid, None)
+                    self._cgroups[sid] = cg
+                try:
+                    curr = cg_snapshot(cg)
+                except FileNotFoundError:
+                    # cgroup biến mất (service dừng) -> tick sau lấy lại cgroup
+                    prev_svc.pop(sid, None)
+                    self._cgroups.pop(sid, None)
+                    self._resolved.pop(sid, None)
+                    continue
+                if sid in prev_svc:
+                    prev, t0 = prev_svc[sid]
+                    if curr["cpu_usage_us"] < prev["cpu_usage_us"]:
+                        # counter giảm: cgroup bị tạo lại (service restart) -> uptime mới
+                        self._started.pop(sid, None)
+                    services[sid] = service_payload(sid, prev, curr, now - t0, self._started.get(sid))
+                prev_svc[sid] = (curr, now)
+                if sid not in self._started:
+                    uptime_ids.append((sid, cg))
+                if sid in want_procs:
+                    try:
+                        procs[sid] = top_procs(proc_samplers.get(str(cg)).sample(), want_procs[sid])
+                    except FileNotFoundError:
+                        pass
+            if (resolve_ids or uptime_ids) and (self._lookup is None or self._lookup.done()):
+                self._lookup = asyncio.create_task(self._run_lookup(list(resolve_ids), uptime_ids))
+
+            # bỏ state của service không còn ai xem
+            all_wanted: Set[str] = set()
+            for sub in self._subs:
+                all_wanted.update(sub.wanted())
+            for d in (prev_svc, self._cgroups, self._resolved, self._missing, self._started):
+                for sid in [s for s in d if s not in all_wanted]:
+                    del d[sid]
+
+            self.ticks += 1
+            self._publish(int(now * 1000), system, services, procs, due)
+
+    async def _run_lookup(self, resolve_ids: List[str], uptime_ids: List[Tuple[str, str]]):
+        """Gọi systemctl trong thread (tuần tự, 1 thread) rồi ghi kết quả cho các tick sau."""
+        def lookup():
+            cgroups, started = {}, {}
+            for sid in resolve_ids:
+                try:
+                    cg = resolve_service_to_cgroup(sid)
+                except OSError:
+                    cg = None
+                cgroups[sid] = str(cg) if cg else None
+            for sid, _ in uptime_ids:
+                try:
+                    started[sid] = get_service_active_since_us(sid)
+                except OSError:
+                    started[sid] = None
+            return cgroups, started
+
+        cgroups, started = await asyncio.to_thread(lookup)
+        for sid, cg in cgroups.items():
+            if cg:
+                self._resolved[sid] = cg
+                self._missing.pop(sid, None)
+        for sid, cg in uptime_ids:
+            # cgroup đổi trong lúc tra: bỏ kết quả cũ, tick sau tra lại
+            if self._cgroups.get(sid) == cg:
+                self._started[sid] = started[sid]
+
+    def _publish(self, ts_ms: int, system: dict, services: Dict[str, dict], procs: Dict[str, List[dict]],
+                 due: List[LiveSubscription]):
+        frames: Dict[Tuple[Tuple[str, ...], int], bytes] = {}  # (services, procs) -> payload đã encode
+        for sub in due:
+            if sub not in self._subs:
+                continue
+            if sub.encoder is not None:
+                sub.callback(dumps(sub.encoder.encode(sub.payload(ts_ms, system, services, procs))))
+                continue
+            key = (tuple(sub.wanted()), sub.procs)
+            data = frames.get(key)
+            if data is None:
+                data = frames[key] = dumps(sub.payload(ts_ms, system, services, procs))
+            sub.callback(data)
+
+
+live_feed = LiveFeed()
@@ -0,0 +1,232 @@
+# app/metrics/procs.py
+"""
+Phân rã theo process bên trong 1 cgroup (service): CPU%, RSS, IO rate cho từng pid.
+- Mỗi lần sample đọc cgroup.procs, rồi /proc/<pid>/stat, statm, io qua fd giữ mở (os.pread từ offset 0,
+  không open/close mỗi tick). pid thoát -> đóng fd + bỏ state; pid bị tái sử dụng nhận ra qua starttime.
+- Chi phí có giới hạn: tối đa PROC_SAMPLE_MAX pid / lần sample. Cgroup lớn hơn thì một nửa ngân sách cho
+  các pid nóng nhất lần trước, phần còn lại xoay vòng qua các pid khác. Rate của mỗi pid là trung bình
+  từ lần đọc trước của chính pid đó nên vẫn đúng khi không đọc mỗi tick. Số fd mở cũng có trần (LRU).
+- Sampler dùng chung theo cgroup (proc_samplers), tự đóng khi không ai dùng.
+"""
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from vqc_monitor.core.config import settings
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+SORT_KEYS = ("cpu_percent", "rss_bytes", "read_Bps", "write_Bps")
+SAMPLER_IDLE_S = 300
+_CMD_MAX = 256
+
+
+class _ProcFds:
+    __slots__ = ("stat", "statm", "io")
+
+    def __init__(self, pid: int):
+        base = f"/proc/{pid}/"
+        self.stat = os.open(base + "stat", os.O_RDONLY)
+        try:
+            self.statm = os.open(base + "statm", os.O_RDONLY)
+        except OSError:
+            os.close(self.stat)
+            raise
+        try:
+            self.io: Optional[int] = os.open(base + "io", os.O_RDONLY)
+        except OSError:
+            self.io = None  # không đủ quyền (không phải root) -> không có IO
+
+    def close(self):
+        for fd in (self.stat, self.statm, self.io):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+
+class _ProcState:
+    __slots__ = ("starttime", "comm", "cmd", "ticks", "rbytes", "wbytes", "t", "last")
+
+    def __init__(self, starttime: int, comm: str, cmd: str):
+        self.starttime = starttime
+        self.comm = comm
+        self.cmd = cmd
+        self.ticks: Optional[int] = None
+        self.rbytes: Optional[int] = None
+        self.wbytes: Optional[int] = None
+        self.t = 0.0
+        self.last: Optional[dict] = None  # số liệu lần tính gần nhất
+
+
+def _parse_stat(raw: bytes) -> Tuple[str, int, int, int]:
+    """-> (comm, utime+stime ticks, num_threads, starttime)."""
+    s = raw.decode("utf-8", errors="replace")
+    l, r = s.find("("), s.rfind(")")
+    comm = s[l + 1:r]
+    f = s[r + 2:].split()
+    # f[0] là field 3 (state) trong proc(5)
+    return comm, int(f[11]) + int(f[12]), int(f[17]), int(f[19])
+
+
+def _parse_io(raw: bytes) -> Tuple[int, int]:
+    rb = wb = 0
+    for line in raw.split(b"\n"):
+        if line.startswith(b"read_bytes:"):
+            rb = int(line.split()[1])
+        elif line.startswith(b"write_bytes:"):
+            wb = int(line.split()[1])
+    return rb, wb
+
+
+def _read_cmdline(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            raw = f.read(_CMD_MAX)
+    except OSError:
+        return ""
+    return raw.replace(b"\0", b" ").decode("utf-8", errors="replace").strip()
+
+
+class ProcSampler:
+    def __init__(self, cgroup_path: str):
+        self.cgroup = Path(cgroup_path)
+        self._fds: "OrderedDict[int, _ProcFds]" = OrderedDict()  # LRU
+        self._state: Dict[int, _ProcState] = {}
+        self._hot: List[int] = []
+        self._rr = 0
+        self.last_used = time.monotonic()
+        self.pid_count = 0
+        self.sampled = 0
+
+    def close(self):
+        for fds in self._fds.values():
+            fds.close()
+        self._fds.clear()
+        self._state.clear()
+
+    def _pids(self) -> List[int]:
+        raw = (self.cgroup / "cgroup.procs").read_bytes()  # FileNotFoundError khi cgroup biến mất
+        return [int(x) for x in raw.split()]
+
+    def _pick(self, pids: List[int], budget: int) -> List[int]:
+        if len(pids) <= budget:
+            return pids
+        alive = set(pids)
+        chosen = [p for p in self._hot if p in alive][:budget // 2]
+        picked = set(chosen)
+        n = len(pids)
+        start = self._rr % n
+        i = 0
+        while len(chosen) < budget and i < n:
+            p = pids[(start + i) % n]
+            if p not in picked:
+                chosen.append(p)
+                picked.add(p)
+            i += 1
+        self._rr = start + i
+        return chosen
+
+    def _drop(self, pid: int):
+        fds = self._fds.pop(pid, None)
+        if fds:
+            fds.close()
+        self._state.pop(pid, None)
+
+    def _get_fds(self, pid: int) -> _ProcFds:
+        fds = self._fds.get(pid)
+        if fds is None:
+            fds = self._fds[pid] = _ProcFds(pid)
+            # mỗi pid tối đa 3 fd; giữ trong khoảng 4 x ngân sách / sample
+            while len(self._fds) > max(16, settings.PROC_SAMPLE_MAX * 4):
+                _, old = self._fds.popitem(last=False)
+                old.close()
+        else:
+            self._fds.move_to_end(pid)
+        return fds
+
+    def sample(self) -> List[dict]:
+        """Đọc 1 lượt; trả số liệu các process đã có rate (pid mới chỉ có baseline ở lần đầu)."""
+        self.last_used = time.monotonic()
+        pids = self._pids()
+        self.pid_count = len(pids)
+        alive = set(pids)
+        for pid in [p for p in self._state if p not in alive]:
+            self._drop(pid)
+
+        ncpu = os.cpu_count() or 1
+        now = time.monotonic()
+        for pid in self._pick(pids, max(1, settings.PROC_SAMPLE_MAX)):
+            try:
+                fds = self._get_fds(pid)
+                comm, ticks, threads, starttime = _parse_stat(os.pread(fds.stat, 4096, 0))
+                rss = int(os.pread(fds.statm, 256, 0).split()[1]) * PAGE_SIZE
+                io = _parse_io(os.pread(fds.io, 1024, 0)) if fds.io is not None else None
+            except (OSError, ValueError, IndexError):
+                # pid vừa thoát (ESRCH) hoặc không đọc được
+                self._drop(pid)
+                continue
+            self.sampled += 1
+            st = self._state.get(pid)
+            if st is None or st.starttime != starttime:
+                st = self._state[pid] = _ProcState(starttime, comm, _read_cmdline(pid))
+            if st.ticks is not None:
+                dt = max(1e-6, now - st.t)
+                st.last = {
+                    "pid": pid,
+                    "comm": st.comm,
+                    "cmd": st.cmd,
+                    "threads": threads,
+                    "cpu_percent": max(0, ticks - st.ticks) / CLK_TCK / dt * 100.0 / ncpu,
+                    "rss_bytes": rss,
+                    "read_Bps": max(0, io[0] - st.rbytes) / dt if io and st.rbytes is not None else None,
+                    "write_Bps": max(0, io[1] - st.wbytes) / dt if io and st.wbytes is not None else None,
+                }
+            st.ticks = ticks
+            st.rbytes, st.wbytes = io if io else (None, None)
+            st.t = now
+
+        procs = [st.last for st in self._state.values() if st.last is not None]
+        procs.sort(key=lambda p: p["cpu_percent"], reverse=True)
+        self._hot = [p["pid"] for p in procs[:max(1, settings.PROC_SAMPLE_MAX // 2)]]
+        return procs
+
+
+def top(procs: List[dict], n: int, sort: str = "cpu_percent") -> List[dict]:
+    if sort not in SORT_KEYS:
+        sort = "cpu_percent"
+    return sorted(procs, key=lambda p: p.get(sort) or 0, reverse=True)[:max(0, n)]
+
+
+class ProcSamplers:
+    """Sampler dùng chung theo cgroup (live_feed, /ws/live, /apps/{app_id}/procs)."""
+
+    def __init__(self):
+        self._samplers: Dict[str, ProcSampler] = {}
+
+    def get(self, cgroup_path: str) -> ProcSampler:
+        s = self._samplers.get(cgroup_path)
+        if s is None:
+            s = self._samplers[cgroup_path] = ProcSampler(cgroup_path)
+        self._reap()
+        return s
+
+    def discard(self, cgroup_path: str):
+        s = self._samplers.pop(cgroup_path, None)
+        if s:
+            s.close()
+
+    def _reap(self):
+        now = time.monotonic()
+        for cg, s in list(self._samplers.items()):
+            if now - s.last_used > SAMPLER_IDLE_S:
+                self.discard(cg)
+
+    def stats(self) -> dict:
+        return {cg: {"pids": s.pid_count, "tracked": len(s._state), "open_fds": len(s._fds), "sampled": s.sampled}
+                for cg, s in self._samplers.items()}
+
+
+proc_samplers = ProcSamplers()
@@ -0,0 +1,200 @@
+# app/metrics/replay.py
+"""
+Replay alert trên dữ liệu lịch sử để thử ngưỡng mới (không ghi gì xuống DB).
+- Cùng ngữ nghĩa rule cpu/memory mặc định (metrics/alert_rules, trước đây metrics/alert): vượt ngưỡng,
+  cửa sổ [ts - window, ts] không có sample <= ngưỡng, đủ coverage theo cadence quan sát, rồi cooldown.
+- Tính cho cả chuỗi bằng NumPy (searchsorted + maximum.accumulate), chỉ vòng lặp trên các lần alert
+  để áp cooldown -> 1 tháng x mọi app chạy trong vài giây.
+Dùng:  POST /alerts/replay   hoặc   python -m vqc_monitor.metrics.replay --days 30 --cpu-threshold 70
+"""
+import argparse
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from vqc_monitor.core.config import settings
+from vqc_monitor.db import repo
+
+APP = "app"
+CONTAINER = "container"
+SYSTEM = "__system__"
+METRICS = ("cpu", "memory")
+MAX_ALERTS_PER_SERIES = 1000
+_MB = 1024 * 1024
+
+
+def sustained_alerts(ts: np.ndarray, val: np.ndarray, threshold: float, window_ms: int, coverage: float,
+                     cooldown_ms: int, fallback_interval_ms: int) -> np.ndarray:
+    """Chỉ số các sample sẽ phát alert (ts tăng dần)."""
+    n_all = len(ts)
+    if n_all == 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.arange(n_all)
+    above = val > threshold
+    # sample đầu tiên trong cửa sổ [ts - window, ts]
+    left = np.searchsorted(ts, ts - window_ms, side="left")
+    # sample <= ngưỡng gần nhất tính tới i (-1 nếu chưa có)
+    last_below = np.maximum.accumulate(np.where(above, -1, idx))
+    n = idx - left + 1
+    span = (ts - ts[left]).astype(np.float64)
+    interval = np.where(n >= 2, np.maximum(1.0, np.maximum(1.0, span) / np.maximum(1, n - 1)),
+                        max(1.0, float(fallback_interval_ms)))
+    min_samples = np.maximum(1, np.floor(window_ms / interval * coverage))
+    cand = np.flatnonzero(above & (last_below < left) & (n >= min_samples))
+    if len(cand) == 0:
+        return cand
+    # cooldown: nhảy tới ứng viên đầu tiên sau last + cooldown
+    cand_ts = ts[cand]
+    fired = []
+    j = 0
+    while j < len(cand):
+        fired.append(cand[j])
+        j = int(np.searchsorted(cand_ts, cand_ts[j] + cooldown_ms, side="left"))
+    return np.asarray(fired, dtype=np.int64)
+
+
+def _load_series(db: Session, scope: str, entity: str, start_ms: int, end_ms: int):
+    if scope == APP and settings.DEADBAND_ENABLED:
+        # samples đã nén deadband: dựng lại chuỗi để coverage tính như khi không nén
+        ts, cols = repo.get_samples_array(db, entity, start_ms, end_ms)
+        return ts, cols[:, 0], cols[:, 1] / _MB
+    if scope == APP:
+        sql = ("SELECT ts_ms, cpu_percent, mem_bytes FROM samples "
+               "WHERE app_id = ? AND ts_ms BETWEEN ? AND ? ORDER BY ts_ms")
+    else:
+        sql = ("SELECT ts_ms, cpu_percent, mem_bytes FROM container_metrics "
+               "WHERE container_name = ? AND ts_ms BETWEEN ? AND ? ORDER BY ts_ms")
+    # cursor DBAPI trực tiếp: tuple thuần, np.array không phải dò từng Row của SQLAlchemy
+    cur = db.connection().connection.cursor()
+    try:
+        rows = cur.execute(sql, (entity, start_ms, end_ms)).fetchall()
+    finally:
+        cur.close()
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0)
+    arr = np.array(rows, dtype=np.float64)
+    return arr[:, 0].astype(np.int64), arr[:, 1], arr[:, 2] / _MB
+
+
+def current_thresholds(scope: str) -> Dict[str, Dict[str, Optional[float]]]:
+    """Ngưỡng đang cấu hình (memory theo MB, __system__ đổi từ % RAM)."""
+    out: Dict[str, Dict[str, Optional[float]]] = {}
+    if scope == APP:
+        for app_id, info in settings.APPS.items():
+            out[app_id] = {"cpu": info.cpu_threshold, "memory": info.memory_threshold_mb}
+        out[SYSTEM] = {"cpu": settings.CPU_THRESHOLD,
+                       "memory": settings.MEMORY_THRESHOLD * (settings.TOTAL_RAM_BYTES / _MB) / 100.0}
+    else:
+        for name, info in settings.CONTAINERS.items():
+            out[name] = {"cpu": info.cpu_threshold, "memory": info.memory_threshold_mb}
+    return out
+
+
+def _actual_counts(db: Session, scope: str, start_ms: int, end_ms: int) -> Dict[tuple, int]:
+    table, col = ("alerts", "app_id") if scope == APP else ("container_alerts", "container_name")
+    rows = db.execute(text(f"""
+        SELECT {col}, alert_type, COUNT(*) FROM {table}
+        WHERE ts_ms BETWEEN :start AND :end GROUP BY {col}, alert_type
+    """), {"start": start_ms, "end": end_ms}).all()
+    return {(r[0], r[1]): r[2] for r in rows}
+
+
+def replay(db: Session, start_ms: int, end_ms: int, scope: str = APP, entities: Optional[List[str]] = None,
+           cpu_threshold: Optional[float] = None, memory_threshold_mb: Optional[float] = None,
+           thresholds: Optional[Dict[str, Dict[str, float]]] = None, window_ms: Optional[int] = None,
+           coverage: Optional[float] = None, cooldown_ms: Optional[int] = None) -> dict:
+    """
+    Ngưỡng ứng viên, theo thứ tự ưu tiên: thresholds[entity][metric] > cpu_threshold / memory_threshold_mb
+    (áp cho mọi entity) > ngưỡng đang cấu hình. Chỉ đọc DB.
+    """
+    if scope not in (APP, CONTAINER):
+        raise ValueError("scope phải là 'app' hoặc 'container'")
+    if end_ms <= start_ms:
+        raise ValueError("end_ms phải lớn hơn start_ms")
+    t0 = time.perf_counter()
+    window_ms = window_ms or settings.ALERT_WINDOW_MS
+    coverage = settings.ALERT_COVERAGE if coverage is None else coverage
+    cooldown_ms = settings.ALERT_COOLDOWN_MS if cooldown_ms is None else cooldown_ms
+    thresholds = thresholds or {}
+    configured = current_thresholds(scope)
+    if entities is None:
+        entities = list(configured)
+    actual = _actual_counts(db, scope, start_ms, end_ms)
+
+    result: Dict[str, dict] = {}
+    total = 0
+    n_samples = 0
+    for entity in entities:
+        ts, cpu, mem = _load_series(db, scope, entity, start_ms, end_ms)
+        n_samples += len(ts)
+        series = {}
+        for metric, values in (("cpu", cpu), ("memory", mem)):
+            thr = thresholds.get(entity, {}).get(metric)
+            if thr is None:
+                thr = cpu_threshold if metric == "cpu" else memory_threshold_mb
+            if thr is None:
+                thr = configured.get(entity, {}).get(metric)
+            if thr is None:
+                continue
+            fired = sustained_alerts(ts, values, thr, window_ms, coverage, cooldown_ms, settings.SAMPLE_INTERVAL_MS)
+            total += len(fired)
+            series[metric] = {
+                "threshold": thr,
+                "configured_threshold": configured.get(entity, {}).get(metric),
+                "count": int(len(fired)),
+                "actual_count": actual.get((entity, metric), 0),
+                "alerts": [{"ts_ms": int(ts[i]), "value": float(values[i])} for i in fired[:MAX_ALERTS_PER_SERIES]],
+            }
+        result[entity] = {"samples": int(len(ts)), "metrics": series}
+
+    return {
+        "scope": scope,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "window_ms": window_ms,
+        "coverage": coverage,
+        "cooldown_ms": cooldown_ms,
+        "samples": n_samples,
+        "total": total,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "entities": result,
+    }
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Replay alert cpu/memory trên dữ liệu lịch sử với ngưỡng thử")
+    p.add_argument("--scope", choices=[APP, CONTAINER], default=APP)
+    p.add_argument("--entity", action="append", help="app_id / container (lặp lại được), mặc định tất cả")
+    p.add_argument("--days", type=float, default=7, help="khoảng replay tính tới hiện tại (bỏ qua nếu có --start-ms)")
+    p.add_argument("--start-ms", type=int)
+    p.add_argument("--end-ms", type=int)
+    p.add_argument("--cpu-threshold", type=float)
+    p.add_argument("--memory-threshold-mb", type=float)
+    p.add_argument("--window-ms", type=int)
+    p.add_argument("--coverage", type=float)
+    p.add_argument("--cooldown-ms", type=int)
+    p.add_argument("--json", action="store_true", help="in toàn bộ kết quả dạng JSON")
+    args = p.parse_args(argv)
+
+    from vqc_monitor.db.base import SessionLocal
+    end_ms = args.end_ms or int(time.time() * 1000)
+    start_ms = args.start_ms or end_ms - int(args.days * 86_400_000)
+    with SessionLocal() as db:
+        res = replay(db, start_ms, end_ms, args.scope, args.entity, args.cpu_threshold, args.memory_threshold_mb,
+                     None, args.window_ms, args.coverage, args.cooldown_ms)
+    if args.json:
+        from vqc_monitor.core.serialization import dumps
+        print(dumps(res).decode())
+        return
+    print(f"{res['samples']} sample, window={res['window_ms']}ms coverage={res['coverage']} "
+          f"cooldown={res['cooldown_ms']}ms, {res['elapsed_ms']}ms")
+    print(f"{'entity':<30} {'metric':<7} {'threshold':>10} {'replay':>7} {'actual':>7}")
+    for entity, r in res["entities"].items():
+        for metric, m in r["metrics"].items():
+            print(f"{entity:<30} {metric:<7} {m['threshold']:>10.1f} {m['count']:>7} {m['actual_count']:>7}")
+    print(f"tổng: {res['total']} alert")
+
+
+if __name__ == "__main__":
+    main()
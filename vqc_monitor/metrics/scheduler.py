@@ -0,0 +1,132 @@
+# app/metrics/scheduler.py
+"""
+Lịch lấy mẫu đa tần số cho collector.
+- Mỗi nguồn (app cgroup, __system__, container) có chu kỳ riêng: sample_interval_ms của service / container
+  trong config.yaml, mặc định SAMPLE_INTERVAL_MS.
+- Deadline không trôi: lần kế = deadline trước + chu kỳ (không tính từ lúc làm xong). Lỡ slot (tick chạy
+  quá lâu) thì nhảy tới slot kế trong tương lai và đếm overrun, không chạy bù dồn dập.
+- Các nguồn tới hạn trong cùng khoảng SCHED_COALESCE_MS được gom 1 batch (1 lần sang thread đọc cgroup,
+  1 lệnh docker stats, 1 transaction).
+- stats(): độ trễ (lúc chạy thật - deadline) và overrun theo từng nguồn.
+"""
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+from vqc_monitor.core.instrument import registry
+
+APP = "app"
+SYSTEM = "system"
+CONTAINER = "container"
+
+Key = Tuple[str, str]
+
+_OVERRUNS = registry.counter("vqc_collector_overruns_total", "Slot lấy mẫu bị lỡ (tổng các nguồn)")
+
+
+class _SourceStats:
+    __slots__ = ("interval_ms", "runs", "overruns", "last_lag_ms", "max_lag_ms", "lag_sum_ms")
+
+    def __init__(self, interval_ms: int):
+        self.interval_ms = interval_ms
+        self.runs = 0
+        self.overruns = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.lag_sum_ms = 0.0
+
+
+class SampleScheduler:
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Key]] = []  # (deadline monotonic s, seq, key)
+        self._sources: Dict[Key, _SourceStats] = {}
+        self._live: Dict[Key, int] = {}  # key -> seq của entry hợp lệ trong heap (entry cũ bị bỏ qua)
+        self._seq = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self.max_batch_ms = 0.0
+
+    def _push(self, deadline: float, key: Key):
+        self._seq += 1
+        self._live[key] = self._seq
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+
+    def _stale(self, seq: int, key: Key) -> bool:
+        return key not in self._sources or self._live.get(key) != seq
+
+    def sync(self, intervals: Dict[Key, int], now: Optional[float] = None):
+        """Đồng bộ tập nguồn: nguồn mới chạy ngay, nguồn bị bỏ xoá lười khi tới hạn, đổi chu kỳ áp từ lần kế."""
+        now = time.monotonic() if now is None else now
+        for key, interval_ms in intervals.items():
+            interval_ms = max(1, int(interval_ms))
+            st = self._sources.get(key)
+            if st is None:
+                self._sources[key] = _SourceStats(interval_ms)
+                self._push(now, key)
+            else:
+                st.interval_ms = interval_ms
+        for key in [k for k in self._sources if k not in intervals]:
+            del self._sources[key]
+            del self._live[key]
+
+    def next_deadline(self) -> Optional[float]:
+        while self._heap and self._stale(self._heap[0][1], self._heap[0][2]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float, coalesce_ms: float = 0) -> List[Key]:
+        """Lấy mọi nguồn có deadline <= now + coalesce, xếp lịch lần kế cho từng nguồn."""
+        horizon = now + coalesce_ms / 1000
+        due: List[Key] = []
+        while self._heap and self._heap[0][0] <= horizon:
+            deadline, seq, key = heapq.heappop(self._heap)
+            if self._stale(seq, key):
+                continue  # nguồn đã bị bỏ (hoặc bỏ rồi thêm lại)
+            st = self._sources[key]
+            due.append(key)
+            lag_ms = max(0.0, (now - deadline) * 1000)
+            st.runs += 1
+            st.last_lag_ms = lag_ms
+            st.lag_sum_ms += lag_ms
+            st.max_lag_ms = max(st.max_lag_ms, lag_ms)
+            interval = st.interval_ms / 1000
+            nxt = deadline + interval
+            if nxt <= now:
+                # lỡ 1 hoặc nhiều slot: bỏ qua, giữ pha của lịch
+                missed = int((now - deadline) // interval)
+                st.overruns += missed
+                _OVERRUNS.inc(missed)
+                nxt = deadline + (missed + 1) * interval
+            self._push(nxt, key)
+        if due:
+            self.batches += 1
+        return due
+
+    def source_count(self) -> int:
+        return len(self._sources)
+
+    def note_batch(self, elapsed_ms: float):
+        self.last_batch_ms = elapsed_ms
+        self.max_batch_ms = max(self.max_batch_ms, elapsed_ms)
+
+    def stats(self) -> dict:
+        sources = {}
+        for (kind, name), st in self._sources.items():
+            sources[f"{kind}:{name}"] = {
+                "interval_ms": st.interval_ms,
+                "runs": st.runs,
+                "overruns": st.overruns,
+                "last_lag_ms": round(st.last_lag_ms, 3),
+                "max_lag_ms": round(st.max_lag_ms, 3),
+                "avg_lag_ms": round(st.lag_sum_ms / st.runs, 3) if st.runs else 0.0,
+            }
+        return {
+            "sources": len(self._sources),
+            "batches": self.batches,
+            "last_batch_ms": round(self.last_batch_ms, 3),
+            "max_batch_ms": round(self.max_batch_ms, 3),
+            "overruns": sum(st.overruns for st in self._sources.values()),
+            "per_source": sources,
+        }
+
+
+scheduler = SampleScheduler()